@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+
+if __name__ == '__main__':
+    # The modules shared with the other directories are in python/, see extp_paths
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from extp_fix_client import fix_client
+
+
+class async_fix_client(fix_client, asyncio.Protocol):
+    """
+    fix_client driven by an asyncio event loop instead of a thread: the socket
+    is owned by an asyncio transport, so any number of sessions can share the
+    same loop. Inbound messages can be consumed with `async for`, as
+    (MsgType, message) pairs; for market data (35=W and 35=X) the message is
+    the symbol whose ladders have been updated.
+    """
+
+    def __init__(self, hostname, port, sender_comp_id, target_comp_id, username, password,
+                 logger=None, store=None, max_queued_msgs=10000, use_tls=True):
+        fix_client.__init__(self, hostname, port, sender_comp_id,
+                            target_comp_id, username, password, logger, store, use_tls=use_tls)
+        self.transport = None
+        self.inbound = asyncio.Queue(max_queued_msgs)
+        self.dropped_msgs = 0
+        self.closed = None
+        self.heartbeat_timer = None
+        self.logon_waiter = None
+        self.order_waiters = {}
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        self.closed = loop.create_future()
+        self._log('Connecting on', self.hostname +
+                  ':' + str(self.port) + '...')
+        await loop.create_connection(lambda: self, self.hostname, self.port, ssl=self.ssl_context if self.use_tls else None)
+
+    async def logon(self, timeout=5):
+        """
+        Connects if needed, sends the Logon and waits for the server's.
+        """
+        if self.transport is None:
+            await self.connect()
+        self.logon_waiter = asyncio.get_running_loop().create_future()
+        self._send_logon()
+        await asyncio.wait_for(self.logon_waiter, timeout)
+
+    async def submit_order(self, id, symbol, side, quantity, limit_price=None, timeout=5):
+        """
+        Sends a market order, or a limit FOK order when limit_price is given,
+        and returns the first ExecutionReport received for its ClOrdID.
+        :param side: 'buy' or 'sell'.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self.order_waiters[str(id)] = waiter
+        try:
+            if limit_price is None:
+                if side == 'buy':
+                    self.place_order_market_buy(id, symbol, quantity)
+                else:
+                    self.place_order_market_sell(id, symbol, quantity)
+            else:
+                if side == 'buy':
+                    self.place_order_limit_fok_buy(id, symbol, quantity, limit_price)
+                else:
+                    self.place_order_limit_fok_sell(id, symbol, quantity, limit_price)
+            return await asyncio.wait_for(waiter, timeout)
+        finally:
+            self.order_waiters.pop(str(id), None)
+
+    async def wait_order(self, id, timeout=None):
+        """
+        Waits for an order to reach a terminal state (filled, rejected,
+        canceled...) and returns its extp_fix_orders.order_state.
+        """
+        return await asyncio.wait_for(asyncio.wrap_future(self.orders.future(str(id))), timeout)
+
+    async def stop(self):
+        self.running = False
+        if self.transport is not None:
+            self.transport.close()
+            await self.closed
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.inbound.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+    # asyncio.Protocol callbacks
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.running = True
+        self._log('Connected on', self.hostname + ':' + str(self.port))
+        self._poll_heartbeat()
+
+    def data_received(self, data):
+        self._process_data(data)
+
+    def connection_lost(self, exc):
+        self._log('Disconnected', exc or '')
+        self.transport = None
+        self.running = False
+        self.logged = False
+        self.heartbeat_timer.cancel()
+        self.heartbeat.stop()
+        error = exc or ConnectionError('FIX session closed')
+        if self.logon_waiter is not None and not self.logon_waiter.done():
+            self.logon_waiter.set_exception(error)
+        for waiter in self.order_waiters.values():
+            if not waiter.done():
+                waiter.set_exception(error)
+        if not self.closed.done():
+            self.closed.set_result(None)
+        self._enqueue(None)
+
+    def _poll_heartbeat(self):
+        self.heartbeat.poll()
+        if not self.heartbeat.link_up and self.transport is not None:
+            # Dead link: connection_lost() fails the waiters and ends the
+            # inbound messages
+            self.transport.abort()
+            return
+        self.heartbeat_timer = asyncio.get_running_loop().call_later(
+            self.heartbeat.wheel.tick, self._poll_heartbeat)
+
+    def _write(self, data):
+        self.transport.write(data)
+
+    def _on_market_data(self, buf, view, start, end, incremental):
+        symbols = fix_client._on_market_data(
+            self, buf, view, start, end, incremental)
+        msg_type = b'X' if incremental else b'W'
+        for symbol in symbols:
+            self._enqueue((msg_type, symbol))
+        return symbols
+
+    def _on_msg(self, msg):
+        fix_client._on_msg(self, msg)
+        msg_type = msg.get(35)
+        if msg_type == b'A':
+            if self.logon_waiter is not None and not self.logon_waiter.done():
+                self.logon_waiter.set_result(msg)
+        elif msg_type == b'8':
+            cl_ord_id = msg.get(11)  # ClOrdID, absent from venue generated reports
+            waiter = self.order_waiters.get(cl_ord_id.decode('utf-8')) if cl_ord_id is not None else None
+            if waiter is not None and not waiter.done():
+                waiter.set_result(msg)
+        elif msg_type == b'5':
+            if self.logon_waiter is not None and not self.logon_waiter.done():
+                self.logon_waiter.set_exception(
+                    ConnectionRefusedError(msg.get(58)))
+        self._enqueue((msg_type, msg))
+
+    def _enqueue(self, item):
+        # Never block the protocol: the oldest message is dropped when the
+        # consumer is too slow.
+        if self.inbound.full():
+            self.inbound.get_nowait()
+            self.dropped_msgs += 1
+        self.inbound.put_nowait(item)
+
+
+async def main(args):
+    market_data_port = 40001
+    market_access_port = 40002
+
+    market_data_session = async_fix_client(args.hostname, market_data_port, args.sender_comp_id,
+                                           args.target_comp_id_prefix + '_MDATA', args.username, args.password,
+                                           use_tls=not args.no_tls)
+    order_session = async_fix_client(args.hostname, market_access_port, args.sender_comp_id,
+                                     args.target_comp_id_prefix + '_ORDER', args.username, args.password,
+                                     use_tls=not args.no_tls)
+
+    # Both sessions share the same event loop
+    try:
+        await asyncio.gather(market_data_session.logon(), order_session.logon())
+    except (OSError, asyncio.TimeoutError) as e:
+        print('[ERROR] Cannot get a logon:', e)
+        sys.exit(1)
+
+    # Display some market data for few seconds
+    market_data_session.send_market_data_request(
+        ['BTC-USD', 'ETH-USD', 'LTC-USD'])
+    await asyncio.sleep(3)
+    market_data_session.log_market_data = False
+    print()
+
+    # Placing Orders
+    #now = str(datetime.datetime.now().timestamp())
+    #symbol = 'BTC-USD'
+    #qty = 0.00
+    #limit_fok_slippage = 0.0
+
+    #report = await order_session.submit_order(
+    #    now + '-buy-limit-fok', symbol, 'buy', qty, market_data_session.get_extp_offer(symbol, qty) + limit_fok_slippage)
+    #print('OrdStatus', report.get(39))
+    #order = await order_session.wait_order(now + '-buy-limit-fok')
+    #print('Filled', order.cum_qty, '@', order.avg_px, 'in', order.latency, 's')
+
+    # Stop
+    await order_session.stop()
+    await market_data_session.stop()
+
+
+if __name__ == "__main__":
+
+    print('EXTP asyncio FIX client example:')
+    print('This example runs the market data and order sessions on one event loop.')
+    print()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('hostname', help='Hostname of the FIX server')
+    parser.add_argument('sender_comp_id', help='Sender Comp ID')
+    parser.add_argument('target_comp_id_prefix', help='Target Comp ID Prefix')
+    parser.add_argument('username', help='Username')
+    parser.add_argument('password', help='Password')
+    parser.add_argument('--no-tls', action='store_true',
+                        help='Connect over plain TCP, e.g. to a local mock venue')
+    asyncio.run(main(parser.parse_args()))
@@ -3,6 +3,8 @@
 import argparse
 import datetime
 import numpy
+import os
+import select
 import threading
 import time
 import simplefix
@@ -10,61 +12,397 @@ import socket
 import ssl
 import sys
 
+from extp_fix_heartbeat import heartbeat_manager
+from extp_fix_log import DEBUG, default_logger, fix_text
+from extp_fix_orders import order_table
+from extp_fix_store import fix_store
+
+if __name__ == '__main__':
+    # The modules shared with the other directories are in python/, see extp_paths
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from extp_reconnect import jittered_backoff
+
+
+class md_ladder:
+    """
+    Market data ladder of one side of one symbol: quantities and prices are
+    kept in preallocated float64 arrays and overwritten in place on every
+    update, only the first `size` entries are meaningful.
+    """
+
+    def __init__(self, capacity=16):
+        self.quantities = numpy.zeros(capacity)
+        self.prices = numpy.zeros(capacity)
+        self.size = 0
+
+    def clear(self):
+        self.size = 0
+
+    def reserve(self, capacity):
+        if capacity > len(self.quantities):
+            self.quantities = numpy.resize(self.quantities, capacity)
+            self.prices = numpy.resize(self.prices, capacity)
+
+    def append(self, quantity, price):
+        if self.size == len(self.quantities):
+            self.reserve(max(2 * self.size, 16))
+        self.quantities[self.size] = quantity
+        self.prices[self.size] = price
+        self.size += 1
+
+    def assign(self, quantities, prices):
+        """
+        Replaces all the levels, quantities being sorted.
+        """
+        size = len(quantities)
+        self.reserve(size)
+        self.quantities[:size] = quantities
+        self.prices[:size] = prices
+        self.size = size
+
+    def set_level(self, quantity, price):
+        """
+        Updates the price of the level at this quantity, inserting the level
+        at its sorted position if it does not exist yet.
+        """
+        i = int(numpy.searchsorted(self.quantities[:self.size], quantity))
+        if i < self.size and self.quantities[i] == quantity:
+            self.prices[i] = price
+            return
+        if self.size == len(self.quantities):
+            self.reserve(max(2 * self.size, 16))
+        self.quantities[i + 1:self.size + 1] = self.quantities[i:self.size]
+        self.prices[i + 1:self.size + 1] = self.prices[i:self.size]
+        self.quantities[i] = quantity
+        self.prices[i] = price
+        self.size += 1
+
+    def remove_level(self, quantity):
+        i = int(numpy.searchsorted(self.quantities[:self.size], quantity))
+        if i < self.size and self.quantities[i] == quantity:
+            self.quantities[i:self.size - 1] = self.quantities[i + 1:self.size]
+            self.prices[i:self.size - 1] = self.prices[i + 1:self.size]
+            self.size -= 1
+
+    def get_price(self, quantity):
+        """
+        Interpolates the price for a quantity, or for an array of quantities
+        in a single call. Quantities above the ladder depth are priced at 0.
+        """
+        return numpy.interp(quantity, self.quantities[:self.size], self.prices[:self.size], left=None, right=0)
+
+    def __repr__(self):
+        return repr(list(zip(self.quantities[:self.size].tolist(), self.prices[:self.size].tolist())))
+
+
+_fix_time_second = None
+_fix_time_prefix = b''
+
+
+def fix_timestamp():
+    """
+    Returns the current UTC time as a FIX UTCTimestamp with milliseconds.
+    The date and time part is only formatted once per second.
+    """
+    global _fix_time_second, _fix_time_prefix
+    now = time.time()
+    second = int(now)
+    if second != _fix_time_second:
+        _fix_time_prefix = time.strftime(
+            '%Y%m%d-%H:%M:%S', time.gmtime(second)).encode('ascii')
+        _fix_time_second = second
+    return b'%s.%03d' % (_fix_time_prefix, int((now - second) * 1000))
+
+
+class order_template:
+    """
+    Pre-encoded NewOrderSingle (35=D) for one session, symbol, side and order
+    type. The static fields are encoded once, encode() only writes MsgSeqNum,
+    SendingTime, ClOrdID, TransactTime, OrderQty, Price, BodyLength and
+    CheckSum into a reusable buffer.
+    """
+
+    def __init__(self, sender_comp_id, target_comp_id, symbol, side, ord_type, time_in_force=None):
+        self.header = b'35=D\x0149=%s\x0156=%s\x0134=' % (
+            sender_comp_id.encode('ascii'), target_comp_id.encode('ascii'))
+        self.symbol_side = b'\x0155=%s\x0154=%s\x0160=' % (
+            symbol.encode('ascii'), side.encode('ascii'))
+        if ord_type == '2':  # OrdType "limit"
+            self.ord_type = b'\x0140=2\x0144='
+        else:
+            self.ord_type = b'\x0140=%s\x01' % ord_type.encode('ascii')
+        if time_in_force is not None:
+            self.time_in_force = b'\x0159=%s\x01' % time_in_force.encode('ascii')
+        else:
+            self.time_in_force = b'\x01'
+
+        self.body = bytearray()
+        self.msg = bytearray()
+
+    def encode(self, msg_seq_num, timestamp, id, quantity, price=None):
+        """
+        Returns the encoded message. The returned buffer is reused by the
+        next call, so it has to be sent before encoding another order.
+        """
+        body = self.body
+        del body[:]
+        body += self.header
+        body += b'%d' % msg_seq_num  # MsgSeqNum
+        body += b'\x0152='
+        body += timestamp  # SendingTime
+        body += b'\x0111='
+        body += str(id).encode('ascii')  # ClOrdID
+        body += self.symbol_side
+        body += timestamp  # TransactTime
+        body += b'\x0138='
+        body += str(quantity).encode('ascii')  # OrderQty
+        body += self.ord_type
+        if price is not None:
+            body += str(price).encode('ascii')  # Price
+            body += self.time_in_force
+
+        msg = self.msg
+        del msg[:]
+        msg += b'8=FIX.4.4\x019=%d\x01' % len(body)
+        msg += body
+        msg += b'10=%03d\x01' % (sum(msg) % 256)
+        return msg
+
+
+def _get_ladder(market_data, symbol):
+    ladder = market_data.get(symbol)
+    if ladder is None:
+        ladder = market_data[symbol] = md_ladder()
+    return ladder
+
+
+def decode_market_data_snapshot(buf, view, start, end, market_data_bid, market_data_offer):
+    """
+    Decodes the MarketDataSnapshotFullRefresh (35=W) held in buf[start:end]
+    in a single pass, writing prices and quantities straight into the bid and
+    offer ladders of its symbol, which are created on first use.
+    Returns the symbol.
+    """
+    symbol = None
+    bid = offer = ladder = None
+    # Entry being decoded, appended to its ladder once complete
+    price = quantity = None
+    pos = start
+    while pos < end:
+        soh = buf.find(b'\x01', pos, end)
+        if soh < 0:
+            break
+        if buf.startswith(b'270=', pos):  # MDEntryPx
+            price = float(view[pos + 4:soh])
+        elif buf.startswith(b'271=', pos):  # MDEntrySize
+            quantity = float(view[pos + 4:soh])
+        elif buf.startswith(b'269=', pos):  # MDEntryType
+            if ladder is not None and price is not None and quantity is not None:
+                ladder.append(quantity, price)
+            price = quantity = None
+            if soh - pos != 5:
+                ladder = None
+            elif buf[pos + 4] == 48:  # "bid"
+                ladder = bid
+            elif buf[pos + 4] == 49:  # "offer"
+                ladder = offer
+            else:
+                ladder = None
+        elif buf.startswith(b'55=', pos):  # Symbol
+            symbol = buf[pos + 3:soh].decode('utf-8')
+            bid = _get_ladder(market_data_bid, symbol)
+            offer = _get_ladder(market_data_offer, symbol)
+            bid.clear()
+            offer.clear()
+        elif buf.startswith(b'268=', pos):  # NoMDEntries
+            nb_md = int(view[pos + 4:soh])
+            bid.reserve(nb_md)
+            offer.reserve(nb_md)
+        pos = soh + 1
+    # An entry missing its price or size is dropped
+    if ladder is not None and price is not None and quantity is not None:
+        ladder.append(quantity, price)
+    return symbol
+
+
+def decode_market_data_incremental(buf, view, start, end, market_data_bid, market_data_offer):
+    """
+    Applies the MarketDataIncrementalRefresh (35=X) held in buf[start:end] in
+    place to the bid and offer ladders, in a single pass. Levels are
+    identified by their quantity (MDEntrySize). Returns the updated symbols.
+    """
+    symbols = []
+    action = entry_type = symbol = price = quantity = None
+    pos = start
+    while True:
+        soh = buf.find(b'\x01', pos, end) if pos < end else -1
+        if soh < 0 or buf.startswith(b'279=', pos):  # MDUpdateAction
+            # A new entry starts, apply the previous one
+            if action is not None and symbol is not None and quantity is not None:
+                if entry_type == 48:  # "bid"
+                    ladder = _get_ladder(market_data_bid, symbol)
+                elif entry_type == 49:  # "offer"
+                    ladder = _get_ladder(market_data_offer, symbol)
+                else:
+                    ladder = None
+                if ladder is not None:
+                    if action == 50:  # "delete"
+                        ladder.remove_level(quantity)
+                    elif price is not None:  # "new" or "change"
+                        ladder.set_level(quantity, price)
+                    if symbol not in symbols:
+                        symbols.append(symbol)
+            if soh < 0:
+                break
+            action = buf[pos + 4]
+            entry_type = price = quantity = None
+        elif buf.startswith(b'270=', pos):  # MDEntryPx
+            price = float(view[pos + 4:soh])
+        elif buf.startswith(b'271=', pos):  # MDEntrySize
+            quantity = float(view[pos + 4:soh])
+        elif buf.startswith(b'269=', pos):  # MDEntryType
+            entry_type = buf[pos + 4] if soh - pos == 5 else None
+        elif buf.startswith(b'55=', pos):  # Symbol, kept for the next entries if omitted
+            symbol = buf[pos + 3:soh].decode('utf-8')
+        pos = soh + 1
+    return symbols
+
+
+# Header and trailer tags rewritten when resending a message
+_RESEND_SKIPPED_TAGS = {b'8', b'9', b'35', b'49', b'56', b'34', b'52', b'10'}
+
+
+class stale_market_data_error(LookupError):
+    """
+    Raised when pricing a symbol whose ladders predate a disconnection.
+    """
+
 
 class fix_client:
-    def __init__(self, hostname, port, sender_comp_id, target_comp_id, username, password):
+    def __init__(self, hostname, port, sender_comp_id, target_comp_id, username, password, logger=None, store=None,
+                 reconnect=True, backoff=None, logon_timeout=5, use_tls=True):
         self.hostname = hostname
         self.port = port
 
         self.sender_comp_id = sender_comp_id
         self.target_comp_id = target_comp_id
-        self.msg_seq_num = 1
+
+        # With a store, the sequence numbers survive a restart and the
+        # session is resumed instead of reset at logon.
+        self.store = store
+        if store is not None:
+            self.msg_seq_num = store.next_out
+            self.next_in_seq_num = store.next_in
+        else:
+            self.msg_seq_num = 1
+            self.next_in_seq_num = 1
+        self.missing_in_seq_nums = set()
 
         self.username = username
         self.password = password
 
         self.market_data_bid = {}
         self.market_data_offer = {}
+        self.market_data_requests = []
+        self.stale_symbols = set()
         self.log_market_data = True
+        # Optional tick recorder, given every ladder update
+        self.recorder = None
+
+        # On a disconnection run() reconnects, resuming the TLS session, and
+        # replays the market data requests once logged on. The ladders are
+        # stale until the next snapshot.
+        self.reconnect = reconnect
+        self.backoff = backoff or jittered_backoff()
+        self.logon_timeout = logon_timeout
+        # Plain TCP without use_tls, for local test venues
+        self.use_tls = use_tls
+        self.ssl_context = fix_client._ssl_context()
+        self.tls_session = None
+        self.ssock = None
+        self.disconnected_at = None
+        self.last_gap = None
+        self.reconnects = 0
 
         self.running = False
         self.logged = False
 
+        self.logger = logger or default_logger()
+        self.log_prefix = '[' + target_comp_id + ']'
+
         self.parser = simplefix.FixParser()
+        self.recv_buffer = bytearray()
+        self.order_templates = {}
+        self.send_lock = threading.RLock()
+        self.orders = order_table()
+        self.heartbeat = heartbeat_manager(self)
 
     def run(self):
         self.running = True
-
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-
+        while self.running:
+            try:
+                self.connect()
+                connected_at = time.monotonic()
+                while self.running and self.heartbeat.link_up:
+                    try:
+                        self._recv_msg()
+                    except TimeoutError:
+                        pass
+                    self.heartbeat.poll()
+                    if not self.logged and time.monotonic() - connected_at > self.logon_timeout:
+                        raise ConnectionError('No Logon received')
+            except OSError as e:
+                self.logger.error(self.log_prefix, 'Connection lost:', e)
+            self._disconnect()
+            if not self.reconnect:
+                break
+            if self.running:
+                time.sleep(self.backoff.next())
+        self.heartbeat.stop()
+
+    def connect(self):
+        """
+        Connects and sends the Logon, without waiting for the answer.
+        """
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.ssock = context.wrap_socket(sock)
+        if self.use_tls:
+            sock = self.ssl_context.wrap_socket(sock, session=self.tls_session)
+        self.ssock = sock
+        self.parser = simplefix.FixParser()
+        self.recv_buffer = bytearray()
+        self.heartbeat.link_up = True
 
-        self.ssock.settimeout(5)
+        self.ssock.settimeout(1)
         self._log('Connecting on', self.hostname +
                   ':' + str(self.port) + '...')
         self.ssock.connect((self.hostname, self.port))
-        self._log('Connected on', self.hostname + ':' + str(self.port))
+        self._log('Connected on', self.hostname + ':' + str(self.port),
+                  '(TLS session resumed)' if getattr(self.ssock, 'session_reused', False) else '')
 
         self._send_logon()
 
-        while self.running:
-            try:
-                self._recv_msg()
-            except TimeoutError:
-                pass
-
     def stop(self):
         self.running = False
 
-    def send_market_data_request(self, symbols):
+    def is_stale(self, symbol):
+        return symbol in self.stale_symbols
+
+    def send_market_data_request(self, symbols, incremental=False):
+        """
+        Subscribes to market data for symbols. With incremental, the server
+        sends one snapshot (35=W) then only the updated levels (35=X).
+        The request is replayed after a reconnection.
+        """
+        self.market_data_requests.append((list(symbols), incremental))
+        self._send_market_data_request(symbols, incremental)
+
+    def _send_market_data_request(self, symbols, incremental):
         msg = self._msg_header('V')
         msg.append_pair(262, 'MDID0')  # MDReqID
         msg.append_pair(263, 1)  # SubscriptionRequestType
         msg.append_pair(264, 0)  # MarketDepth
-        msg.append_pair(265, 0)  # MDUpdateType
+        msg.append_pair(265, 1 if incremental else 0)  # MDUpdateType
         msg.append_pair(267, 2)  # NoMDEntryTypes
         msg.append_pair(269, 0)  # MDEntryType "bid"
         msg.append_pair(269, 1)  # MDEntryType "offer"
@@ -73,129 +411,398 @@ class fix_client:
             msg.append_pair(55, symbol)  # Symbol
         self._send_msg(msg)
 
+    def set_market_data(self, symbol, bid_quantities, bid_prices, offer_quantities, offer_prices):
+        """
+        Replaces the ladders of symbol, as a snapshot would, to replay
+        recorded market data.
+        """
+        _get_ladder(self.market_data_bid, symbol).assign(bid_quantities, bid_prices)
+        _get_ladder(self.market_data_offer, symbol).assign(offer_quantities, offer_prices)
+        self.stale_symbols.discard(symbol)
+
     def get_extp_bid(self, symbol, quantity):
-        return fix_client._get_price(self.market_data_bid[symbol], quantity)
+        self._check_stale([symbol])
+        return self.market_data_bid[symbol].get_price(quantity)
 
     def get_extp_offer(self, symbol, quantity):
-        return fix_client._get_price(self.market_data_offer[symbol], quantity)
+        self._check_stale([symbol])
+        return self.market_data_offer[symbol].get_price(quantity)
+
+    def get_extp_bids(self, symbols, quantities):
+        """
+        Prices every quantity for every symbol in one call.
+        Returns an array of shape (len(symbols), len(quantities)).
+        """
+        self._check_stale(symbols)
+        return fix_client._get_prices(self.market_data_bid, symbols, quantities)
+
+    def get_extp_offers(self, symbols, quantities):
+        """
+        Prices every quantity for every symbol in one call.
+        Returns an array of shape (len(symbols), len(quantities)).
+        """
+        self._check_stale(symbols)
+        return fix_client._get_prices(self.market_data_offer, symbols, quantities)
 
     def place_order_market_buy(self, id, symbol, quantity):
-        msg = self._msg_new_order_single_header(id, symbol, '1', quantity)
-        msg.append_pair(40, '1')  # OrdType "market"
-        self._send_msg(msg)
+        self._send_order(id, symbol, '1', '1', quantity)  # Side "buy", OrdType "market"
 
     def place_order_market_sell(self, id, symbol, quantity):
-        msg = self._msg_new_order_single_header(id, symbol, '2', quantity)
-        msg.append_pair(40, '1')  # OrdType "market"
-        self._send_msg(msg)
+        self._send_order(id, symbol, '2', '1', quantity)  # Side "sell", OrdType "market"
 
     def place_order_limit_fok_buy(self, id, symbol, quantity, limit_price):
-        msg = self._msg_new_order_single_header(id, symbol, '1', quantity)
-        msg.append_pair(40, '2')  # OrdType "limit"
-        msg.append_pair(44, limit_price)  # Price
-        msg.append_pair(59, 4)  # TimeInForce "fill or kill"
-        self._send_msg(msg)
+        # Side "buy", OrdType "limit", TimeInForce "fill or kill"
+        self._send_order(id, symbol, '1', '2', quantity, limit_price, '4')
 
     def place_order_limit_fok_sell(self, id, symbol, quantity, limit_price):
-        msg = self._msg_new_order_single_header(id, symbol, '2', quantity)
-        msg.append_pair(40, '2')  # OrdType "limit"
-        msg.append_pair(44, limit_price)  # Price
-        msg.append_pair(59, 4)  # TimeInForce "fill or kill"
-        self._send_msg(msg)
-
-    def _log(self, *args):
-        print('[' + self.target_comp_id + ']', *args)
+        # Side "sell", OrdType "limit", TimeInForce "fill or kill"
+        self._send_order(id, symbol, '2', '2', quantity, limit_price, '4')
 
-    def _get_price(quantities_and_prices, quantity):
-        return numpy.interp(quantity, quantities_and_prices[0], quantities_and_prices[1], left=None, right=0)
+    def _ssl_context():
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
 
-    def _msg_header(self, msg_type):
+    def _log(self, *args):
+        self.logger.info(self.log_prefix, *args)
+
+    def _check_stale(self, symbols):
+        if self.stale_symbols and not self.stale_symbols.isdisjoint(symbols):
+            raise stale_market_data_error(
+                'Stale market data for ' + ', '.join(self.stale_symbols.intersection(symbols)))
+
+    def _disconnect(self):
+        if self.ssock is not None:
+            # Kept to resume the TLS session on the next connection
+            self.tls_session = getattr(self.ssock, 'session', None) or self.tls_session
+            self.ssock.close()
+        was_logged = self.logged
+        self.logged = False
+        self.heartbeat.stop()
+        if was_logged and self.disconnected_at is None:
+            self.disconnected_at = time.monotonic()
+            self.stale_symbols.update(self.market_data_bid)
+            self.stale_symbols.update(self.market_data_offer)
+
+    def _on_reconnected(self):
+        self.last_gap = time.monotonic() - self.disconnected_at
+        self.disconnected_at = None
+        self.reconnects += 1
+        self.backoff.reset()
+        self._log('Reconnected after', round(self.last_gap * 1000, 3), 'ms')
+        for symbols, incremental in self.market_data_requests:
+            self._send_market_data_request(symbols, incremental)
+
+    def _get_prices(market_data, symbols, quantities):
+        quantities = numpy.asarray(quantities, dtype=numpy.float64)
+        prices = numpy.empty((len(symbols), len(quantities)))
+        for i, symbol in enumerate(symbols):
+            prices[i] = market_data[symbol].get_price(quantities)
+        return prices
+
+    def _msg_header(self, msg_type, msg_seq_num=None):
         msg = simplefix.FixMessage()
         msg.append_pair(8, "FIX.4.4", header=True)  # BeginString
         msg.append_pair(35, msg_type, header=True)  # MsgType
         msg.append_pair(49, self.sender_comp_id, header=True)  # SenderCompID
         msg.append_pair(56, self.target_comp_id, header=True)  # TargetCompID
-        msg.append_pair(34, self.msg_seq_num, header=True)  # MsgSeqNum
         msg.append_time(52, header=True)  # SendingTime
-        self.msg_seq_num += 1
+        if msg_seq_num is not None:  # else set by _send_msg
+            msg.append_pair(34, msg_seq_num, header=True)  # MsgSeqNum
         return msg
 
-    def _msg_new_order_single_header(self, id, symbol, side, quantity):
-        msg = self._msg_header('D')
-        msg.append_pair(11, id)  # ClOrdID
-        msg.append_pair(55, symbol)  # Symbol
-        msg.append_pair(54, side)  # Side
-        msg.append_time(60)  # TransactTime
-        msg.append_pair(38, quantity)  # OrderQty
-        return msg
+    def _send_order(self, id, symbol, side, ord_type, quantity, limit_price=None, time_in_force=None):
+        key = (symbol, side, ord_type, time_in_force)
+        template = self.order_templates.get(key)
+        if template is None:
+            template = order_template(self.sender_comp_id, self.target_comp_id,
+                                      symbol, side, ord_type, time_in_force)
+            self.order_templates[key] = template
+        # Registered before sending, the ExecutionReport may come back at once
+        self.orders.add(str(id), quantity)
+        with self.send_lock:
+            msg_seq_num = self.msg_seq_num
+            self.msg_seq_num += 1
+            data = template.encode(
+                msg_seq_num, fix_timestamp(), id, quantity, limit_price)
+            self._send_raw(data, msg_seq_num)
 
     def _send_logon(self):
+        reset = self.store is None or self.store.next_out == 1
+        if reset:
+            self.msg_seq_num = 1
+            self._set_next_in_seq_num(1)
+            self.missing_in_seq_nums.clear()
+            if self.store is not None:
+                self.store.reset()
         msg = self._msg_header('A')
         msg.append_pair(98, 0)  # EncryptMethod
-        msg.append_pair(108, 60)  # HeartBtInt
-        msg.append_pair(141, 'Y')  # ResetSeqNumFlag
+        msg.append_pair(108, self.heartbeat.heartbeat_interval)  # HeartBtInt
+        msg.append_pair(141, 'Y' if reset else 'N')  # ResetSeqNumFlag
         msg.append_pair(553, self.username)  # Username
         msg.append_pair(554, self.password)  # Password
         self._send_msg(msg)
 
+    def _send_heartbeat(self, test_req_id=None):
+        msg = self._msg_header('0')
+        if test_req_id is not None:
+            msg.append_pair(112, test_req_id)  # TestReqID
+        self._send_msg(msg)
+
+    def _send_test_request(self, test_req_id):
+        msg = self._msg_header('1')
+        msg.append_pair(112, test_req_id)  # TestReqID
+        self._send_msg(msg)
+
+    def _send_resend_request(self, begin_seq_num, end_seq_num):
+        msg = self._msg_header('2')
+        msg.append_pair(7, begin_seq_num)  # BeginSeqNo
+        msg.append_pair(16, end_seq_num)  # EndSeqNo
+        self._send_msg(msg)
+
+    def _send_gap_fill(self, msg_seq_num, new_seq_num):
+        msg = self._msg_header('4', msg_seq_num)
+        msg.append_pair(43, 'Y', header=True)  # PossDupFlag
+        msg.append_pair(123, 'Y')  # GapFillFlag
+        msg.append_pair(36, new_seq_num)  # NewSeqNo
+        self._send_raw(msg.encode())
+
+    def _resend(self, data):
+        parser = simplefix.FixParser()
+        parser.append_buffer(data)
+        original = parser.get_message()
+        msg = self._msg_header(original.get(35).decode(
+            'utf-8'), int(original.get(34)))
+        msg.append_pair(43, 'Y', header=True)  # PossDupFlag
+        msg.append_pair(122, original.get(52), header=True)  # OrigSendingTime
+        for tag, value in original.pairs:
+            if tag not in _RESEND_SKIPPED_TAGS:
+                msg.append_pair(tag, value)
+        self._send_raw(msg.encode())
+
     def _send_msg(self, msg):
-        self._log('Sending', msg, '...')
-        self.ssock.send(msg.encode())
-        self._log('Sent:', msg)
+        # MsgSeqNum is only allocated here, so that messages sent from
+        # several threads go out in sequence.
+        with self.send_lock:
+            msg_seq_num = self.msg_seq_num
+            self.msg_seq_num += 1
+            msg.append_pair(34, msg_seq_num, header=True)  # MsgSeqNum
+            self._send_raw(msg.encode(), msg_seq_num)
+
+    def _send_raw(self, data, msg_seq_num=None):
+        """
+        Sends an encoded message, storing it first if it has a new MsgSeqNum
+        and is an application message.
+        """
+        with self.send_lock:
+            if self.store is not None and msg_seq_num is not None:
+                if fix_client._is_session_msg(data):
+                    self.store.set_next_out(msg_seq_num + 1)
+                else:
+                    self.store.append(msg_seq_num, data)
+            self._write(data)
+            self.heartbeat.last_sent = time.monotonic()
+        if self.logger.level <= DEBUG:
+            self.logger.debug(self.log_prefix, 'Sent:', fix_text(bytes(data)))
+
+    def _write(self, data):
+        # The socket is non-blocking when driven by a fix_session_manager
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[self.ssock.send(view):]
+            except (ssl.SSLWantWriteError, BlockingIOError):
+                select.select([], [self.ssock], [], 1)
 
     def _recv_msg(self):
-        data = self.ssock.recv()
-        self.parser.append_buffer(data)
+        data = self.ssock.recv(65536)
+        if not data:
+            raise ConnectionResetError('Connection closed by the server')
+        self._process_data(data)
+
+    def _process_data(self, data):
+        self.heartbeat.last_received = time.monotonic()
+        buf = self.recv_buffer
+        buf += data
+        pos = 0
+
+        # Messages are framed on BodyLength, so that market data snapshots
+        # can be decoded straight from the receive buffer.
+        with memoryview(buf) as view:
+            while True:
+                start = buf.find(b'8=FIX', pos)
+                if start < 0:
+                    break
+                begin_string_end = buf.find(b'\x01', start)
+                if begin_string_end < 0:
+                    break
+                body_length_end = buf.find(b'\x01', begin_string_end + 1)
+                if body_length_end < 0:
+                    break
+                body_length = int(view[begin_string_end + 3:body_length_end])
+                end = body_length_end + 1 + body_length + 7  # 10=XXX<SOH>
+                if end > len(buf):
+                    break
+
+                if not buf.startswith(b'35=4\x01', body_length_end + 1) and \
+                        not self._check_msg_seq_num(buf, view, start, end):
+                    pos = end
+                    continue
+
+                if buf.startswith(b'35=W\x01', body_length_end + 1):
+                    self._on_market_data(buf, view, start, end, False)
+                elif buf.startswith(b'35=X\x01', body_length_end + 1):
+                    self._on_market_data(buf, view, start, end, True)
+                else:
+                    self.parser.append_buffer(view[start:end].tobytes())
+                    self._on_msg(self.parser.get_message())
+                pos = end
+
+        del buf[:pos]
+
+    def _check_msg_seq_num(self, buf, view, start, end):
+        """
+        Tracks the inbound MsgSeqNum and requests the resend of the missing
+        messages on a gap. Returns False for a message already received.
+        """
+        tag = buf.find(b'\x0134=', start, end)
+        if tag < 0:
+            return True
+        msg_seq_num = int(view[tag + 4:buf.find(b'\x01', tag + 4, end)])
+        expected = self.next_in_seq_num
+        if msg_seq_num == expected:
+            self._set_next_in_seq_num(expected + 1)
+            return True
+        if msg_seq_num > expected:
+            self.logger.warning(self.log_prefix, 'MsgSeqNum gap: expected',
+                                expected, 'received', msg_seq_num)
+            self.missing_in_seq_nums.update(range(expected, msg_seq_num))
+            self._set_next_in_seq_num(msg_seq_num + 1)
+            self._send_resend_request(expected, msg_seq_num - 1)
+            return True
+        if msg_seq_num in self.missing_in_seq_nums:
+            self.missing_in_seq_nums.discard(msg_seq_num)
+            return True
+        if buf.find(b'\x0143=Y\x01', start, end) < 0:  # PossDupFlag
+            self.logger.error(self.log_prefix, 'MsgSeqNum too low: expected',
+                              expected, 'received', msg_seq_num)
+        return False
+
+    def _set_next_in_seq_num(self, msg_seq_num):
+        self.next_in_seq_num = msg_seq_num
+        if self.store is not None:
+            self.store.set_next_in(msg_seq_num)
+
+    def _on_resend_request(self, msg):
+        begin_seq_num = int(msg.get(7))  # BeginSeqNo
+        end_seq_num = int(msg.get(16))  # EndSeqNo
+        last_seq_num = self.msg_seq_num - 1
+        if end_seq_num == 0 or end_seq_num > last_seq_num:
+            end_seq_num = last_seq_num
+        self._log('Received ResendRequest from',
+                  begin_seq_num, 'to', end_seq_num)
+
+        # Application messages are resent as possible duplicates, session
+        # messages and the ones no longer stored are skipped with a gap fill.
+        gap_fill_seq_num = None
+        for msg_seq_num in range(begin_seq_num, end_seq_num + 1):
+            data = self.store.get(
+                msg_seq_num) if self.store is not None else None
+            if data is None or fix_client._is_session_msg(data):
+                if gap_fill_seq_num is None:
+                    gap_fill_seq_num = msg_seq_num
+                continue
+            if gap_fill_seq_num is not None:
+                self._send_gap_fill(gap_fill_seq_num, msg_seq_num)
+                gap_fill_seq_num = None
+            self._resend(data)
+        if gap_fill_seq_num is not None:
+            self._send_gap_fill(gap_fill_seq_num, end_seq_num + 1)
+
+    def _on_sequence_reset(self, msg):
+        new_seq_num = int(msg.get(36))  # NewSeqNo
+        self._log('Received SequenceReset to', new_seq_num)
+        if msg.get(123) == b'Y':  # GapFillFlag
+            self.missing_in_seq_nums.difference_update(
+                range(int(msg.get(34)), new_seq_num))
+            if new_seq_num > self.next_in_seq_num:
+                self._set_next_in_seq_num(new_seq_num)
+        else:
+            self.missing_in_seq_nums.clear()
+            self._set_next_in_seq_num(new_seq_num)
+
+    def _is_session_msg(data):
+        i = data.find(b'\x0135=')
+        return data[i + 5] == 1 and data[i + 4] in b'012345A'
+
+    def _on_market_data(self, buf, view, start, end, incremental):
+        if incremental:
+            symbols = decode_market_data_incremental(
+                buf, view, start, end, self.market_data_bid, self.market_data_offer)
+        else:
+            symbols = [decode_market_data_snapshot(
+                buf, view, start, end, self.market_data_bid, self.market_data_offer)]
+            if self.stale_symbols:
+                self.stale_symbols.difference_update(symbols)
+        if self.recorder is not None:
+            for symbol in symbols:
+                bid = self.market_data_bid[symbol]
+                offer = self.market_data_offer[symbol]
+                self.recorder.record(symbol, bid.prices[:bid.size], bid.quantities[:bid.size],
+                                     offer.prices[:offer.size], offer.quantities[:offer.size])
+        if self.log_market_data:
+            # Ladders are updated in place: log copies, formatted later by the logger
+            self._log('Received market data:', fix_text(view[start:end].tobytes()))
+            for symbol in symbols:
+                bid = self.market_data_bid[symbol]
+                offer = self.market_data_offer[symbol]
+                self._log(symbol, 'BID:', bid.quantities[:bid.size].copy(), bid.prices[:bid.size].copy(),
+                          'OFFER:', offer.quantities[:offer.size].copy(), offer.prices[:offer.size].copy())
+        return symbols
+
+    def _on_msg(self, msg):
+        if msg.get(35) == b'A':
+            self._log('Received Logon:', msg)
+            self.logged = True
+            self.heartbeat.start()
+            if self.disconnected_at is not None:
+                self._on_reconnected()
+
+        elif msg.get(35) == b'0':
+            self.heartbeat.on_heartbeat(msg.get(112))
+
+        elif msg.get(35) == b'1':
+            self._send_heartbeat(msg.get(112))
+
+        elif msg.get(35) == b'8':
+            self.orders.on_execution_report(msg)
+            self._log('Received ExecutionReport:', msg)
+            self._log('- ClOrdID / OrderID', msg.get(11), '/', msg.get(37))
+            if msg.get(39) == b'0':
+                self._log('- OrdStatus NEW')
+            elif msg.get(39) == b'8':
+                self._log('- OrdStatus REJECTED')
+                self._log('- Text', msg.get(58))
+            elif msg.get(39) == b'2':
+                self._log('- OrdStatus FILLED')
+                self._log('- AvgPx', msg.get(6))
+            else:
+                self._log('- OrdStatus UNKNOWN')
 
-        while True:
-            msg = self.parser.get_message()
-            if msg == None:
-                break
+        elif msg.get(35) == b'2':
+            self._on_resend_request(msg)
 
-            if msg.get(35) == b'A':
-                self._log('Received Logon:', msg)
-                self.logged = True
-
-            elif msg.get(35) == b'W':
-                if self.log_market_data:
-                    self._log('Received market data:', msg)
-                symbol = msg.get(55).decode('utf-8')
-                nb_md = int(msg.get(268))
-                if self.log_market_data:
-                    self._log(nb_md, 'entries for', symbol)
-                self.market_data_bid[symbol] = ([], [])
-                self.market_data_offer[symbol] = ([], [])
-                for i in range(1, nb_md):
-                    if msg.get(269, i) == b'0':
-                        market_data = self.market_data_bid[symbol]
-                    elif msg.get(269, i) == b'1':
-                        market_data = self.market_data_offer[symbol]
-                    market_data[0].append(float(msg.get(271, i)))
-                    market_data[1].append(float(msg.get(270, i)))
-                if self.log_market_data:
-                    self._log('BID:', self.market_data_bid)
-                    self._log('OFFER:', self.market_data_offer)
-
-            elif msg.get(35) == b'8':
-                self._log('Received ExecutionReport:', msg)
-                self._log('- ClOrdID / OrderID', msg.get(11), '/', msg.get(37))
-                if msg.get(39) == b'0':
-                    self._log('- OrdStatus NEW')
-                elif msg.get(39) == b'8':
-                    self._log('- OrdStatus REJECTED')
-                    self._log('- Text', msg.get(58))
-                elif msg.get(39) == b'2':
-                    self._log('- OrdStatus FILLED')
-                    self._log('- AvgPx', msg.get(6))
-                else:
-                    self._log('- OrdStatus UNKNOWN')
+        elif msg.get(35) == b'4':
+            self._on_sequence_reset(msg)
 
-            elif msg.get(35) == b'5':
-                self._log('Received Logout:', msg)
-                self.logged = False
+        elif msg.get(35) == b'5':
+            self._log('Received Logout:', msg)
+            self.logged = False
+            self.heartbeat.stop()
 
-            else:
-                self._log('Received unknown message:', msg)
+        else:
+            self.logger.warning(self.log_prefix, 'Received unknown message:', msg)
 
 
 def run_fix_client_in_thread(fix_session):
@@ -219,10 +826,11 @@ if __name__ == "__main__":
     print('- retrieves market data from the market data session')
     print('- places MARKET orders')
     print('- places LIMIT/FOK orders using the market data')
+    print('- handles Heartbeat and TestRequest messages')
+    print('- reconnects and replays its market data requests')
     print('This example DOES NOT:')
     print('- handle possible errors')
     print('- handle all possible FIX messages')
-    print('- handle or send Hearbeat and TestRequest messages')
     print()
 
     parser = argparse.ArgumentParser()
@@ -231,25 +839,44 @@ if __name__ == "__main__":
     parser.add_argument('target_comp_id_prefix', help='Target Comp ID Prefix')
     parser.add_argument('username', help='Username')
     parser.add_argument('password', help='Password')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Subscribe to incremental market data refresh (35=X)')
+    parser.add_argument('--debug', action='store_true',
+                        help='Also log every message sent')
+    parser.add_argument('--no-tls', action='store_true',
+                        help='Connect over plain TCP, e.g. to a local mock venue')
+    parser.add_argument('--store-dir',
+                        help='Directory where sequence numbers and sent messages are kept, to resume sessions')
     args = parser.parse_args()
+    if args.debug:
+        default_logger().level = DEBUG
     market_data_port = 40001
     market_access_port = 40002
 
     # Market Data Session
+    def session_store(target_comp_id):
+        if args.store_dir is None:
+            return None
+        return fix_store(os.path.join(args.store_dir, args.sender_comp_id + '-' + target_comp_id))
+
     market_data_session = fix_client(args.hostname, market_data_port, args.sender_comp_id,
-                                     args.target_comp_id_prefix + '_MDATA', args.username, args.password)
+                                     args.target_comp_id_prefix + '_MDATA', args.username, args.password,
+                                     store=session_store(args.target_comp_id_prefix + '_MDATA'),
+                                     use_tls=not args.no_tls)
     run_fix_client_in_thread(market_data_session)
 
     # Display some market data for few seconds
     market_data_session.send_market_data_request(
-        ['BTC-USD', 'ETH-USD', 'LTC-USD'])
+        ['BTC-USD', 'ETH-USD', 'LTC-USD'], args.incremental)
     time.sleep(3)
     market_data_session.log_market_data = False
     print()
 
     # Order Session
     order_session = fix_client(args.hostname, market_access_port, args.sender_comp_id,
-                               args.target_comp_id_prefix + '_ORDER', args.username, args.password)
+                               args.target_comp_id_prefix + '_ORDER', args.username, args.password,
+                               store=session_store(args.target_comp_id_prefix + '_ORDER'),
+                               use_tls=not args.no_tls)
     run_fix_client_in_thread(order_session)
 
     # Placing Orders
@@ -0,0 +1,215 @@
+import array
+import time
+
+
+class timer_wheel:
+    """
+    Hashed timer wheel: a timer is put in the slot of the tick it expires at,
+    so scheduling and cancelling are O(1) and advance() only visits the slots
+    of the elapsed ticks, whatever the number of timers.
+    """
+
+    def __init__(self, tick=0.1, nb_slots=1024):
+        self.tick = tick
+        self.slots = [[] for _ in range(nb_slots)]
+        self.current_tick = int(time.monotonic() / tick)
+
+    def schedule(self, delay, callback):
+        """
+        Calls callback() once, delay seconds from now.
+        Returns the timer, to be passed to cancel().
+        """
+        deadline = max(int((time.monotonic() + delay) / self.tick),
+                       self.current_tick + 1)
+        timer = [deadline, callback]
+        self.slots[deadline % len(self.slots)].append(timer)
+        return timer
+
+    def cancel(self, timer):
+        timer[1] = None
+
+    def advance(self, now=None):
+        """
+        Fires the timers expired at now, from the calling thread.
+        """
+        if now is None:
+            now = time.monotonic()
+        now_tick = int(now / self.tick)
+        first_tick = self.current_tick + 1
+        if now_tick - first_tick >= len(self.slots):
+            first_tick = now_tick - len(self.slots) + 1
+        self.current_tick = now_tick
+
+        for tick in range(first_tick, now_tick + 1):
+            slot = self.slots[tick % len(self.slots)]
+            if not slot:
+                continue
+            expired = [timer for timer in slot if timer[0] <= now_tick]
+            if not expired:
+                continue
+            slot[:] = [timer for timer in slot if timer[0] > now_tick]
+            for timer in expired:
+                if timer[1] is not None:
+                    timer[1]()
+
+
+class latency_histogram:
+    """
+    HDR-style latency histogram: values are counted in log-linear buckets,
+    exact below 2**sub_bucket_bits and with a relative precision of
+    2**(1 - sub_bucket_bits) above (under 2% with the default 7 bits).
+    Recording is O(1) and the memory used is fixed.
+    """
+
+    def __init__(self, sub_bucket_bits=7, max_bits=48):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.counts = array.array('Q', bytes(8 * (
+            self.sub_bucket_count + (max_bits - sub_bucket_bits + 1) * self.half_count)))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        value = int(value)
+        if value < self.sub_bucket_count:
+            index = max(value, 0)
+        else:
+            exponent = value.bit_length() - self.sub_bucket_bits
+            index = self.sub_bucket_count + (exponent - 1) * self.half_count + \
+                (value >> exponent) - self.half_count
+            index = min(index, len(self.counts) - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percentile):
+        """
+        Returns the highest value equivalent to the given percentile, or None
+        if nothing has been recorded.
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, int(percentile / 100 * self.count + 0.5))
+        cumulated = 0
+        for index, count in enumerate(self.counts):
+            cumulated += count
+            if cumulated >= rank:
+                return min(self._highest_value(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def summary(self):
+        return {'count': self.count, 'min': self.min, 'mean': self.mean(),
+                'p50': self.percentile(50), 'p99': self.percentile(99),
+                'p99.9': self.percentile(99.9), 'max': self.max}
+
+    def _highest_value(self, index):
+        if index < self.sub_bucket_count:
+            return index
+        index -= self.sub_bucket_count
+        exponent = index // self.half_count + 1
+        sub_bucket = index % self.half_count + self.half_count
+        return ((sub_bucket + 1) << exponent) - 1
+
+
+class heartbeat_manager:
+    """
+    Keeps a FIX session alive and measures its link:
+    - sends a Heartbeat (35=0) when nothing has been sent for HeartBtInt,
+    - sends a TestRequest (35=1) when nothing has been received for HeartBtInt
+      plus a grace period, and flags the link as down if it stays unanswered,
+    - probes the link with a TestRequest every probe_interval seconds and
+      records the round trip times, in microseconds, into `rtt`.
+    The timers run on a timer_wheel, which can be shared between sessions and
+    has to be advanced by the loop driving them.
+    """
+
+    def __init__(self, session, heartbeat_interval=60, probe_interval=10, wheel=None):
+        self.session = session
+        self.heartbeat_interval = heartbeat_interval
+        self.probe_interval = probe_interval
+        self.wheel = wheel or timer_wheel()
+
+        self.rtt = latency_histogram()
+        self.link_up = True
+        self.last_sent = time.monotonic()
+        self.last_received = time.monotonic()
+        self.pending_test_requests = {}
+        self.timers = []
+
+    def start(self):
+        self.stop()
+        self.last_received = time.monotonic()
+        self.link_up = True
+        self.timers = [self.wheel.schedule(self.heartbeat_interval, self._check_sent),
+                       self.wheel.schedule(self.heartbeat_interval * 1.2, self._check_received)]
+        if self.probe_interval:
+            self.timers.append(self.wheel.schedule(
+                self.probe_interval, self._probe))
+
+    def stop(self):
+        for timer in self.timers:
+            self.wheel.cancel(timer)
+        self.timers = []
+        self.pending_test_requests.clear()
+
+    def poll(self, now=None):
+        self.wheel.advance(now)
+
+    def on_heartbeat(self, test_req_id):
+        if test_req_id is None:
+            return
+        sent = self.pending_test_requests.pop(test_req_id, None)
+        if sent is not None:
+            self.rtt.record((time.monotonic() - sent) * 1000000)
+
+    def _send_test_request(self):
+        test_req_id = b'TEST-%d' % time.monotonic_ns()
+        self.pending_test_requests[test_req_id] = time.monotonic()
+        self.session._send_test_request(test_req_id)
+
+    def _check_sent(self):
+        idle = time.monotonic() - self.last_sent
+        if idle >= self.heartbeat_interval:
+            self.session._send_heartbeat()
+            idle = 0
+        self.timers[0] = self.wheel.schedule(
+            self.heartbeat_interval - idle, self._check_sent)
+
+    def _check_received(self):
+        timeout = self.heartbeat_interval * 1.2
+        idle = time.monotonic() - self.last_received
+        if idle >= 2 * timeout:
+            if self.link_up:
+                self.session.logger.error(
+                    self.session.log_prefix, 'No message received for', int(idle), 's, link is down')
+            self.link_up = False
+        elif idle >= timeout:
+            self._send_test_request()
+        else:
+            self.link_up = True
+        self.timers[1] = self.wheel.schedule(
+            max(timeout - idle, timeout / 2), self._check_received)
+
+    def _probe(self):
+        # Unanswered probes are forgotten, so that the pending ones stay few
+        self.pending_test_requests.clear()
+        self._send_test_request()
+        self.timers[2] = self.wheel.schedule(self.probe_interval, self._probe)
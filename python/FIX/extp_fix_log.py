@@ -0,0 +1,120 @@
+import atexit
+import collections
+import itertools
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+_LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+
+class fix_text:
+    """
+    Lazily formats a raw FIX message, replacing SOH with '|'.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return self.data.replace(b'\x01', b'|').decode('utf-8', 'replace')
+
+
+class fix_logger:
+    """
+    Logger keeping the formatting and the writes off the calling thread:
+    records are pushed unformatted into a bounded ring buffer and a
+    background thread formats and writes them.
+
+    Producers never block nor take a lock. Once the buffer is half full, only
+    1 DEBUG/INFO record out of sample_rate is kept, and when it is full every
+    record is dropped. The number of lost records is kept in `dropped`.
+    """
+
+    def __init__(self, level=INFO, capacity=8192, sample_rate=10, stream=None, flush_interval=0.01):
+        self.level = level
+        self.capacity = capacity
+        self.high_watermark = capacity // 2
+        self.sample_rate = sample_rate
+        self.stream = stream or sys.stdout
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self.records = collections.deque()
+        self._sample_counter = itertools.count()
+        self._running = True
+        self._writer = threading.Thread(
+            None, self._run, 'fix_logger', daemon=True)
+        self._writer.start()
+
+    def is_enabled_for(self, level):
+        return level >= self.level
+
+    def debug(self, *args):
+        if self.level <= DEBUG:
+            self._push(DEBUG, args)
+
+    def info(self, *args):
+        if self.level <= INFO:
+            self._push(INFO, args)
+
+    def warning(self, *args):
+        if self.level <= WARNING:
+            self._push(WARNING, args)
+
+    def error(self, *args):
+        self._push(ERROR, args)
+
+    def close(self):
+        self._running = False
+        self._writer.join()
+
+    def _push(self, level, args):
+        depth = len(self.records)
+        if depth >= self.high_watermark:
+            if depth >= self.capacity or (level < WARNING and next(self._sample_counter) % self.sample_rate):
+                self.dropped += 1
+                return
+        self.records.append((time.time(), level, args))
+
+    def _run(self):
+        reported_dropped = 0
+        while True:
+            running = self._running
+            lines = []
+            while self.records:
+                timestamp, level, args = self.records.popleft()
+                lines.append('%s.%06d %s %s\n' % (
+                    time.strftime('%H:%M:%S', time.localtime(timestamp)),
+                    int((timestamp % 1) * 1000000),
+                    _LEVEL_NAMES[level],
+                    ' '.join(str(arg) for arg in args)))
+            if self.dropped != reported_dropped:
+                lines.append('%d log records dropped\n' %
+                             (self.dropped - reported_dropped))
+                reported_dropped = self.dropped
+            if lines:
+                self.stream.write(''.join(lines))
+                self.stream.flush()
+            if not running:
+                break
+            time.sleep(self.flush_interval)
+
+
+_default_logger = None
+
+
+def default_logger():
+    """
+    Returns the logger shared by all the sessions of the process.
+    """
+    global _default_logger
+    if _default_logger is None:
+        _default_logger = fix_logger()
+        atexit.register(_default_logger.close)
+    return _default_logger
@@ -0,0 +1,205 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+import numpy
+
+# OrdStatus, as stored in order_table.status
+PENDING = 0  # sent, no ExecutionReport yet
+NEW = ord('0')
+PARTIALLY_FILLED = ord('1')
+FILLED = ord('2')
+DONE_FOR_DAY = ord('3')
+CANCELED = ord('4')
+REJECTED = ord('8')
+EXPIRED = ord('C')
+
+TERMINAL_STATUSES = (FILLED, DONE_FOR_DAY, CANCELED, REJECTED, EXPIRED)
+
+order_state = collections.namedtuple('order_state', [
+    'cl_ord_id', 'order_id', 'status', 'quantity', 'cum_qty', 'avg_px', 'text', 'latency'])
+order_state.__doc__ = """
+Snapshot of an order. latency is the time in seconds between the send and
+the last ExecutionReport.
+"""
+
+
+class order_table:
+    """
+    Orders of a session indexed by ClOrdID. The state of each order lives in
+    a slot of preallocated arrays (status, quantities, prices, times), so an
+    ExecutionReport only costs a dict lookup and a few array writes.
+
+    When an order reaches a terminal state, the callbacks are called and the
+    futures returned by future() are resolved with its order_state, from the
+    thread receiving the ExecutionReport. The last `retain` terminal orders
+    are kept, for the get() and future() calls coming late; the slots of the
+    older ones are reused, so that the table does not grow with the session.
+    """
+
+    def __init__(self, capacity=1024, retain=256):
+        self.slots = {}
+        self.retain = retain
+        # (ClOrdID, sent time) of the terminal orders, oldest first
+        self.terminal = collections.deque()
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.cl_ord_ids = [None] * capacity
+        self.order_ids = [None] * capacity
+        self.texts = [None] * capacity
+        self.status = numpy.zeros(capacity, dtype=numpy.uint8)
+        self.quantity = numpy.zeros(capacity)
+        self.cum_qty = numpy.zeros(capacity)
+        self.avg_px = numpy.zeros(capacity)
+        self.sent_time = numpy.zeros(capacity)
+        self.update_time = numpy.zeros(capacity)
+
+        self.callbacks = []
+        self.futures = {}
+        # Guards futures between future() and the receiving thread
+        self.lock = threading.Lock()
+
+    def add(self, cl_ord_id, quantity):
+        """
+        Registers an order about to be sent. Returns its slot, which is the
+        slot of the previous order of the same ClOrdID if any.
+        """
+        slot = self.slots.get(cl_ord_id)
+        if slot is None:
+            if not self.free_slots:
+                self._grow()
+            slot = self.free_slots.pop()
+            self.slots[cl_ord_id] = slot
+        else:
+            # The futures of the previous order will never resolve
+            with self.lock:
+                future = self.futures.pop(cl_ord_id, None)
+            if future is not None:
+                future.cancel()
+        self.cl_ord_ids[slot] = cl_ord_id
+        self.order_ids[slot] = None
+        self.texts[slot] = None
+        self.status[slot] = PENDING
+        self.quantity[slot] = quantity
+        self.cum_qty[slot] = 0
+        self.avg_px[slot] = 0
+        self.sent_time[slot] = self.update_time[slot] = time.monotonic()
+        return slot
+
+    def release(self, cl_ord_id):
+        """
+        Forgets an order, its slot is reused by the next ones.
+        """
+        slot = self.slots.pop(cl_ord_id, None)
+        if slot is not None:
+            self.cl_ord_ids[slot] = None
+            self.free_slots.append(slot)
+            with self.lock:
+                future = self.futures.pop(cl_ord_id, None)
+            if future is not None:
+                future.cancel()
+
+    def get(self, cl_ord_id):
+        slot = self.slots.get(cl_ord_id)
+        if slot is None:
+            return None
+        return self._state(slot)
+
+    def is_terminal(self, cl_ord_id):
+        slot = self.slots.get(cl_ord_id)
+        return slot is not None and self.status[slot] in TERMINAL_STATUSES
+
+    def add_callback(self, callback):
+        """
+        callback(order_state) will be called for every order reaching a
+        terminal state.
+        """
+        self.callbacks.append(callback)
+
+    def future(self, cl_ord_id):
+        """
+        Returns a concurrent.futures.Future resolved with the order_state once
+        the order reaches a terminal state. In a coroutine, it can be awaited
+        with asyncio.wrap_future().
+        """
+        with self.lock:
+            future = self.futures.get(cl_ord_id)
+            if future is None:
+                future = concurrent.futures.Future()
+                slot = self.slots.get(cl_ord_id)
+                if slot is not None and self.status[slot] in TERMINAL_STATUSES:
+                    future.set_result(self._state(slot))
+                else:
+                    self.futures[cl_ord_id] = future
+        return future
+
+    def on_execution_report(self, msg):
+        """
+        Applies an ExecutionReport (35=8). Returns the order slot, or None.
+        """
+        cl_ord_id = msg.get(11)  # ClOrdID
+        if cl_ord_id is None:
+            return None
+        cl_ord_id = cl_ord_id.decode('utf-8')
+        slot = self.slots.get(cl_ord_id)
+        if slot is None:
+            # Order sent by a previous run of the session
+            slot = self.add(cl_ord_id, float(msg.get(38) or 0))
+        elif self.status[slot] in TERMINAL_STATUSES:
+            return slot
+
+        ord_status = msg.get(39)  # OrdStatus
+        if ord_status is not None:
+            self.status[slot] = ord_status[0]
+        order_id = msg.get(37)  # OrderID
+        if order_id is not None:
+            self.order_ids[slot] = order_id.decode('utf-8')
+        cum_qty = msg.get(14)  # CumQty
+        if cum_qty is not None:
+            self.cum_qty[slot] = float(cum_qty)
+        elif msg.get(32) is not None:  # LastQty
+            self.cum_qty[slot] += float(msg.get(32))
+        avg_px = msg.get(6)  # AvgPx
+        if avg_px is not None:
+            self.avg_px[slot] = float(avg_px)
+        text = msg.get(58)  # Text
+        if text is not None:
+            self.texts[slot] = text.decode('utf-8')
+        self.update_time[slot] = time.monotonic()
+        if self.status[slot] == FILLED and cum_qty is None:
+            self.cum_qty[slot] = self.quantity[slot]
+
+        if self.status[slot] in TERMINAL_STATUSES:
+            state = self._state(slot)
+            for callback in self.callbacks:
+                callback(state)
+            with self.lock:
+                future = self.futures.pop(cl_ord_id, None)
+            if future is not None and not future.done():
+                future.set_result(state)
+            self._retire(cl_ord_id, slot)
+        return slot
+
+    def _state(self, slot):
+        return order_state(self.cl_ord_ids[slot], self.order_ids[slot], int(self.status[slot]),
+                           float(self.quantity[slot]), float(
+                               self.cum_qty[slot]), float(self.avg_px[slot]),
+                           self.texts[slot], float(self.update_time[slot] - self.sent_time[slot]))
+
+    def _retire(self, cl_ord_id, slot):
+        self.terminal.append((cl_ord_id, self.sent_time[slot]))
+        while len(self.terminal) > self.retain:
+            cl_ord_id, sent_time = self.terminal.popleft()
+            slot = self.slots.get(cl_ord_id)
+            # Unless the ClOrdID was reused by a live order since
+            if slot is not None and self.sent_time[slot] == sent_time and self.status[slot] in TERMINAL_STATUSES:
+                self.release(cl_ord_id)
+
+    def _grow(self):
+        capacity = len(self.cl_ord_ids)
+        self.free_slots = list(range(2 * capacity - 1, capacity - 1, -1))
+        self.cl_ord_ids.extend([None] * capacity)
+        self.order_ids.extend([None] * capacity)
+        self.texts.extend([None] * capacity)
+        for name in ('status', 'quantity', 'cum_qty', 'avg_px', 'sent_time', 'update_time'):
+            setattr(self, name, numpy.resize(getattr(self, name), 2 * capacity))
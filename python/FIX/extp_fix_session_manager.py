@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import selectors
+import ssl
+import sys
+import threading
+import time
+
+if __name__ == '__main__':
+    # The modules shared with the other directories are in python/, see extp_paths
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from extp_fix_client import fix_client
+from extp_fix_heartbeat import timer_wheel
+
+
+class session_stats:
+    def __init__(self):
+        self.bytes_received = 0
+        self.reads = 0
+        self.last_read = None
+        self.disconnected = False
+        self.connected_at = None
+        self.reconnect_timer = None
+
+
+class fix_session_manager:
+    """
+    Drives any number of fix_client sessions from a single thread: their
+    sockets are multiplexed with a selector (epoll on Linux) instead of
+    running one thread per session, and their heartbeats share one timer
+    wheel. The loop can be pinned to a CPU core.
+
+    Orders can still be sent from any thread with the usual fix_client
+    methods: the loop reads a session under its send_lock, so that the SSL
+    object of its socket is never read and written at the same time.
+
+    A session whose link is down, or which got no Logon in time, is
+    disconnected. If its reconnect attribute is set, it is reconnected by the
+    loop after its backoff delay (the TCP and TLS handshakes then block the
+    loop), otherwise it is removed.
+    """
+
+    def __init__(self, cpu=None, tick=0.1):
+        self.cpu = cpu
+        self.selector = selectors.DefaultSelector()
+        self.wheel = timer_wheel(tick)
+        self.sessions = {}
+        self.running = False
+
+    def add(self, session):
+        """
+        Connects the session and sends its Logon, its messages are then read
+        by the loop.
+        """
+        session.heartbeat.wheel = self.wheel
+        self.sessions[session] = session_stats()
+        try:
+            self._connect(session)
+        except OSError:
+            del self.sessions[session]
+            raise
+
+    def remove(self, session):
+        session_stat = self.sessions.pop(session, None)
+        if session_stat is not None and session_stat.reconnect_timer is not None:
+            self.wheel.cancel(session_stat.reconnect_timer)
+        self._unregister(session)
+        session.running = False
+        session._disconnect()
+
+    def wait_logon(self, timeout=5):
+        """
+        Waits until every session is logged, returns the ones which are not.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(session.logged for session in self.sessions):
+                break
+            time.sleep(0.01)
+        return [session for session in self.sessions if not session.logged]
+
+    def run(self):
+        if self.cpu is not None and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {self.cpu})
+
+        self.running = True
+        while self.running:
+            for key, _ in self.selector.select(self.wheel.tick):
+                self._read(key.data)
+            self.wheel.advance()
+            self._check_links()
+
+        for session in list(self.sessions):
+            self.remove(session)
+
+    def run_in_thread(self):
+        thread = threading.Thread(None, self.run, 'fix_session_manager')
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.running = False
+
+    def stats(self):
+        """
+        Returns per session statistics, keyed by SenderCompID/TargetCompID.
+        """
+        stats = {}
+        for session, session_stat in self.sessions.items():
+            stats[session.sender_comp_id + '/' + session.target_comp_id] = {
+                'logged': session.logged,
+                'link_up': session.heartbeat.link_up,
+                'msgs_sent': session.msg_seq_num - 1,
+                'msgs_received': session.next_in_seq_num - 1,
+                'bytes_received': session_stat.bytes_received,
+                'reads': session_stat.reads,
+                'last_read': session_stat.last_read,
+                'rtt_us': session.heartbeat.rtt.summary(),
+                'disconnected': session_stat.disconnected,
+            }
+        return stats
+
+    def _connect(self, session):
+        session.connect()
+        session.ssock.setblocking(False)
+        session.running = True
+        session_stat = self.sessions[session]
+        session_stat.disconnected = False
+        session_stat.connected_at = time.monotonic()
+        self.selector.register(session.ssock, selectors.EVENT_READ, session)
+
+    def _unregister(self, session):
+        if session.ssock is not None and session.ssock.fileno() >= 0:
+            try:
+                self.selector.unregister(session.ssock)
+            except KeyError:
+                pass
+
+    def _drop(self, session):
+        # Disconnects a session, then reconnects it after its backoff delay
+        # or forgets it
+        session_stat = self.sessions[session]
+        session_stat.disconnected = True
+        if not session.reconnect or not self.running:
+            self.remove(session)
+            return
+        self._unregister(session)
+        session._disconnect()
+        session_stat.reconnect_timer = self.wheel.schedule(
+            session.backoff.next(), lambda: self._reconnect(session))
+
+    def _reconnect(self, session):
+        session_stat = self.sessions.get(session)
+        if session_stat is None:
+            return
+        session_stat.reconnect_timer = None
+        try:
+            self._connect(session)
+        except OSError as e:
+            session.logger.error(session.log_prefix, 'Reconnection failed:', e)
+            self._drop(session)
+
+    def _check_links(self):
+        now = time.monotonic()
+        for session, session_stat in list(self.sessions.items()):
+            if session_stat.disconnected:
+                continue
+            if not session.heartbeat.link_up:
+                session._log('Link down')
+                self._drop(session)
+            elif not session.logged and now - session_stat.connected_at > session.logon_timeout:
+                session._log('No Logon received')
+                self._drop(session)
+
+    def _read(self, session):
+        session_stat = self.sessions.get(session)
+        if session_stat is None or session_stat.disconnected:
+            # Dropped earlier in this iteration of the loop
+            return
+        try:
+            while True:
+                with session.send_lock:
+                    data = session.ssock.recv(65536)
+                if not data:
+                    session._log('Disconnected')
+                    self._drop(session)
+                    return
+                session_stat.bytes_received += len(data)
+                session_stat.reads += 1
+                session_stat.last_read = time.monotonic()
+                session._process_data(data)
+                # Decrypted data already buffered by the SSL layer is not
+                # seen by the selector
+                if not session.use_tls or not session.ssock.pending():
+                    return
+        except (ssl.SSLWantReadError, BlockingIOError):
+            pass
+        except OSError as e:
+            session.logger.error(session.log_prefix, 'Read failed:', e)
+            self._drop(session)
+
+
+if __name__ == "__main__":
+
+    print('EXTP FIX session manager example:')
+    print('This example runs the market data and order sessions of several accounts from one thread.')
+    print()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('hostname', help='Hostname of the FIX server')
+    parser.add_argument('sender_comp_ids', help='Comma separated Sender Comp IDs')
+    parser.add_argument('target_comp_id_prefix', help='Target Comp ID Prefix')
+    parser.add_argument('username', help='Username')
+    parser.add_argument('password', help='Password')
+    parser.add_argument('--cpu', type=int, help='CPU core to pin the loop to')
+    args = parser.parse_args()
+    market_data_port = 40001
+    market_access_port = 40002
+
+    manager = fix_session_manager(args.cpu)
+    market_data_sessions = []
+    for sender_comp_id in args.sender_comp_ids.split(','):
+        market_data_session = fix_client(args.hostname, market_data_port, sender_comp_id,
+                                         args.target_comp_id_prefix + '_MDATA', args.username, args.password)
+        market_data_session.log_market_data = False
+        manager.add(market_data_session)
+        market_data_sessions.append(market_data_session)
+        manager.add(fix_client(args.hostname, market_access_port, sender_comp_id,
+                               args.target_comp_id_prefix + '_ORDER', args.username, args.password))
+    thread = manager.run_in_thread()
+
+    not_logged = manager.wait_logon()
+    if not_logged:
+        print('[ERROR] Cannot get a logon from',
+              [session.sender_comp_id + '/' + session.target_comp_id for session in not_logged])
+        manager.stop()
+        sys.exit(1)
+
+    for market_data_session in market_data_sessions:
+        market_data_session.send_market_data_request(
+            ['BTC-USD', 'ETH-USD', 'LTC-USD'])
+    time.sleep(3)
+
+    for session_id, stats in manager.stats().items():
+        print(session_id, stats)
+
+    manager.stop()
+    thread.join()
+    sys.exit(0)
@@ -0,0 +1,137 @@
+import mmap
+import os
+import struct
+import time
+
+# fsync policies
+FSYNC_NEVER = 'never'  # the OS writes the pages back whenever it wants
+FSYNC_INTERVAL = 'interval'  # at most once per fsync_interval seconds
+FSYNC_ALWAYS = 'always'  # after every write
+
+_HEADER = struct.Struct('<QQQ')  # next outbound / next inbound MsgSeqNum, log size
+_RECORD = struct.Struct('<QI')  # MsgSeqNum, message length
+
+
+class fix_store:
+    """
+    Memory-mapped store of a FIX session, so that it survives a restart:
+    - `<path>.seqnums` holds the next outbound and inbound MsgSeqNum,
+    - `<path>.messages` is an append-only log of the outbound application
+      messages, used to answer ResendRequest. Session messages, which are
+      never resent, are not stored: the Logon would leave the password on
+      disk.
+    """
+
+    def __init__(self, path, fsync=FSYNC_INTERVAL, fsync_interval=1.0, initial_size=1 << 20):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.last_fsync = time.monotonic()
+
+        self.seqnums_fd = fix_store._open(path + '.seqnums', _HEADER.size)
+        self.seqnums = mmap.mmap(self.seqnums_fd, _HEADER.size)
+        self.next_out, self.next_in, self.size = _HEADER.unpack_from(
+            self.seqnums)
+        self.next_out = self.next_out or 1
+        self.next_in = self.next_in or 1
+
+        self.messages_fd = fix_store._open(
+            path + '.messages', max(initial_size, self.size))
+        self.messages = mmap.mmap(self.messages_fd, 0)
+
+        # MsgSeqNum -> (offset, length) of the stored messages
+        self.index = {}
+        offset = 0
+        while offset < self.size:
+            msg_seq_num, length = _RECORD.unpack_from(self.messages, offset)
+            offset += _RECORD.size
+            self.index[msg_seq_num] = (offset, length)
+            offset += length
+
+    def append(self, msg_seq_num, data):
+        """
+        Stores an outbound message, and msg_seq_num + 1 as the next outbound
+        MsgSeqNum.
+        """
+        length = len(data)
+        end = self.size + _RECORD.size + length
+        if end > len(self.messages):
+            self._grow(end)
+        _RECORD.pack_into(self.messages, self.size, msg_seq_num, length)
+        offset = self.size + _RECORD.size
+        self.messages[offset:end] = data
+        self.index[msg_seq_num] = (offset, length)
+        self.size = end
+        self.next_out = msg_seq_num + 1
+        self._write_header()
+
+    def get(self, msg_seq_num):
+        """
+        Returns the stored outbound message, or None.
+        """
+        position = self.index.get(msg_seq_num)
+        if position is None:
+            return None
+        offset, length = position
+        return self.messages[offset:offset + length]
+
+    def set_next_out(self, msg_seq_num):
+        """
+        Stores the next outbound MsgSeqNum, after a message not stored.
+        """
+        if msg_seq_num != self.next_out:
+            self.next_out = msg_seq_num
+            self._write_header()
+
+    def set_next_in(self, msg_seq_num):
+        if msg_seq_num != self.next_in:
+            self.next_in = msg_seq_num
+            self._write_header()
+
+    def reset(self):
+        """
+        Forgets the stored messages and restarts both sequences at 1, as for
+        a Logon with ResetSeqNumFlag=Y.
+        """
+        self.index = {}
+        self.size = 0
+        self.next_out = 1
+        self.next_in = 1
+        self._write_header()
+
+    def sync(self):
+        self.messages.flush()
+        self.seqnums.flush()
+        self.last_fsync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self.messages.close()
+        self.seqnums.close()
+        os.close(self.messages_fd)
+        os.close(self.seqnums_fd)
+
+    def _open(path, size):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        return fd
+
+    def _grow(self, size):
+        new_size = len(self.messages)
+        while new_size < size:
+            new_size *= 2
+        self.messages.flush()
+        self.messages.close()
+        os.ftruncate(self.messages_fd, new_size)
+        self.messages = mmap.mmap(self.messages_fd, 0)
+
+    def _write_header(self):
+        _HEADER.pack_into(self.seqnums, 0, self.next_out,
+                          self.next_in, self.size)
+        if self.fsync == FSYNC_ALWAYS:
+            self.sync()
+        elif self.fsync == FSYNC_INTERVAL and time.monotonic() - self.last_fsync >= self.fsync_interval:
+            self.sync()
@@ -1,90 +1,65 @@
 # This code sample shows how to continuously send Requests for Quotes,
 # then use fetched prices to pass LIMFOK orders over RESTAPI.
-
-import http.client
-import json
-import time
+#
+# At each iteration the whole instrument x quantity x side grid is quoted
+# concurrently, which costs about one round trip, then a buy and a sell
+# LIMFOK order are sent at the quoted prices of a random cell. Quotes are
+# cached until they expire: those still valid are not requested again.
+# Requests are rate limited client side, orders going before pending RFQs.
+
+import asyncio
 import random
 from pprint import pprint
+from extp_rest_cache import rfq_cache
+from extp_rest_client import rest_client, rest_error, EXTP_REST
+from extp_rest_scheduler import request_scheduler
 
-EXTP_REST = "staging-extp.enigma-securities.io"
 API_TOKEN = '<YOUR_API_TOKEN>'
 
 sleep_time = 3
-conn = http.client.HTTPSConnection(EXTP_REST)
-
-headers = {
-    'X-API-KEY': API_TOKEN,
-    'Content-Type': 'application/json',
-}
 
 inst_list = ["BTC-USD", "ETH-USD", "LTC-USD"]
 qty_list = [0.01, 0.1, 0.5, 1]
 
 
-def rfq(rfq_params):
-    conn.request("POST", "/api/v1/rfq", json.dumps(rfq_params), headers)
-    res = conn.getresponse()
-    jrfq = json.loads(res.read().decode('utf-8'))
+async def order(rest, inst, side, qty, limit_price):
+
     try:
-        return jrfq["response"]["quote_price"]
-    except:
-        return 0
-
-
-def order(params):
-
-    conn.request("POST", "/api/v1/order", json.dumps(params), headers)
-    res = conn.getresponse()
-    data = res.read().decode('utf-8')
-    jres = json.loads(data)
-    return jres
-
-
-for x in range(100):
-
-    inst = random.choice(inst_list)
-    qty = random.choice(qty_list)
-
-    rfq_params = {
-        "instrument": inst,
-        "quantity": qty,
-        "side": "buy"
-    }
-
-    order_params = {
-        "order_type": "limit",
-        "tif": "FOK",
-        "side": "buy",
-        "quantity": qty,
-        "instrument": inst,
-        "limit_price": 0.0
-    }
-
-    order_params["limit_price"] = rfq(rfq_params)
-    if order_params["limit_price"] != 0:
-        res = order(order_params)
-        pprint(res)
-
-    rfq_params = {
-        "instrument": inst,
-        "quantity": qty,
-        "side": "sell"
-    }
-
-    order_params = {
-        "order_type": "limit",
-        "tif": "FOK",
-        "side": "sell",
-        "quantity": qty,
-        "instrument": inst,
-        "limit_price": 0.0
-    }
-
-    order_params["limit_price"] = rfq(rfq_params)
-    if order_params["limit_price"] != 0:
-
-        res = order(order_params)
-        pprint(res)
-
-    time.sleep(sleep_time)
+        res = await rest.order(inst, side, qty, order_type="limit", limit_price=limit_price, tif="FOK")
+    except (rest_error, OSError, asyncio.TimeoutError) as e:
+        print("Order failed:", e)
+        return
+    pprint(res)
+
+
+async def main():
+
+    # At most 10 orders and 20 RFQs per second, after bursts of as many
+    scheduler = request_scheduler(order_rate=10, order_burst=10, rfq_rate=20, rfq_burst=20)
+
+    async with rest_client(API_TOKEN, EXTP_REST, scheduler=scheduler) as rest:
+        # Quotes are kept up to their valid_until, for 5s at most
+        cache = rfq_cache(rest, ttl=5)
+        for x in range(100):
+
+            # Quotes the whole grid, each RFQ having 1s to answer
+            table = await rest.rfq_grid(inst_list, qty_list, ("buy", "sell"), deadline=1.0, cache=cache)
+            print(table)
+            print(cache.stats())
+            print(scheduler.stats())
+
+            inst = random.choice(inst_list)
+            qty = random.choice(qty_list)
+
+            orders = []
+            buy_price = table.price(inst, "buy", qty)
+            if buy_price is not None:
+                orders.append(order(rest, inst, "buy", qty, buy_price))
+            sell_price = table.price(inst, "sell", qty)
+            if sell_price is not None:
+                orders.append(order(rest, inst, "sell", qty, sell_price))
+            await asyncio.gather(*orders)
+
+            await asyncio.sleep(sleep_time)
+
+asyncio.run(main())
@@ -0,0 +1,130 @@
+# Cache of EXTP RFQ quotes.
+#
+# A quote is reused until it expires, for any RFQ of the same instrument,
+# side and quantity bucket: the quantity is rounded up to its bucket, whose
+# price is a valid limit for any smaller quantity. Concurrent RFQs of the same
+# key share a single request.
+
+import asyncio
+import bisect
+import collections
+import datetime
+import time
+
+
+def _valid_until(response):
+    # valid_until of a quote, in seconds since epoch, None if not given
+    try:
+        valid_until = response['response']['valid_until']
+    except (KeyError, TypeError):
+        return None
+    if isinstance(valid_until, str):
+        try:
+            return float(valid_until)
+        except ValueError:
+            pass
+        try:
+            valid_until = datetime.datetime.fromisoformat(valid_until.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if valid_until.tzinfo is None:
+            valid_until = valid_until.replace(tzinfo=datetime.timezone.utc)
+        return valid_until.timestamp()
+    return valid_until
+
+
+class rfq_cache:
+    """
+    RFQ quotes of a rest_client, cached by (instrument, side, quantity
+    bucket). rfq() returns the responses of rest_client.rfq().
+
+    A quote expires at its valid_until less margin seconds, and at the
+    latest ttl seconds after it was requested. The least recently used quotes
+    are evicted beyond max_entries.
+    :param buckets: increasing quantities; an RFQ is sent for the smallest
+    bucket not below the quantity, or for the quantity itself above the last
+    one. By default each quantity is its own bucket.
+    """
+
+    def __init__(self, client, ttl=1.0, max_entries=1024, buckets=None, margin=0.1):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.buckets = sorted(buckets) if buckets else None
+        self.margin = margin
+        # key: (expiry in time.time(), response), least recently used first
+        self.entries = collections.OrderedDict()
+        self.inflight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def bucket(self, quantity):
+        if self.buckets is None:
+            return quantity
+        i = bisect.bisect_left(self.buckets, quantity)
+        return self.buckets[i] if i < len(self.buckets) else quantity
+
+    async def rfq(self, instrument, side, quantity):
+        """
+        Returns a valid quote for quantity, requesting one only if none is
+        cached or being requested.
+        """
+        key = (instrument, side, self.bucket(quantity))
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self.entries[key]
+            self.expired += 1
+
+        request = self.inflight.get(key)
+        if request is None:
+            self.misses += 1
+            request = asyncio.ensure_future(self._request(key))
+            # Retrieves the error even if every waiter has given up
+            request.add_done_callback(lambda request: request.cancelled() or request.exception())
+            self.inflight[key] = request
+        else:
+            self.coalesced += 1
+        # A waiter given up does not cancel the request of the others
+        return await asyncio.shield(request)
+
+    def invalidate(self, instrument=None, side=None):
+        """
+        Drops the cached quotes, of instrument and side if given.
+        """
+        for key in [key for key in self.entries
+                    if (instrument is None or key[0] == instrument) and (side is None or key[1] == side)]:
+            del self.entries[key]
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'coalesced': self.coalesced, 'expired': self.expired, 'evictions': self.evictions,
+                'hit_ratio': (self.hits + self.coalesced) / lookups if lookups else None}
+
+    async def _request(self, key):
+        try:
+            instrument, side, quantity = key
+            sent = time.time()
+            response = await self.client.rfq(instrument, side, quantity)
+        finally:
+            del self.inflight[key]
+
+        expiry = sent + self.ttl
+        valid_until = _valid_until(response)
+        if valid_until is not None:
+            expiry = min(expiry, valid_until - self.margin)
+        if expiry > time.time():
+            self.entries[key] = (expiry, response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return response
@@ -0,0 +1,334 @@
+# Asyncio client of EXTP REST API.
+#
+# Requests go over a pool of persistent HTTP/1.1 keep-alive connections, opened
+# and TLS handshaked up front by connect(), so that an order costs one request
+# round trip. The client never blocks the event loop: market data received on
+# the same loop keeps flowing while requests are in flight.
+
+import asyncio
+import heapq
+import itertools
+import json
+import ssl
+import time
+import urllib.parse
+
+from extp_rest_scheduler import BUDGETS, ORDER, RFQ
+
+EXTP_REST = 'https://staging-extp.enigma-securities.io'
+
+
+class rest_error(Exception):
+    """
+    Non 2xx response of EXTP REST API, with its HTTP status and decoded body.
+    """
+
+    def __init__(self, status, payload):
+        Exception.__init__(self, status, payload)
+        self.status = status
+        self.payload = payload
+
+
+class rfq_table:
+    """
+    Quotes of an instruments x quantities x sides grid: price() is the
+    quote_price of a cell, None if its RFQ failed or timed out (the
+    exception being kept in errors). str() renders one row per instrument
+    and quantity, one column per side.
+    """
+
+    def __init__(self, instruments, quantities, sides):
+        self.instruments = list(instruments)
+        self.quantities = list(quantities)
+        self.sides = list(sides)
+        self.responses = {}
+        self.errors = {}
+        self.elapsed = None
+
+    def price(self, instrument, side, quantity):
+        try:
+            return self.responses[(instrument, quantity, side)]['response']['quote_price']
+        except (KeyError, TypeError):
+            return None
+
+    def rows(self):
+        """
+        Yields (instrument, quantity, price of each side) tuples.
+        """
+        for instrument in self.instruments:
+            for quantity in self.quantities:
+                yield (instrument, quantity) + tuple(self.price(instrument, side, quantity) for side in self.sides)
+
+    def __str__(self):
+        lines = ['{:<12} {:>10}'.format('instrument', 'quantity') +
+                 ''.join(' {:>14}'.format(side) for side in self.sides)]
+        for row in self.rows():
+            lines.append('{:<12} {:>10g}'.format(*row[:2]) +
+                         ''.join(' {:>14}'.format('-' if price is None else '{:.2f}'.format(price))
+                                 for price in row[2:]))
+        lines.append('{} quotes, {} errors in {:.3f}ms'.format(
+            len(self.responses), len(self.errors), self.elapsed * 1000))
+        return '\n'.join(lines)
+
+
+class _connection:
+    """
+    One keep-alive connection of the pool.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.reader = None
+        self.writer = None
+        self.requests = 0
+
+    @property
+    def closed(self):
+        return self.writer is None or self.writer.is_closing() or self.reader.at_eof()
+
+    async def open(self):
+        client = self.client
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(
+            client.host, client.port, ssl=client.ssl_context,
+            server_hostname=client.host if client.ssl_context is not None else None), client.timeout)
+        self.requests = 0
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def request(self, head, body):
+        self.writer.write(head + body)
+        await self.writer.drain()
+        self.requests += 1
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by the server')
+        status = int(status_line.split(None, 2)[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n'):
+                break
+            if not line:
+                raise ConnectionResetError('Connection closed by the server')
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';', 1)[0], 16)
+                if size == 0:
+                    # Trailers, up to the final empty line
+                    while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            data = b''.join(chunks)
+        elif 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            data = await self.reader.read()
+            self.close()
+
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, data
+
+
+class rest_client:
+    """
+    EXTP REST client over a pool of nb_connections keep-alive connections.
+    connect() opens them all, so that the TCP and TLS handshakes are done
+    before the first order; a connection closed by the server is reopened
+    on its next use.
+
+    The url may be http:// for a local mock venue. ssl_context defaults to
+    a verifying context for https:// urls.
+
+    Requests have a priority class (extp_rest_scheduler HEDGE, ORDER or
+    RFQ): free connections go to the waiting request of the highest one,
+    and so do the tokens of scheduler, an optional
+    extp_rest_scheduler.request_scheduler rate limiting the requests.
+    """
+
+    def __init__(self, api_token, url=EXTP_REST, nb_connections=4, ssl_context=None, timeout=5, scheduler=None):
+        parsed = urllib.parse.urlsplit(url)
+        self.api_token = api_token
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.prefix = parsed.path.rstrip('/')
+        if parsed.scheme == 'https':
+            self.ssl_context = ssl_context or ssl.create_default_context()
+        else:
+            self.ssl_context = None
+        self.timeout = timeout
+        self.scheduler = scheduler
+
+        self.connections = [_connection(self) for _ in range(nb_connections)]
+        # None until connected
+        self.idle = None
+        self.connect_lock = asyncio.Lock()
+        # Requests waiting for a connection: (priority, arrival, future)
+        self.waiters = []
+        self.arrivals = itertools.count()
+        self.heads = {}
+        self.requests = 0
+        self.reconnects = 0
+        self.last_latency = None
+
+    async def connect(self):
+        """
+        Opens (warms up) all the connections of the pool, once: concurrent
+        callers wait for the same connection.
+        """
+        async with self.connect_lock:
+            if self.idle is None:
+                await asyncio.gather(*(connection.open() for connection in self.connections))
+                self.idle = list(self.connections)
+
+    async def close(self):
+        for connection in self.connections:
+            connection.close()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def rfq(self, instrument, side, quantity, priority=RFQ):
+        """
+        Requests a quote, returns the decoded response.
+        """
+        return await self.request('/api/v1/rfq', {'instrument': instrument, 'side': side, 'quantity': quantity},
+                                  idempotent=True, priority=priority)
+
+    async def rfq_grid(self, instruments, quantities, sides=('buy', 'sell'), max_concurrency=None, deadline=1.0,
+                       cache=None):
+        """
+        Requests quotes for every instrument, quantity and side concurrently,
+        at most max_concurrency (the pool size by default) in flight at once,
+        each RFQ being given deadline seconds. Returns an rfq_table.
+        :param cache: extp_rest_cache.rfq_cache the quotes are taken from.
+        """
+        rfq = self.rfq if cache is None else cache.rfq
+        table = rfq_table(instruments, quantities, sides)
+        semaphore = asyncio.Semaphore(max_concurrency or len(self.connections))
+
+        async def quote(instrument, quantity, side):
+            key = (instrument, quantity, side)
+            async with semaphore:
+                try:
+                    table.responses[key] = await asyncio.wait_for(rfq(instrument, side, quantity), deadline)
+                except (rest_error, OSError, ValueError, asyncio.TimeoutError) as e:
+                    table.errors[key] = e
+
+        start = time.monotonic()
+        await asyncio.gather(*(quote(instrument, quantity, side) for instrument in table.instruments
+                               for quantity in table.quantities for side in table.sides))
+        table.elapsed = time.monotonic() - start
+        return table
+
+    async def order(self, instrument, side, quantity, order_type='market', limit_price=None, tif=None,
+                    priority=ORDER):
+        """
+        Places an order, returns the decoded response.
+        :param order_type: 'market' or 'limit', with limit_price and tif ('FOK').
+        :param priority: ORDER, or HEDGE for orders that must go first.
+        """
+        params = {'order_type': order_type, 'side': side, 'quantity': quantity, 'instrument': instrument}
+        if limit_price is not None:
+            params['limit_price'] = limit_price
+        if tif is not None:
+            params['tif'] = tif
+        return await self.request('/api/v1/order', params, priority=priority)
+
+    async def request(self, path, params, idempotent=False, priority=ORDER):
+        """
+        POSTs params as JSON to path and returns the decoded response; raises
+        rest_error on a non 2xx status. A request that may have reached the
+        server is only retried, once, if idempotent.
+        """
+        if self.idle is None:
+            await self.connect()
+        body = json.dumps(params).encode('utf-8')
+        head = self._head(path) + b'%d\r\n\r\n' % len(body)
+
+        budget = BUDGETS.get(path)
+        if self.scheduler is not None and budget is not None:
+            await self.scheduler.acquire(budget, priority)
+        connection = await self._acquire(priority)
+        try:
+            start = time.monotonic()
+            for attempt in range(2):
+                if connection.closed:
+                    self.reconnects += 1
+                    await connection.open()
+                reused = connection.requests > 0
+                try:
+                    status, data = await asyncio.wait_for(connection.request(head, body), self.timeout)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    connection.close()
+                    # A keep-alive connection may have been closed by the
+                    # server while idle. Even a failed write does not tell
+                    # that the request never reached it: only an idempotent
+                    # request is sent again
+                    if attempt or not (reused and idempotent):
+                        raise
+                except BaseException:
+                    connection.close()
+                    raise
+            self.last_latency = time.monotonic() - start
+            self.requests += 1
+        finally:
+            self._release(connection)
+
+        try:
+            payload = json.loads(data) if data else None
+        except ValueError:
+            # Error pages of proxies are not JSON
+            payload = data.decode('utf-8', 'replace')
+        if not 200 <= status < 300:
+            raise rest_error(status, payload)
+        return payload
+
+    async def _acquire(self, priority):
+        # Connections are only idle when no request is waiting
+        if self.idle:
+            return self.idle.pop()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.arrivals), future))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Handed a connection just before being cancelled
+            if future.done() and not future.cancelled():
+                self._release(future.result())
+            raise
+
+    def _release(self, connection):
+        # To the waiting request of the highest priority
+        while self.waiters:
+            future = heapq.heappop(self.waiters)[2]
+            if not future.done():
+                future.set_result(connection)
+                return
+        self.idle.append(connection)
+
+    def _head(self, path):
+        # Request line and headers, but for the Content-Length, encoded once
+        # per path
+        head = self.heads.get(path)
+        if head is None:
+            head = ('POST {}{} HTTP/1.1\r\nHost: {}\r\nX-API-KEY: {}\r\nContent-Type: application/json\r\n'
+                    'Connection: keep-alive\r\nContent-Length: '.format(
+                        self.prefix, path, self.host, self.api_token)).encode('latin-1')
+            self.heads[path] = head
+        return head
@@ -0,0 +1,167 @@
+# Client side rate limiting of EXTP REST API.
+#
+# Orders and RFQs each have their own token bucket, so that a burst of RFQs
+# never eats the order budget. Requests waiting for a token are served by
+# priority class, then in arrival order: a hedge goes before a pending order,
+# an order before pending RFQs.
+
+import asyncio
+import collections
+import heapq
+import itertools
+import time
+
+# Priority classes, the lowest first
+HEDGE = 0
+ORDER = 1
+RFQ = 2
+
+PRIORITY_NAMES = {HEDGE: 'hedge', ORDER: 'order', RFQ: 'rfq'}
+
+# Budget of each endpoint
+BUDGETS = {'/api/v1/order': 'order', '/api/v1/rfq': 'rfq'}
+
+
+class token_bucket:
+    """
+    rate tokens per second, up to burst tokens saved.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """
+        Takes a token, returns False if there is none.
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay(self):
+        """
+        Seconds until a token is available.
+        """
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class _budget:
+    """
+    A token bucket and the requests waiting for its tokens.
+    """
+
+    def __init__(self, rate, burst):
+        self.bucket = token_bucket(rate, burst)
+        # (priority, arrival, future, enqueued at)
+        self.waiters = []
+        self.timer = None
+
+
+class _wait_stats:
+    """
+    Waits of a priority class: the last window of them, for percentiles.
+    """
+
+    def __init__(self, window):
+        self.count = 0
+        self.queued = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = collections.deque(maxlen=window)
+
+    def record(self, wait):
+        self.count += 1
+        self.total += wait
+        if wait > self.max:
+            self.max = wait
+        self.recent.append(wait)
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def percentile(p):
+            return recent[min(len(recent) - 1, int(p * len(recent)))] if recent else None
+        return {'count': self.count, 'queued': self.queued,
+                'mean': self.total / self.count if self.count else None,
+                'p50': percentile(0.5), 'p99': percentile(0.99), 'max': self.max}
+
+
+class request_scheduler:
+    """
+    Rate limiter of rest_client requests, with an order budget (orders and
+    hedges) and an RFQ budget, each of rate requests per second and burst
+    requests at once. acquire() waits for a token of a budget, the waiting
+    requests being served by priority class.
+
+    depth() is the number of requests waiting, stats() their count, queue
+    depth and wait times (seconds, p50 and p99 over the last window waits)
+    by priority class.
+    """
+
+    def __init__(self, order_rate=10.0, order_burst=10, rfq_rate=20.0, rfq_burst=20, window=1024):
+        self.budgets = {'order': _budget(order_rate, order_burst),
+                        'rfq': _budget(rfq_rate, rfq_burst)}
+        self.arrivals = itertools.count()
+        self.waits = {priority: _wait_stats(window) for priority in PRIORITY_NAMES}
+
+    async def acquire(self, budget, priority):
+        """
+        Waits for a token of budget ('order' or 'rfq').
+        """
+        budget = self.budgets[budget]
+        waits = self.waits[priority]
+        # Requests given up while waiting do not hold the others back
+        while budget.waiters and budget.waiters[0][2].done():
+            heapq.heappop(budget.waiters)
+        if not budget.waiters and budget.bucket.take():
+            waits.record(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(budget.waiters, (priority, next(self.arrivals), future, time.monotonic()))
+        waits.queued += 1
+        if budget.timer is None:
+            self._schedule(budget)
+        try:
+            await future
+        finally:
+            waits.queued -= 1
+
+    def depth(self, priority=None):
+        if priority is None:
+            return sum(waits.queued for waits in self.waits.values())
+        return self.waits[priority].queued
+
+    def stats(self):
+        return {PRIORITY_NAMES[priority]: waits.summary() for priority, waits in self.waits.items()}
+
+    def _schedule(self, budget):
+        budget.timer = asyncio.get_running_loop().call_later(
+            budget.bucket.delay(), self._dispatch, budget)
+
+    def _dispatch(self, budget):
+        budget.timer = None
+        waiters = budget.waiters
+        while waiters:
+            priority, _, future, enqueued = waiters[0]
+            if future.done():
+                # Given up while waiting
+                heapq.heappop(waiters)
+                continue
+            if not budget.bucket.take():
+                self._schedule(budget)
+                return
+            heapq.heappop(waiters)
+            self.waits[priority].record(time.monotonic() - enqueued)
+            future.set_result(None)
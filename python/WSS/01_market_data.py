@@ -1,74 +1,36 @@
 # This sample shows how to connect to EXTP WSS,
 # subscribe to market data and receive price updates.
 
-import json
-from pprint import pprint
-import websockets
 import asyncio
-from enum import IntEnum
-import ssl
+import os
+import sys
+
+# The modules shared with the other directories are in python/, see extp_paths
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from extp_wss_client import wss_client, STREAM_QUOTES
 
-EXTP_WSS = 'wss://staging-extp.enigma-securities.io/ws'
 API_TOKEN = '<YOUR_API_TOKEN>'
 
 DEFAULT_SUBSCRIPTIONS = ["BTC-USD", "ETH-USD", "LTC-USD"]
 
 
-class WS_ACTION (IntEnum):
-    SUBSCRIBE = 1,
-    UNSUBSCRIBE = 2,
-    ORDER = 3,
-    AUTH = 4
-
-
-class WS_ORDER_TYPE (IntEnum):
-    MARKET = 1,
-    MARKET_NOMINAL = 2,
-    LIMIT = 3,
-
-
-class WS_ORDER_SIDE (IntEnum):
-    BUY = 1,
-    SELL = 2
-
-
-class WS_SUB_TYPE (IntEnum):
-    MARKET_DATA = 1,
-    ORDER_UPDATES = 2
-
-
-async def authorize(ws):
-    print("authenticating..")
-    await ws.send(json.dumps({'type': WS_ACTION.AUTH, 'auth_token': API_TOKEN}))
-
-
-async def subscribe_mdata(ws, instruments=[]):
-    subs = [{'type': WS_SUB_TYPE.MARKET_DATA, 'instrument': inst, "provider": "aggregated"}
-            for inst in instruments]
-    await ws.send(json.dumps({"type": 1, "subscriptions": subs}))
-
-
-## websocket callbacks ##
-
 async def ws_run():
 
-    ssl_context = ssl.SSLContext()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
+    client = wss_client(API_TOKEN)
+    quotes = client.channel(STREAM_QUOTES)
 
-    async with websockets.connect(EXTP_WSS) as websocket:
-        # First we authenticate on websocket.
-        await authorize(websocket)
+    # First we connect and authenticate on websocket.
+    print("authenticating..")
+    async with client:
 
         # Then we subscribe to some instruments (DEFAULT_SUBSCRIPTIONS list)
-        await subscribe_mdata(websocket, DEFAULT_SUBSCRIPTIONS)
+        client.subscribe_market_data(
+            DEFAULT_SUBSCRIPTIONS, provider="aggregated")
 
         # Finally we receive the stream and display the output on stdout.
-        while True:
-            jresp = await websocket.recv()
-            payload = json.loads(jresp)
-            pprint(payload)
+        async for quote in quotes:
+            print(quote)
 
 if __name__ == "__main__":
 
-    asyncio.get_event_loop().run_until_complete(ws_run())
+    asyncio.run(ws_run())
@@ -5,148 +5,72 @@
 # In the main loop, a buy order for 0.001 BTC-USD is sent,
 # then we wait 3s, then a sell order for 0.001 BTC-USD is sent.
 
-import json
 import asyncio
-import websockets
-import ssl
-from enum import IntEnum
+import os
+import sys
 from pprint import pprint
 
-EXTP_WSS = "wss://staging-extp.enigma-securities.io/ws"
+# The modules shared with the other directories are in python/, see extp_paths
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import extp_wss_pricebook
+from extp_wss_client import wss_client, STREAM_QUOTES, CONFLATE, \
+    WS_ORDER_TYPE, WS_ORDER_SIDE, WS_TIF_TYPE
+
 API_TOKEN = '<YOUR_API_TOKEN>'
 
 # these values are static, for the sake of example.
 ORDER_QTY = 0.001
 ORDER_INST = "BTC-USD"
 
-websocket = None
-
-
-class WS_ACTION (IntEnum):
-    SUBSCRIBE = 1,
-    UNSUBSCRIBE = 2,
-    ORDER = 3,
-    AUTH = 4
-
-
-class WS_ORDER_TYPE (IntEnum):
-    MARKET = 1,
-    MARKET_NOMINAL = 2,
-    LIMIT = 3,
-
-
-class WS_TIF_TYPE (IntEnum):
-    FOK = 1
-
-
-class WS_ORDER_SIDE (IntEnum):
-    BUY = 1,
-    SELL = 2
-
 
-class WS_SUB_TYPE (IntEnum):
-    MARKET_DATA = 1,
-    ORDER_UPDATES = 2
-
-
-pricebook = {}
-
-
-async def subscribe_order_updates(ws):
-    """
-    function that sends order-updates subscription payload to WSS
+async def print_quotes(client):
     """
-
-    subs = [{'type': WS_SUB_TYPE.ORDER_UPDATES}]
-    await ws.send(json.dumps({'type': WS_ACTION.SUBSCRIBE, 'subscriptions': subs}))
-
-
-async def subscribe_mdata(ws, instruments=[]):
-    """
-    function that sends MD subscription payload to WSS
+    Displays the market data updates. The channel is conflated: a slow
+    display only skips the quotes replaced by a newer one for the same
+    instrument, and always shows the latest book.
     """
 
-    subs = [{'type': WS_SUB_TYPE.MARKET_DATA, 'instrument': inst}
-            for inst in instruments]
-    await ws.send(json.dumps({'type': WS_ACTION.SUBSCRIBE, 'subscriptions': subs}))
+    async for quotes in client.channel(STREAM_QUOTES, policy=CONFLATE):
+        for quote in quotes.values():
+            print(quote)
 
 
-# Function that sends order payload to WSS
-async def place_order(ws, order_type, instrument, side, size, tif=None, limit_price=None):
+async def print_order(ticket):
     """
-    place_order function: sends and order payload to connected WS.
-    :param client_order_id: id of order specified by client, in order to remap with order updates. 
-    :param order_type: Type of order, can be either WS_ORDER_TYPE.MARKET (1),  WS_ORDER_TYPE.MARKET_NOMINAL(2)  , or  WS_ORDER_TYPE.LIMIT (3).
-    :param instrument: Symbol of intrument that we want to trade, eg: 'BTC-USD'.
-    :param side: side of order, can be either 1 (WS_ORDER_SIDE.BUY) or 2 (WS_ORDER_SIDE.SELL)
-    :param size: order's quantity, must be a > 0 number.
-    :param tif: Time in Force, only if order is of type 'limit'. vlaues can be 'FOK' (fill or kill) or 'GTC' (good til cancelled).
-    :param limit_price: price at which to buy/sell, only appliable if order_type is 'limit'.
+    Displays the ack and the final update of an order, with the latency of
+    each stage. Orders are tracked on their own so that many can be in flight.
     """
 
-    payload = {'type': order_type, 'side': side,
-               'size': size, 'instrument': instrument}
-    if (tif != None):
-        payload['tif'] = tif
-    if (limit_price != None):
-        payload['limit_price'] = limit_price
-
-    print("Sending order {}".format(payload))
-    await ws.send(json.dumps({'type': WS_ACTION.ORDER, 'data': {'order': payload}}))
+    ack = await ticket.ack
+    if ack is not None and ack.status < 0:
+        print("Order early Rejectected!")
+    else:
+        print("Order Request Passed!")
+    try:
+        pprint(await asyncio.wait_for(asyncio.shield(ticket.result), 10))
+    except asyncio.TimeoutError:
+        print("No final update received for order {}".format(ticket.client_order_id))
+    print(ticket)
 
 
-async def authorize(ws):
-    print("authenticating..")
-    await ws.send(json.dumps({'type': WS_ACTION.AUTH, 'auth_token':  API_TOKEN}))
-
-
-async def ws_run():
-    """
-    Websocket Run Function
-    """
-
-    global websocket
-
-    ssl_context = ssl.SSLContext()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
+async def main():
 
-    websocket = await websockets.connect(EXTP_WSS)
+    # The client reconnects on its own, the pricebook being stale meanwhile.
+    client = wss_client(API_TOKEN, on_reconnect=lambda gap: print(
+        "reconnected after {:.3f}s".format(gap)))
 
     # First we authenticate on websocket.
-    await authorize(websocket)
-
-    # Then we subscribe to some instrument market data
-    await subscribe_mdata(websocket, [ORDER_INST])
+    print("authenticating..")
+    await client.connect()
 
-    # Then we subscribe to the order-updates channel.
-    await subscribe_order_updates(websocket)
+    # Then we subscribe to some instrument market data and to the
+    # order-updates channel, both are sent in one frame.
+    client.subscribe_market_data([ORDER_INST])
+    client.subscribe_order_updates()
 
     # Then we process incoming WS stream coming from EXTP
-    while True:
-        jresp = await websocket.recv()
-        payload = json.loads(jresp)
-
-        if payload['type'] == 'client-streamquotes':
-            pprint(payload)
-            # we received market data update, so we update related pricebook entry accordingly
-            pricebook[payload['symbol']] = payload['data']
-
-        elif payload['type'] == 'order-dispatch-ack':
-            if payload['status'] == 0:
-                print("Order Request Passed!")
-            elif payload['status'] < 0:
-                print("Order early Rejectected!")
-
-        elif payload['type'] == 'order-updates':
-            pprint(payload)
-
-
-async def main():
-
-    global websocket
-
-    ws = asyncio.create_task(ws_run())
+    consumers = [asyncio.create_task(print_quotes(client))]
+    orders = set()
     await asyncio.sleep(2)
 
     # main loop: at each iteration we try to pass a BUY order, then wait 3s,
@@ -154,25 +78,43 @@ async def main():
     while True:
 
         # We pick correct price/side from uptodate pricebook,
-        # which is next level from ORDER_QTY (2)
-        limit_price = [dot["price"] for dot in pricebook[ORDER_INST]
-                       ['ask'] if dot["qty"] == 2][0]
+        # which is next level from ORDER_QTY
+        try:
+            limit_price = client.pricebook.price(
+                ORDER_INST, extp_wss_pricebook.ASK, ORDER_QTY, extp_wss_pricebook.NEXT)
+        except extp_wss_pricebook.stale_quote_error:
+            print("Prices are stale, waiting for the feed to come back")
+            await asyncio.sleep(3)
+            continue
 
         # We add .5bps of slippage to limit_price in order to make exec smoother.
         limit_price *= 1 + 0.5 / 10000
 
-        await place_order(websocket, WS_ORDER_TYPE.LIMIT, ORDER_INST, WS_ORDER_SIDE.BUY, ORDER_QTY, WS_TIF_TYPE.FOK, limit_price)
+        print("Sending BUY order @ {}".format(limit_price))
+        ticket = await client.place_order(WS_ORDER_TYPE.LIMIT, ORDER_INST, WS_ORDER_SIDE.BUY, ORDER_QTY, WS_TIF_TYPE.FOK, limit_price)
+        task = asyncio.create_task(print_order(ticket))
+        orders.add(task)
+        task.add_done_callback(orders.discard)
         await asyncio.sleep(3)
 
         # We pick correct price/side from uptodate pricebook,
-        # which is next level from ORDER_QTY (2)
-        limit_price = limit_price = [dot["price"] for dot in pricebook[ORDER_INST]
-                                     ['bid'] if dot["qty"] == 2][0]
+        # which is next level from ORDER_QTY
+        try:
+            limit_price = client.pricebook.price(
+                ORDER_INST, extp_wss_pricebook.BID, ORDER_QTY, extp_wss_pricebook.NEXT)
+        except extp_wss_pricebook.stale_quote_error:
+            print("Prices are stale, waiting for the feed to come back")
+            await asyncio.sleep(3)
+            continue
 
         # We add .5bps of slippage to limit_price in order to make exec smoother.
         limit_price *= 1 - 0.5 / 10000
 
-        await place_order(websocket, WS_ORDER_TYPE.LIMIT, ORDER_INST, WS_ORDER_SIDE.SELL, ORDER_QTY, WS_TIF_TYPE.FOK, limit_price)
+        print("Sending SELL order @ {}".format(limit_price))
+        ticket = await client.place_order(WS_ORDER_TYPE.LIMIT, ORDER_INST, WS_ORDER_SIDE.SELL, ORDER_QTY, WS_TIF_TYPE.FOK, limit_price)
+        task = asyncio.create_task(print_order(ticket))
+        orders.add(task)
+        task.add_done_callback(orders.discard)
         await asyncio.sleep(3)
 
 asyncio.run(main())
@@ -5,16 +5,19 @@
 # In the main loop, a buy order for 0.001 BTC-USD is sent,
 # then we wait 3s, then a sell order for 0.001 BTC-USD is sent.
 
-import json
 import asyncio
-import websockets
-import ssl
-from enum import IntEnum
+import os
+import sys
 from pprint import pprint
-import http.client
 
-EXTP_WSS = "wss://staging-extp.enigma-securities.io/ws"
-EXTP_REST = "staging-extp.enigma-securities.io"
+# The modules shared with the other directories are in python/, see extp_paths
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import extp_paths
+extp_paths.add('REST')
+import extp_wss_pricebook
+from extp_wss_client import wss_client, ORDER_DISPATCH_ACK, ORDER_UPDATES
+from extp_rest_client import rest_client, rest_error
+from extp_rest_scheduler import request_scheduler
 
 API_TOKEN = '<YOUR_API_TOKEN>'
 
@@ -22,134 +25,57 @@ API_TOKEN = '<YOUR_API_TOKEN>'
 ORDER_QTY = 0.001
 ORDER_INST = "BTC-USD"
 
-websocket = None
 
+# Function that sends order over REST: the keep-alive connections of rest are
+# already open, and the websocket keeps being read while the order is in
+# flight.
+async def limfok_rest(rest, instrument, side, qty, limit_price):
 
-class WS_ACTION (IntEnum):
-    SUBSCRIBE = 1,
-    UNSUBSCRIBE = 2,
-    ORDER = 3,
-    AUTH = 4
-
-
-class WS_ORDER_TYPE (IntEnum):
-    MARKET = 1,
-    MARKET_NOMINAL = 2,
-    LIMIT = 3,
-
-
-class WS_TIF_TYPE (IntEnum):
-    FOK = 1
-
-
-class WS_ORDER_SIDE (IntEnum):
-    BUY = 1,
-    SELL = 2
-
-
-class WS_SUB_TYPE (IntEnum):
-    MARKET_DATA = 1,
-    ORDER_UPDATES = 2
-
-
-pricebook = {}
-
-
-async def subscribe_order_updates(ws):
-    """
-    function that sends order-updates subscription payload to WSS
-    """
-
-    subs = [{'type': WS_SUB_TYPE.ORDER_UPDATES}]
-    await ws.send(json.dumps({'type': WS_ACTION.SUBSCRIBE, 'subscriptions': subs}))
-
-
-async def subscribe_mdata(ws, instruments=[]):
-    """
-    function that sends MD subscription payload to WSS
-    """
-
-    subs = [{'type': WS_SUB_TYPE.MARKET_DATA, 'instrument': inst}
-            for inst in instruments]
-    await ws.send(json.dumps({'type': WS_ACTION.SUBSCRIBE, 'subscriptions': subs}))
-
-
-# Function that sends order over REST
-def limfok_rest(instrument, side, qty, limit_price):
-
-    conn = http.client.HTTPSConnection(EXTP_REST)
-    headers = {
-        'X-API-KEY': API_TOKEN,
-        'content-type': 'application/json'
-    }
-
-    order_params = {
-        "order_type": "market",
-        "side": side,
-        "quantity": qty,
-        "instrument": instrument,
-        "limit_price": limit_price
-    }
-
-    conn.request("POST", "/api/v1/order", json.dumps(order_params), headers)
-    res = conn.getresponse()
-    data = res.read()
-    jresp = json.loads(data)
+    try:
+        jresp = await rest.order(instrument, side, qty, order_type="limit", limit_price=limit_price, tif="FOK")
+    except (rest_error, OSError, asyncio.TimeoutError) as e:
+        print("Order failed:", e)
+        return
     pprint(jresp)
+    print("round trip: {:.3f}ms".format(rest.last_latency * 1000))
 
 
-async def authorize(ws):
-    print("authenticating..")
-    await ws.send(json.dumps({'type': WS_ACTION.AUTH, 'auth_token':  API_TOKEN}))
-
-
-async def ws_run():
-    """
-    Websocket Run Function
-    """
-
-    global websocket
+async def print_order_acks(client):
 
-    ssl_context = ssl.SSLContext()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
+    async for ack in client.channel(ORDER_DISPATCH_ACK):
+        if ack.status == 0:
+            print("Order Request Passed!")
+        elif ack.status < 0:
+            print("Order early Rejectected!")
 
-    websocket = await websockets.connect(EXTP_WSS)
 
-    # First we authenticate on websocket.
-    await authorize(websocket)
+async def print_order_updates(client):
 
-    # Then we subscribe to some instrument market data
-    await subscribe_mdata(websocket, [ORDER_INST])
-
-    # Then we subscribe to the order-updates channel.
-    await subscribe_order_updates(websocket)
-
-    # Then we process incoming WS stream coming from EXTP
-    while True:
-        jresp = await websocket.recv()
-        payload = json.loads(jresp)
-
-        if payload['type'] == 'client-streamquotes':
-
-            # we received market data update, so we update related pricebook entry accordingly
-            pricebook[payload['symbol']] = payload['data']
-
-        elif payload['type'] == 'order-dispatch-ack':
-            if payload['status'] == 0:
-                print("Order Request Passed!")
-            elif payload['status'] < 0:
-                print("Order early Rejectected!")
-
-        elif payload['type'] == 'order-updates':
-            pprint(payload)
+    async for update in client.channel(ORDER_UPDATES):
+        pprint(update)
 
 
 async def main():
 
-    global websocket
+    # The client reconnects on its own, the pricebook being stale meanwhile.
+    client = wss_client(API_TOKEN, on_reconnect=lambda gap: print(
+        "reconnected after {:.3f}s".format(gap)))
 
-    ws = asyncio.create_task(ws_run())
+    # First we authenticate on websocket, and open the REST connections.
+    print("authenticating..")
+    # Orders are rate limited client side, below the venue limits
+    rest = rest_client(API_TOKEN, scheduler=request_scheduler(order_rate=5, order_burst=5))
+    await asyncio.gather(client.connect(), rest.connect())
+
+    # Then we subscribe to some instrument market data and to the
+    # order-updates channel, both are sent in one frame.
+    client.subscribe_market_data([ORDER_INST])
+    client.subscribe_order_updates()
+
+    # Then we process incoming WS stream coming from EXTP,
+    # the client keeps its pricebook up to date.
+    consumers = [asyncio.create_task(print_order_acks(client)),
+                 asyncio.create_task(print_order_updates(client))]
     await asyncio.sleep(2)
 
     # main loop: at each iteration we try to pass a BUY order, then wait 3s,
@@ -157,25 +83,35 @@ async def main():
     while True:
 
         # We pick correct price/side from uptodate pricebook,
-        # which is next level from ORDER_QTY (2)
-        limit_price = [dot["price"] for dot in pricebook[ORDER_INST]
-                       ['ask'] if dot["qty"] == 2][0]
+        # which is next level from ORDER_QTY
+        try:
+            limit_price = client.pricebook.price(
+                ORDER_INST, extp_wss_pricebook.ASK, ORDER_QTY, extp_wss_pricebook.NEXT)
+        except extp_wss_pricebook.stale_quote_error:
+            print("Prices are stale, waiting for the feed to come back")
+            await asyncio.sleep(3)
+            continue
 
         # We add 1bps of slippage to limit_price in order to make exec smoother.
         limit_price *= 1 + 1 / 10000
 
-        limfok_rest(ORDER_INST, "buy", ORDER_QTY, limit_price)
+        await limfok_rest(rest, ORDER_INST, "buy", ORDER_QTY, limit_price)
         await asyncio.sleep(3)
 
         # We pick correct price/side from uptodate pricebook,
-        # which is next level from ORDER_QTY (2)
-        limit_price = limit_price = [dot["price"] for dot in pricebook[ORDER_INST]
-                                     ['bid'] if dot["qty"] == 2][0]
+        # which is next level from ORDER_QTY
+        try:
+            limit_price = client.pricebook.price(
+                ORDER_INST, extp_wss_pricebook.BID, ORDER_QTY, extp_wss_pricebook.NEXT)
+        except extp_wss_pricebook.stale_quote_error:
+            print("Prices are stale, waiting for the feed to come back")
+            await asyncio.sleep(3)
+            continue
 
         # We add 1bps of slippage to limit_price in order to make exec smoother.
         limit_price *= 1 - 1 / 10000
 
-        limfok_rest(ORDER_INST, "sell", ORDER_QTY, limit_price)
+        await limfok_rest(rest, ORDER_INST, "sell", ORDER_QTY, limit_price)
         await asyncio.sleep(3)
 
 asyncio.run(main())
@@ -0,0 +1,43 @@
+# This sample shows how to spread the market data of many instruments
+# over several EXTP WSS connections, and read the merged pricebook.
+
+import asyncio
+import os
+import sys
+
+# The modules shared with the other directories are in python/, see extp_paths
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import extp_wss_pricebook
+from extp_wss_pool import wss_pool
+
+API_TOKEN = '<YOUR_API_TOKEN>'
+
+SUBSCRIPTIONS = ["BTC-USD", "ETH-USD", "LTC-USD", "BCH-USD", "XRP-USD",
+                 "SOL-USD", "ADA-USD", "DOT-USD", "LINK-USD", "AVAX-USD"]
+QTY = 1
+
+
+async def ws_run():
+
+    # Instruments are sharded over 4 connections, each decoded in its own
+    # worker process, and rebalanced every 10s from their quote rates.
+    async with wss_pool(API_TOKEN, nb_connections=4, provider="aggregated", processes=True) as pool:
+        await pool.subscribe_market_data(SUBSCRIPTIONS)
+
+        # Every second we display the best prices and the load of each connection.
+        while True:
+            await asyncio.sleep(1)
+            for instrument in SUBSCRIPTIONS:
+                if instrument in pool.pricebook:
+                    try:
+                        print("{}: bid {} ask {}".format(
+                            instrument,
+                            pool.pricebook.price(instrument, extp_wss_pricebook.BID, QTY),
+                            pool.pricebook.price(instrument, extp_wss_pricebook.ASK, QTY)))
+                    except ValueError:
+                        print("{}: not enough depth for {}".format(instrument, QTY))
+            print(pool.stats())
+
+if __name__ == "__main__":
+
+    asyncio.run(ws_run())
@@ -0,0 +1,399 @@
+# Asynchronous client for EXTP websocket.
+#
+# The client owns the connection, authenticates it, batches the
+# subscriptions and routes the received messages by type to bounded queues,
+# so that a slow consumer of one channel never delays the others. The quotes
+# are also kept in a pricebook, always up to date whatever the consumers do.
+
+import asyncio
+import collections
+import json
+import time
+from enum import IntEnum
+
+import websockets
+
+import extp_wss_pricebook
+from extp_wss_orders import order_ticket, order_tracker
+from extp_wss_codec import decode_frame, STREAM_QUOTES, ORDER_DISPATCH_ACK, ORDER_UPDATES
+from extp_reconnect import jittered_backoff
+
+EXTP_WSS = 'wss://staging-extp.enigma-securities.io/ws'
+
+
+class WS_ACTION (IntEnum):
+    SUBSCRIBE = 1,
+    UNSUBSCRIBE = 2,
+    ORDER = 3,
+    AUTH = 4
+
+
+class WS_ORDER_TYPE (IntEnum):
+    MARKET = 1,
+    MARKET_NOMINAL = 2,
+    LIMIT = 3,
+
+
+class WS_TIF_TYPE (IntEnum):
+    FOK = 1
+    GTC = 2
+
+
+class WS_ORDER_SIDE (IntEnum):
+    BUY = 1,
+    SELL = 2
+
+
+class WS_SUB_TYPE (IntEnum):
+    MARKET_DATA = 1,
+    ORDER_UPDATES = 2
+
+
+# Backpressure policies of a channel once its queue is full
+BLOCK = 'block'  # the receive loop waits for the consumer
+DROP_OLDEST = 'drop_oldest'  # the oldest queued message is dropped
+DROP_NEWEST = 'drop_newest'  # the received message is dropped
+CONFLATE = 'conflate'  # only the latest quote of each symbol is kept
+
+
+class channel:
+    """
+    Bounded queue of the received messages of one type, consumed with
+    `await channel.get()` or `async for message in channel`.
+    """
+
+    def __init__(self, maxsize=1000, policy=DROP_OLDEST):
+        self.queue = asyncio.Queue(maxsize)
+        self.policy = policy
+        self.dropped = 0
+
+    async def put(self, message):
+        if self.policy == BLOCK:
+            await self.queue.put(message)
+            return
+        if self.queue.full():
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.queue.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+class conflated_channel:
+    """
+    Channel keeping only the latest quote of each symbol. Consumers are woken
+    with the quotes of the symbols updated since their last read, so they
+    always act on the freshest book and memory is bounded by the number of
+    symbols whatever the feed rate. conflated counts the replaced quotes.
+    """
+
+    def __init__(self):
+        self.latest = {}
+        self.dirty = set()
+        self.event = asyncio.Event()
+        self.closed = False
+        self.conflated = 0
+
+    async def put(self, quote):
+        if quote.symbol in self.dirty:
+            self.conflated += 1
+        self.latest[quote.symbol] = quote
+        self.dirty.add(quote.symbol)
+        self.event.set()
+
+    async def get(self):
+        """
+        Waits for updates, returns a {symbol: latest quote} dict of the
+        symbols updated since the previous call, None once closed.
+        """
+        while not self.dirty:
+            if self.closed:
+                return None
+            self.event.clear()
+            await self.event.wait()
+        dirty, self.dirty = self.dirty, set()
+        return {symbol: self.latest[symbol] for symbol in dirty}
+
+    def close(self):
+        self.closed = True
+        self.event.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        quotes = await self.get()
+        if quotes is None:
+            raise StopAsyncIteration
+        return quotes
+
+
+class wss_client:
+    """
+    EXTP websocket client. Messages of a type are only queued once a channel
+    has been opened for it with channel(); the others are dropped, except
+    quotes which always update the pricebook.
+
+    With reconnect, a lost connection is reopened after a jittered backoff,
+    authenticated and all its subscriptions replayed in one frame, the
+    channels staying open. The pricebook is stale in between: on_disconnect
+    is given the instruments marked stale, their quotes being fresh again
+    once received anew. The duration of the gap is kept in last_gap and
+    passed to on_reconnect. Orders pending at the disconnection fail.
+    """
+
+    def __init__(self, api_token, url=EXTP_WSS, ssl_context=None, reconnect=True, backoff=None, on_reconnect=None,
+                 on_disconnect=None):
+        self.api_token = api_token
+        self.url = url
+        self.ssl_context = ssl_context
+
+        self.websocket = None
+        self.receiver = None
+        self.reconnect = reconnect
+        self.backoff = backoff or jittered_backoff()
+        self.on_reconnect = on_reconnect
+        self.on_disconnect = on_disconnect
+        self.reconnecting = False
+        self.closing = False
+        self.reconnects = 0
+        self.last_gap = None
+        # Frames that could not be decoded, skipped
+        self.bad_frames = 0
+        self.pricebook = extp_wss_pricebook.pricebook()
+        self.channels = {}
+        self.quote_counts = collections.Counter()
+        # Optional tick recorder, given every quote (whose levels are then
+        # decoded on reception)
+        self.recorder = None
+        # Futures resolved by the next quote of their symbol
+        self.quote_waiters = {}
+        self.orders = order_tracker()
+
+        self.subscriptions = {}
+        self.pending_subscriptions = {}
+        self.flush_task = None
+
+    def channel(self, msg_type, maxsize=1000, policy=DROP_OLDEST):
+        """
+        Returns the channel of a message type (STREAM_QUOTES,
+        ORDER_DISPATCH_ACK, ORDER_UPDATES...), opening it if needed.
+        The CONFLATE policy opens a conflated_channel, for STREAM_QUOTES only.
+        """
+        if msg_type not in self.channels:
+            if policy == CONFLATE:
+                if msg_type != STREAM_QUOTES:
+                    raise ValueError('Only quotes can be conflated')
+                self.channels[msg_type] = conflated_channel()
+            else:
+                self.channels[msg_type] = channel(maxsize, policy)
+        return self.channels[msg_type]
+
+    async def connect(self):
+        """
+        Connects, authenticates and starts receiving.
+        """
+        self.closing = False
+        await self._open()
+        self.receiver = asyncio.create_task(self._receive())
+
+    async def close(self):
+        self.closing = True
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self.receiver is not None:
+            if self.reconnecting:
+                self.receiver.cancel()
+            try:
+                await self.receiver
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def authorize(self):
+        await self.websocket.send(json.dumps({'type': WS_ACTION.AUTH, 'auth_token': self.api_token}))
+
+    def subscribe_market_data(self, instruments, provider=None):
+        """
+        Subscribes to the market data of instruments. The subscriptions
+        requested during the same event loop iteration are sent in one frame,
+        the returned task completes once it is sent.
+        """
+        subs = []
+        for instrument in instruments:
+            sub = {'type': WS_SUB_TYPE.MARKET_DATA, 'instrument': instrument}
+            if provider is not None:
+                sub['provider'] = provider
+            subs.append(sub)
+            self.subscriptions[(WS_SUB_TYPE.MARKET_DATA, instrument)] = sub
+        return self._send_subscriptions(WS_ACTION.SUBSCRIBE, subs)
+
+    def unsubscribe_market_data(self, instruments):
+        subs = []
+        for instrument in instruments:
+            sub = self.subscriptions.pop(
+                (WS_SUB_TYPE.MARKET_DATA, instrument), None)
+            if sub is not None:
+                subs.append(sub)
+        return self._send_subscriptions(WS_ACTION.UNSUBSCRIBE, subs)
+
+    def next_quote(self, symbol):
+        """
+        Returns a future resolved by the next quote received for symbol.
+        """
+        waiter = self.quote_waiters.get(symbol)
+        if waiter is None or waiter.done():
+            waiter = self.quote_waiters[symbol] = asyncio.get_running_loop().create_future()
+        return waiter
+
+    def subscribe_order_updates(self):
+        sub = {'type': WS_SUB_TYPE.ORDER_UPDATES}
+        self.subscriptions[(WS_SUB_TYPE.ORDER_UPDATES, None)] = sub
+        self.orders.track_updates = True
+        return self._send_subscriptions(WS_ACTION.SUBSCRIBE, [sub])
+
+    async def place_order(self, order_type, instrument, side, size, tif=None, limit_price=None, client_order_id=None):
+        """
+        place_order function: sends and order payload to connected WS, returns
+        its order_ticket, whose ack and result futures are resolved by the
+        order-dispatch-ack and by the terminal order update (order updates
+        must be subscribed to for the latter).
+        :param client_order_id: id of order specified by client, in order to remap with order updates, generated if None.
+        :param order_type: Type of order, can be either WS_ORDER_TYPE.MARKET (1),  WS_ORDER_TYPE.MARKET_NOMINAL(2)  , or  WS_ORDER_TYPE.LIMIT (3).
+        :param instrument: Symbol of intrument that we want to trade, eg: 'BTC-USD'.
+        :param side: side of order, can be either 1 (WS_ORDER_SIDE.BUY) or 2 (WS_ORDER_SIDE.SELL)
+        :param size: order's quantity, must be a > 0 number.
+        :param tif: Time in Force, only if order is of type 'limit'. values can be WS_TIF_TYPE.FOK (fill or kill) or WS_TIF_TYPE.GTC (good til cancelled).
+        :param limit_price: price at which to buy/sell, only appliable if order_type is 'limit'.
+        """
+        payload = {'type': order_type, 'side': side,
+                   'size': size, 'instrument': instrument}
+        if tif is not None:
+            payload['tif'] = tif
+        if limit_price is not None:
+            payload['limit_price'] = limit_price
+        if client_order_id is None:
+            client_order_id = self.orders.next_id()
+        payload['client_order_id'] = client_order_id
+
+        ticket = order_ticket(client_order_id, payload)
+        self.orders.add(ticket)
+        frame = json.dumps({'type': WS_ACTION.ORDER, 'data': {'order': payload}})
+        ticket.sent_at = time.monotonic()
+        await self.websocket.send(frame)
+        return ticket
+
+    def _send_subscriptions(self, action, subs):
+        if subs:
+            self.pending_subscriptions.setdefault(action, []).extend(subs)
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.ensure_future(
+                self._flush_subscriptions())
+        return self.flush_task
+
+    async def _flush_subscriptions(self):
+        # Let the other subscriptions of this loop iteration join the batch
+        await asyncio.sleep(0)
+        while self.pending_subscriptions:
+            pending, self.pending_subscriptions = self.pending_subscriptions, {}
+            for action, subs in pending.items():
+                await self.websocket.send(json.dumps({'type': action, 'subscriptions': subs}))
+
+    async def _open(self):
+        if self.url.startswith('wss:') and self.ssl_context is not None:
+            self.websocket = await websockets.connect(self.url, ssl=self.ssl_context)
+        else:
+            self.websocket = await websockets.connect(self.url)
+        await self.authorize()
+
+    async def _receive(self):
+        try:
+            while True:
+                try:
+                    async for frame in self.websocket:
+                        try:
+                            msg_type, message = decode_frame(frame)
+                        except (ValueError, LookupError, TypeError, AttributeError):
+                            self.bad_frames += 1
+                            continue
+                        if msg_type == STREAM_QUOTES:
+                            self.pricebook.update(message)
+                            self.quote_counts[message.symbol] += 1
+                            if self.quote_waiters:
+                                waiter = self.quote_waiters.pop(message.symbol, None)
+                                if waiter is not None and not waiter.done():
+                                    waiter.set_result(message)
+                            if self.recorder is not None:
+                                self.recorder.record(message.symbol, message.bid_prices, message.bid_qtys,
+                                                     message.ask_prices, message.ask_qtys)
+                        elif msg_type == ORDER_DISPATCH_ACK:
+                            self.orders.on_ack(message)
+                        elif msg_type == ORDER_UPDATES:
+                            self.orders.on_update(message)
+                        channel = self.channels.get(msg_type)
+                        if channel is not None:
+                            await channel.put(message)
+                except websockets.ConnectionClosed:
+                    pass
+                self.orders.fail(ConnectionError('websocket closed'))
+                if self.closing or not self.reconnect:
+                    break
+                await self._reconnect()
+        finally:
+            for channel in self.channels.values():
+                channel.close()
+
+    async def _reconnect(self):
+        disconnected = time.monotonic()
+        # The pricebook may be shared with the other connections of a pool
+        instruments = [instrument for sub_type, instrument in self.subscriptions
+                       if sub_type == WS_SUB_TYPE.MARKET_DATA]
+        self.pricebook.mark_stale(instruments)
+        if self.on_disconnect is not None:
+            self.on_disconnect(instruments)
+        self.reconnecting = True
+        try:
+            while True:
+                await asyncio.sleep(self.backoff.next())
+                try:
+                    await self._open()
+                    # Subscriptions not sent yet are part of the replay
+                    self.pending_subscriptions = {}
+                    if self.subscriptions:
+                        await self.websocket.send(json.dumps({'type': WS_ACTION.SUBSCRIBE,
+                                                              'subscriptions': list(self.subscriptions.values())}))
+                    break
+                except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+                    # Lost again before the replay went out
+                    pass
+        finally:
+            self.reconnecting = False
+        self.backoff.reset()
+
+        self.last_gap = time.monotonic() - disconnected
+        self.reconnects += 1
+        if self.on_reconnect is not None:
+            self.on_reconnect(self.last_gap)
@@ -0,0 +1,133 @@
+# Fast-path decoding of the frames streamed by EXTP websocket.
+#
+# Frames are dispatched on their type field, matched with a regular expression
+# instead of decoding them into a dict tree first. Market data levels are only decoded
+# when read, into compact arrays; other frames fall back to json.
+
+import array
+import collections
+import json
+import re
+import time
+
+STREAM_QUOTES = 'client-streamquotes'
+ORDER_DISPATCH_ACK = 'order-dispatch-ack'
+ORDER_UPDATES = 'order-updates'
+
+_TYPE = re.compile(r'"type"\s*:\s*"([^"]*)"')
+_SYMBOL = re.compile(r'"symbol"\s*:\s*"([^"]*)"')
+_STATUS = re.compile(r'"status"\s*:\s*(-?[0-9]+)')
+_CLIENT_ORDER_ID = re.compile(r'"client_order_id"\s*:\s*"([^"]*)"')
+
+order_ack = collections.namedtuple(
+    'order_ack', ['status', 'client_order_id', 'raw'])
+
+
+class stream_quote:
+    """
+    Quote ladders of one instrument: prices and quantities of each side are
+    kept in array('d'), in the order they were streamed.
+
+    Levels are only decoded from the raw frame on first access, so quotes
+    replaced by a newer one before being read cost nothing but the symbol
+    lookup. received is the time.monotonic() of the frame reception.
+    """
+
+    __slots__ = ('symbol', 'raw', 'received', '_bid_prices',
+                 '_bid_qtys', '_ask_prices', '_ask_qtys')
+
+    def __init__(self, symbol, raw=None):
+        self.symbol = symbol
+        self.raw = raw
+        self.received = time.monotonic()
+        self._bid_prices = None
+        self._bid_qtys = None
+        self._ask_prices = None
+        self._ask_qtys = None
+        if raw is None:
+            self._set_levels(array.array('d'), array.array('d'),
+                             array.array('d'), array.array('d'))
+
+    @property
+    def bid_prices(self):
+        if self._bid_prices is None:
+            self._decode()
+        return self._bid_prices
+
+    @property
+    def bid_qtys(self):
+        if self._bid_qtys is None:
+            self._decode()
+        return self._bid_qtys
+
+    @property
+    def ask_prices(self):
+        if self._ask_prices is None:
+            self._decode()
+        return self._ask_prices
+
+    @property
+    def ask_qtys(self):
+        if self._ask_qtys is None:
+            self._decode()
+        return self._ask_qtys
+
+    def _decode(self):
+        # The C json decoder beats any pure Python scanner on the levels
+        self._set_levels(*_json_levels(json.loads(self.raw)))
+
+    def _set_levels(self, bid_prices, bid_qtys, ask_prices, ask_qtys):
+        self._bid_prices = bid_prices
+        self._bid_qtys = bid_qtys
+        self._ask_prices = ask_prices
+        self._ask_qtys = ask_qtys
+
+    def __repr__(self):
+        return 'stream_quote({!r}, bid={}, ask={})'.format(
+            self.symbol,
+            list(zip(self.bid_qtys, self.bid_prices)),
+            list(zip(self.ask_qtys, self.ask_prices)))
+
+
+def decode_frame(raw):
+    """
+    Decodes a websocket frame, returns a (type, message) pair where message is
+    a stream_quote for 'client-streamquotes', an order_ack for
+    'order-dispatch-ack' and the decoded json otherwise.
+
+    Only the type and the symbol of market data frames are decoded here: the
+    type is the first "type" string field of the frame, the one of its top
+    level object.
+    """
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+
+    msg_type = _TYPE.search(raw)
+    msg_type = msg_type.group(1) if msg_type is not None else None
+
+    if msg_type == STREAM_QUOTES:
+        symbol = _SYMBOL.search(raw)
+        if symbol is not None:
+            return STREAM_QUOTES, stream_quote(symbol.group(1), raw)
+        payload = json.loads(raw)
+        quote = stream_quote(payload['symbol'])
+        quote._set_levels(*_json_levels(payload))
+        return STREAM_QUOTES, quote
+
+    if msg_type == ORDER_DISPATCH_ACK:
+        status = _STATUS.search(raw)
+        if status is not None:
+            client_order_id = _CLIENT_ORDER_ID.search(raw)
+            return ORDER_DISPATCH_ACK, order_ack(int(status.group(1)),
+                                                 client_order_id.group(1) if client_order_id else None, raw)
+
+    payload = json.loads(raw)
+    return payload.get('type'), payload
+
+
+def _json_levels(payload):
+    data = payload['data']
+    return (array.array('d', [level['price'] for level in data.get('bid', [])]),
+            array.array('d', [level['qty'] for level in data.get('bid', [])]),
+            array.array('d', [level['price'] for level in data.get('ask', [])]),
+            array.array('d', [level['qty'] for level in data.get('ask', [])]))
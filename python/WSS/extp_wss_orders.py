@@ -0,0 +1,197 @@
+# Tracking of the orders sent over EXTP websocket.
+#
+# Each order gets a ticket holding two futures, resolved by the
+# order-dispatch-ack and by the terminal order-updates frame matched on its
+# client_order_id, and the time.monotonic() of each stage so that the latency
+# of many concurrent orders can be measured.
+
+import asyncio
+import collections
+import itertools
+import time
+
+# Order statuses after which no more update is expected
+TERMINAL_STATUSES = {'filled', 'rejected', 'cancelled', 'canceled',
+                     'expired', 'killed', 'done'}
+
+
+class order_ticket:
+    """
+    An order sent over websocket:
+    - ack resolves to the order_ack of the order,
+    - result resolves to the terminal order update (or to the order_ack if
+      it was rejected on dispatch),
+    - sent_at, acked_at and done_at are the time.monotonic() of each stage.
+
+    Awaiting the ticket awaits its result.
+    """
+
+    def __init__(self, client_order_id, request):
+        loop = asyncio.get_running_loop()
+        self.client_order_id = client_order_id
+        self.request = request
+        self.ack = loop.create_future()
+        self.result = loop.create_future()
+        self.updates = []
+        self.sent_at = None
+        self.acked_at = None
+        self.done_at = None
+
+    @property
+    def ack_latency(self):
+        """Seconds between send and ack, None until acked."""
+        if self.acked_at is None:
+            return None
+        return self.acked_at - self.sent_at
+
+    @property
+    def fill_latency(self):
+        """Seconds between send and terminal update, None until done."""
+        if self.done_at is None:
+            return None
+        return self.done_at - self.sent_at
+
+    def __await__(self):
+        return self.result.__await__()
+
+    def __repr__(self):
+        def ms(latency):
+            return '-' if latency is None else '{:.3f}ms'.format(latency * 1000)
+        return 'order_ticket({!r}, ack={}, fill={})'.format(
+            self.client_order_id, ms(self.ack_latency), ms(self.fill_latency))
+
+
+class order_tracker:
+    """
+    Pending order tickets by client_order_id. Acks without a client_order_id
+    are matched to the oldest order not acked yet, orders being acked in the
+    sequence they were sent.
+
+    Unless track_updates is set (order updates being subscribed to), a
+    ticket is dropped once acked. Tickets still pending max_age seconds after
+    they were sent are failed with asyncio.TimeoutError.
+    """
+
+    def __init__(self, prefix=None, max_age=60.0):
+        if prefix is None:
+            prefix = '{:x}'.format(int(time.time() * 1000))
+        self.prefix = prefix
+        self.max_age = max_age
+        self.track_updates = False
+        self.ids = itertools.count(1)
+        self.tickets = {}
+        self.unacked = collections.deque()
+
+    def next_id(self):
+        return '{}-{}'.format(self.prefix, next(self.ids))
+
+    def add(self, ticket):
+        self.expire(time.monotonic() - self.max_age)
+        self.tickets[ticket.client_order_id] = ticket
+        self.unacked.append(ticket)
+
+    def on_ack(self, ack):
+        """
+        Resolves the ack of the matching ticket, and its result if the order
+        was rejected. Returns the ticket or None.
+        """
+        ticket = None
+        if ack.client_order_id is not None:
+            ticket = self.tickets.get(ack.client_order_id)
+            if ticket is None:
+                ticket = next((t for t in self.unacked
+                               if t.client_order_id == ack.client_order_id), None)
+        else:
+            while self.unacked and ticket is None:
+                ticket = self.unacked.popleft()
+                if ticket.ack.done():
+                    ticket = None
+        if ticket is None or ticket.ack.done():
+            return None
+
+        ticket.acked_at = time.monotonic()
+        ticket.ack.set_result(ack)
+        while self.unacked and self.unacked[0].ack.done():
+            self.unacked.popleft()
+        if ack.status < 0:
+            self._done(ticket, ack, ticket.acked_at)
+        elif not self.track_updates:
+            # No terminal update will come
+            self.tickets.pop(ticket.client_order_id, None)
+        return ticket
+
+    def on_update(self, payload):
+        """
+        Records the updates of the tracked orders, resolving the result of
+        those reaching a terminal status. Returns the updated tickets.
+        """
+        now = time.monotonic()
+        updated = []
+        for update in _order_updates(payload):
+            ticket = self.tickets.get(update.get('client_order_id'))
+            if ticket is None:
+                continue
+            ticket.updates.append(update)
+            updated.append(ticket)
+            if str(update.get('status', '')).lower() in TERMINAL_STATUSES:
+                self._done(ticket, update, now)
+        return updated
+
+    def expire(self, sent_before):
+        """
+        Fails and drops the pending tickets sent before sent_before, whose
+        ack or terminal update was lost.
+        """
+        exc = asyncio.TimeoutError('No ack or terminal update')
+        while self.unacked and _sent_before(self.unacked[0], sent_before):
+            ticket = self.unacked.popleft()
+            self.tickets.pop(ticket.client_order_id, None)
+            _fail(ticket, exc)
+        # Oldest first
+        while self.tickets:
+            ticket = next(iter(self.tickets.values()))
+            if not _sent_before(ticket, sent_before):
+                break
+            del self.tickets[ticket.client_order_id]
+            _fail(ticket, exc)
+
+    def fail(self, exc):
+        """
+        Fails all the pending tickets, when the connection is lost.
+        """
+        for ticket in list(self.tickets.values()) + list(self.unacked):
+            _fail(ticket, exc)
+        self.tickets.clear()
+        self.unacked.clear()
+
+    def _done(self, ticket, result, now):
+        # An update may beat the ack, which is then still matched to the
+        # ticket when it comes
+        if ticket.result.done():
+            return
+        ticket.done_at = now
+        ticket.result.set_result(result)
+        self.tickets.pop(ticket.client_order_id, None)
+
+
+def _sent_before(ticket, sent_before):
+    return ticket.sent_at is not None and ticket.sent_at < sent_before
+
+
+def _fail(ticket, exc):
+    for future in (ticket.ack, ticket.result):
+        if not future.done():
+            future.set_exception(exc)
+            # Only raised to the code awaiting it
+            future.exception()
+
+
+def _order_updates(payload):
+    # The orders of an order-updates frame, either at the top level or in
+    # its data as a single order or a list of orders
+    data = payload.get('data', payload)
+    if isinstance(data, dict):
+        return [data]
+    if isinstance(data, list):
+        return [update for update in data if isinstance(update, dict)]
+    return []
@@ -0,0 +1,349 @@
+# Pool of EXTP websocket connections sharing the market data of many
+# instruments.
+#
+# Instruments are sharded across the connections, each with its own TCP
+# stream and receive loop, and moved between them from their observed quote
+# rates. Shards may run in worker processes, decoding the levels there and
+# sending them already decoded. All quotes land in a single pricebook.
+
+import array
+import asyncio
+import collections
+import multiprocessing
+import time
+
+import extp_wss_pricebook
+from extp_wss_client import wss_client, EXTP_WSS, CONFLATE
+from extp_wss_codec import stream_quote, STREAM_QUOTES
+
+
+class _shard:
+    """
+    Connection of the pool run by a wss_client of this process, writing in
+    the pool pricebook.
+    """
+
+    def __init__(self, pool):
+        self.client = wss_client(pool.api_token, pool.url, pool.ssl_context)
+        self.client.pricebook = pool.pricebook
+        self.provider = pool.provider
+        self.instruments = set()
+        self.counts = self.client.quote_counts
+
+    async def connect(self):
+        await self.client.connect()
+
+    async def subscribe(self, instruments):
+        self.instruments.update(instruments)
+        await self.client.subscribe_market_data(instruments, self.provider)
+
+    async def unsubscribe(self, instruments):
+        self.instruments.difference_update(instruments)
+        await self.client.unsubscribe_market_data(instruments)
+
+    def next_quote(self, instrument):
+        return self.client.next_quote(instrument)
+
+    async def close(self):
+        await self.client.close()
+
+
+class _process_shard:
+    """
+    Connection of the pool run by a wss_client in a worker process, which
+    decodes the levels and sends them in batches of the latest quote of each
+    updated instrument. The worker uses the default ssl context.
+
+    The instruments of the worker are marked stale in the pool pricebook when
+    its websocket drops, until their next quote, and for good once the worker
+    is gone.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.instruments = set()
+        self.counts = collections.Counter()
+        self.reconnects = 0
+        self.last_gap = None
+        self.quote_waiters = {}
+        self.conn = None
+        self.process = None
+        self.closed = None
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_shard_process, daemon=True,
+            args=(self.pool.api_token, self.pool.url, self.pool.provider, child_conn))
+        self.process.start()
+        child_conn.close()
+        self.closed = loop.create_future()
+        loop.add_reader(self.conn.fileno(), self._on_readable)
+
+    async def subscribe(self, instruments):
+        self.instruments.update(instruments)
+        self.conn.send(('subscribe', list(instruments)))
+
+    async def unsubscribe(self, instruments):
+        self.instruments.difference_update(instruments)
+        self.conn.send(('unsubscribe', list(instruments)))
+
+    def next_quote(self, instrument):
+        waiter = self.quote_waiters.get(instrument)
+        if waiter is None or waiter.done():
+            waiter = self.quote_waiters[instrument] = asyncio.get_running_loop().create_future()
+        return waiter
+
+    async def close(self):
+        if not self.closed.done():
+            self.conn.send(('close',))
+            await self.closed
+        self.process.join()
+
+    def _on_readable(self):
+        try:
+            while self.conn.poll():
+                message = self.conn.recv()
+                if message[0] == 'quotes':
+                    self._on_quotes(message[1], message[2])
+                elif message[0] == 'stale':
+                    self.pool.pricebook.mark_stale(message[1])
+                elif message[0] == 'reconnected':
+                    self.reconnects += 1
+                    self.last_gap = message[1]
+        except (EOFError, OSError):
+            # The worker is gone, and its quotes with it
+            self.pool.pricebook.mark_stale(self.instruments)
+            asyncio.get_running_loop().remove_reader(self.conn.fileno())
+            self.closed.set_result(None)
+
+    def _on_quotes(self, quotes, counts):
+        pricebook = self.pool.pricebook
+        for symbol, received, bid_prices, bid_qtys, ask_prices, ask_qtys in quotes:
+            quote = stream_quote(symbol)
+            quote.received = received
+            quote._set_levels(array.array('d', bid_prices), array.array('d', bid_qtys),
+                              array.array('d', ask_prices), array.array('d', ask_qtys))
+            pricebook.update(quote)
+            if self.quote_waiters:
+                waiter = self.quote_waiters.pop(symbol, None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(quote)
+        self.counts.update(counts)
+
+
+def _shard_process(api_token, url, provider, conn):
+    asyncio.run(_shard_main(api_token, url, provider, conn))
+
+
+async def _shard_main(api_token, url, provider, conn):
+    loop = asyncio.get_running_loop()
+
+    def on_disconnect(instruments):
+        # The quotes not forwarded yet predate the gap
+        quotes.dirty.clear()
+        conn.send(('stale', instruments))
+
+    client = wss_client(api_token, url, on_disconnect=on_disconnect,
+                        on_reconnect=lambda gap: conn.send(('reconnected', gap)))
+    quotes = client.channel(STREAM_QUOTES, policy=CONFLATE)
+    closing = loop.create_future()
+
+    def on_command():
+        try:
+            command = conn.recv()
+        except EOFError:
+            command = ('close',)
+        if command[0] == 'subscribe':
+            client.subscribe_market_data(command[1], provider)
+        elif command[0] == 'unsubscribe':
+            client.unsubscribe_market_data(command[1])
+        elif not closing.done():
+            closing.set_result(None)
+
+    await client.connect()
+    loop.add_reader(conn.fileno(), on_command)
+
+    async def forward():
+        sent_counts = collections.Counter()
+        async for batch in quotes:
+            counts = client.quote_counts - sent_counts
+            sent_counts.update(counts)
+            conn.send(('quotes', [(quote.symbol, quote.received,
+                                   quote.bid_prices.tobytes(), quote.bid_qtys.tobytes(),
+                                   quote.ask_prices.tobytes(), quote.ask_qtys.tobytes())
+                                  for quote in batch.values()], dict(counts)))
+
+    forwarder = asyncio.create_task(forward())
+    await asyncio.wait([closing, client.receiver], return_when=asyncio.FIRST_COMPLETED)
+    loop.remove_reader(conn.fileno())
+    await client.close()
+    await forwarder
+    conn.close()
+
+
+class wss_pool:
+    """
+    Market data of many instruments over nb_connections websockets, merged in
+    pricebook. With processes=True, each connection runs in a worker process.
+
+    Every rebalance_interval seconds, instruments are moved off the
+    connections whose quote rate exceeds imbalance times the mean, to the
+    least loaded ones; the other instruments stay where they are. A moved
+    instrument is only unsubscribed from its old connection once its first
+    quote is received on the new one (or after rebalance_interval seconds
+    without any).
+    """
+
+    def __init__(self, api_token, nb_connections=4, url=EXTP_WSS, ssl_context=None,
+                 provider=None, processes=False, rebalance_interval=10.0, imbalance=1.25):
+        self.api_token = api_token
+        self.url = url
+        self.ssl_context = ssl_context
+        self.provider = provider
+        self.rebalance_interval = rebalance_interval
+        self.imbalance = imbalance
+
+        self.pricebook = extp_wss_pricebook.pricebook()
+        shard = _process_shard if processes else _shard
+        self.shards = [shard(self) for _ in range(nb_connections)]
+        self.assignment = {}
+        self.rebalancer = None
+        # Instruments subscribed on their new connection, still on the old one
+        self.moving = set()
+        self.handoffs = set()
+
+        self.last_counts = collections.Counter()
+        self.last_rates_time = time.monotonic()
+        self.instrument_rates = {}
+
+    async def connect(self):
+        await asyncio.gather(*[shard.connect() for shard in self.shards])
+        self.last_rates_time = time.monotonic()
+        if self.rebalance_interval:
+            self.rebalancer = asyncio.create_task(self._rebalance_loop())
+
+    async def close(self):
+        if self.rebalancer is not None:
+            self.rebalancer.cancel()
+        for handoff in self.handoffs:
+            handoff.cancel()
+        await asyncio.gather(*[shard.close() for shard in self.shards])
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def subscribe_market_data(self, instruments):
+        """
+        Subscribes to instruments, each on the connection with the lowest
+        quote rate (then the fewest instruments).
+        """
+        rates = self.shard_rates()
+        added = collections.defaultdict(list)
+        for instrument in instruments:
+            if instrument in self.assignment:
+                continue
+            i = min(range(len(self.shards)),
+                    key=lambda i: (rates[i], len(self.shards[i].instruments) + len(added[i])))
+            self.assignment[instrument] = i
+            added[i].append(instrument)
+        await asyncio.gather(*[self.shards[i].subscribe(subs) for i, subs in added.items()])
+
+    async def unsubscribe_market_data(self, instruments):
+        removed = collections.defaultdict(list)
+        for instrument in instruments:
+            i = self.assignment.pop(instrument, None)
+            if i is not None:
+                removed[i].append(instrument)
+        await asyncio.gather(*[self.shards[i].unsubscribe(subs) for i, subs in removed.items()])
+
+    def rates(self):
+        """
+        Quote rate of each instrument over the last rebalance period, in
+        messages per second.
+        """
+        return self.instrument_rates
+
+    def shard_rates(self):
+        rates = [0.0] * len(self.shards)
+        for instrument, i in self.assignment.items():
+            rates[i] += self.instrument_rates.get(instrument, 0.0)
+        return rates
+
+    def update_rates(self):
+        now = time.monotonic()
+        counts = collections.Counter()
+        for shard in self.shards:
+            counts.update(shard.counts)
+        elapsed = max(now - self.last_rates_time, 1e-9)
+        self.instrument_rates = {instrument: (counts[instrument] - self.last_counts[instrument]) / elapsed
+                                 for instrument in self.assignment}
+        self.last_counts = counts
+        self.last_rates_time = now
+
+    async def rebalance(self):
+        """
+        Moves instruments off the connections whose quote rate exceeds
+        imbalance times the mean, returns the number of moved instruments.
+        """
+        rates = self.shard_rates()
+        limit = self.imbalance * sum(rates) / len(rates)
+        moves = collections.defaultdict(list)
+        while True:
+            busiest = max(range(len(rates)), key=rates.__getitem__)
+            if rates[busiest] <= limit:
+                break
+            idlest = min(range(len(rates)), key=rates.__getitem__)
+            gap = rates[busiest] - rates[idlest]
+            # The instrument whose rate is the nearest to half the gap, a
+            # move leaving the least loaded connection below the busiest
+            candidates = [instrument for instrument, i in self.assignment.items()
+                          if i == busiest and instrument not in self.moving
+                          and 0 < self.instrument_rates.get(instrument, 0.0) < gap]
+            if not candidates:
+                break
+            instrument = min(candidates, key=lambda s: abs(self.instrument_rates[s] - gap / 2))
+            rates[busiest] -= self.instrument_rates[instrument]
+            rates[idlest] += self.instrument_rates[instrument]
+            self.assignment[instrument] = idlest
+            moves[(busiest, idlest)].append(instrument)
+
+        for (old, new), instruments in moves.items():
+            waiters = [self.shards[new].next_quote(instrument) for instrument in instruments]
+            self.moving.update(instruments)
+            await self.shards[new].subscribe(instruments)
+            handoff = asyncio.create_task(self._handoff(old, instruments, waiters))
+            self.handoffs.add(handoff)
+            handoff.add_done_callback(self.handoffs.discard)
+        return sum(len(instruments) for instruments in moves.values())
+
+    def stats(self):
+        """
+        Instruments and quote rate of each connection.
+        """
+        rates = self.shard_rates()
+        return [{'instruments': len(shard.instruments), 'rate': rate}
+                for shard, rate in zip(self.shards, rates)]
+
+    async def _handoff(self, old, instruments, waiters):
+        # Unsubscribes the old connection once the new one quotes
+        try:
+            await asyncio.wait(waiters, timeout=self.rebalance_interval or None)
+        finally:
+            self.moving.difference_update(instruments)
+        # Unless moved back meanwhile
+        instruments = [instrument for instrument in instruments if self.assignment.get(instrument) != old]
+        if instruments:
+            await self.shards[old].unsubscribe(instruments)
+
+    async def _rebalance_loop(self):
+        while True:
+            await asyncio.sleep(self.rebalance_interval)
+            self.update_rates()
+            await self.rebalance()
@@ -0,0 +1,128 @@
+# Pricebook fed by the 'client-streamquotes' frames of EXTP websocket.
+#
+# Each side of each instrument keeps its levels sorted by quantity, so the
+# price for a quantity is found by binary search.
+#
+# EXTP levels are all-in quantity tiers, as in the FIX ladders: the price of a
+# level applies to the whole quantity of the level, not to an increment of
+# depth on top of the levels below it.
+
+import bisect
+
+BID = 'bid'
+ASK = 'ask'
+
+# Rules applied by pricebook.price() when no level has the exact quantity
+EXACT = 'exact'  # raise KeyError
+NEXT = 'next'  # price of the next level above the quantity
+INTERPOLATE = 'interpolate'  # linear interpolation between the surrounding levels
+
+
+class stale_quote_error(LookupError):
+    """
+    Raised when pricing an instrument whose quote predates a disconnection.
+    """
+
+
+class book_side:
+    """
+    Levels (quantity tiers) of one side, sorted by quantity.
+    """
+
+    __slots__ = ('qtys', 'prices')
+
+    def __init__(self, prices, qtys):
+        if any(qtys[i] > qtys[i + 1] for i in range(len(qtys) - 1)):
+            levels = sorted(zip(qtys, prices))
+            qtys = [qty for qty, _ in levels]
+            prices = [price for _, price in levels]
+        self.qtys = qtys
+        self.prices = prices
+
+    def price(self, quantity, rule=NEXT):
+        i = bisect.bisect_left(self.qtys, quantity)
+        if i < len(self.qtys) and self.qtys[i] == quantity:
+            return self.prices[i]
+        if rule == EXACT:
+            raise KeyError('no level for quantity {}'.format(quantity))
+        if i == len(self.qtys):
+            raise ValueError('quantity {} above the last level'.format(quantity))
+        if rule == INTERPOLATE and i > 0:
+            q0, q1 = self.qtys[i - 1], self.qtys[i]
+            p0, p1 = self.prices[i - 1], self.prices[i]
+            return p0 + (p1 - p0) * (quantity - q0) / (q1 - q0)
+        return self.prices[i]
+
+    def vwap(self, quantity):
+        if quantity <= 0:
+            raise ValueError('quantity {} is not positive'.format(quantity))
+        i = bisect.bisect_left(self.qtys, quantity)
+        if i == len(self.qtys):
+            raise ValueError('not enough depth to fill {}'.format(quantity))
+        # The whole quantity fills at the price of the tier covering it
+        return self.prices[i]
+
+
+class pricebook:
+    """
+    Latest quotes per instrument. Sides are only indexed on the first query
+    following an update, so frames replaced before being queried cost
+    nothing.
+
+    Quotes are marked stale when the feed is lost, and cannot be priced until
+    replaced by a fresh one.
+    """
+
+    def __init__(self):
+        self.quotes = {}
+        self.sides = {}
+        self.stale = set()
+
+    def update(self, quote):
+        """
+        Replaces the quote of an instrument with an extp_wss_codec.stream_quote.
+        """
+        self.quotes[quote.symbol] = quote
+        self.sides.pop(quote.symbol, None)
+        self.stale.discard(quote.symbol)
+
+    def mark_stale(self, symbols=None):
+        """
+        Marks the quotes of symbols, or of all instruments, as stale.
+        """
+        self.stale.update(self.quotes if symbols is None else symbols)
+
+    def is_stale(self, symbol):
+        return symbol in self.stale
+
+    def __contains__(self, symbol):
+        return symbol in self.quotes
+
+    def side(self, symbol, side):
+        if symbol in self.stale:
+            raise stale_quote_error('stale quote for {}'.format(symbol))
+        sides = self.sides.get(symbol)
+        if sides is None:
+            quote = self.quotes[symbol]
+            sides = self.sides[symbol] = {
+                BID: book_side(quote.bid_prices.tolist(), quote.bid_qtys.tolist()),
+                ASK: book_side(quote.ask_prices.tolist(), quote.ask_qtys.tolist())}
+        return sides[side]
+
+    def price(self, symbol, side, quantity, rule=NEXT):
+        """
+        Price for quantity, taken from the level with this exact quantity, or
+        else according to rule: EXACT raises KeyError, NEXT takes the next
+        level above and INTERPOLATE interpolates between the surrounding
+        levels. Raises ValueError above the last level, and stale_quote_error
+        while the quote is stale.
+        """
+        return self.side(symbol, side).price(quantity, rule)
+
+    def vwap(self, symbol, side, quantity):
+        """
+        Average price to fill quantity: the price of the smallest tier
+        covering it, levels being all-in tiers. Raises ValueError for a
+        quantity that is not positive or above the last tier.
+        """
+        return self.side(symbol, side).vwap(quantity)
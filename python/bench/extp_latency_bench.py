@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+# Tick-to-order latency benchmark of the FIX and WSS clients, against the
+# local mock venue.
+#
+# For every market data update received, the client prices a quantity and
+# places a limit FOK order on it:
+# - FIX: fix_client._process_data (the bytes read from the socket) ->
+#   get_extp_offer -> place_order_limit_fok_buy, the order written to the
+#   order session socket,
+# - WSS: quote received by the client receive loop -> pricebook.price ->
+#   place_order, the order frame written to the websocket.
+# The time from receipt to order sent is measured for each update, at
+# increasing quote rates. The venue runs in its own process, so that it
+# does not compete with the client for the interpreter lock. Results are
+# written as JSON, and can be compared against a baseline to catch
+# regressions.
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import extp_paths
+extp_paths.add('FIX', 'WSS', 'mock')
+
+import extp_wss_pricebook
+from extp_fix_client import fix_client
+from extp_fix_heartbeat import latency_histogram
+from extp_fix_log import WARNING, fix_logger
+from extp_mock_venue import mock_venue, venue_config
+from extp_wss_client import wss_client, STREAM_QUOTES, WS_ORDER_TYPE, WS_ORDER_SIDE, WS_TIF_TYPE
+
+SYMBOL = 'BTC-USD'
+QUANTITY = 1
+SLIPPAGE = 0.5 / 10000
+
+
+class bench_result:
+    """
+    Latencies, in nanoseconds, and counts of one benchmark run.
+    """
+
+    def __init__(self, channel, rate):
+        self.channel = channel
+        self.rate = rate
+        self.latencies = latency_histogram()
+        self.ticks = 0
+        self.orders = 0
+        self.errors = 0
+        self.duration = None
+
+    def summary(self):
+        def us(value):
+            return None if value is None else round(value / 1000, 3)
+        latencies = self.latencies.summary()
+        return {'channel': self.channel, 'rate': self.rate, 'duration': round(self.duration, 3),
+                'ticks': self.ticks, 'orders': self.orders, 'errors': self.errors,
+                'ticks_per_s': round(self.ticks / self.duration, 1),
+                'orders_per_s': round(self.orders / self.duration, 1),
+                'min_us': us(latencies['min']), 'mean_us': us(latencies['mean']),
+                'p50_us': us(latencies['p50']), 'p99_us': us(latencies['p99']),
+                'p99.9_us': us(latencies['p99.9']), 'max_us': us(latencies['max'])}
+
+
+class bench_fix_client(fix_client):
+    """
+    Market data session sending a limit FOK order through order_session for
+    every ladder update.
+    """
+
+    def __init__(self, *args, order_session=None, result=None, **kwargs):
+        fix_client.__init__(self, *args, **kwargs)
+        self.order_session = order_session
+        self.result = result
+        self.received_ns = 0
+        self.log_market_data = False
+
+    def _process_data(self, data):
+        self.received_ns = time.monotonic_ns()
+        fix_client._process_data(self, data)
+
+    def _on_market_data(self, buf, view, start, end, incremental):
+        symbols = fix_client._on_market_data(self, buf, view, start, end, incremental)
+        result = self.result
+        if result is None or not self.order_session.logged:
+            return symbols
+        result.ticks += 1
+        try:
+            limit_price = self.get_extp_offer(SYMBOL, QUANTITY) * (1 + SLIPPAGE)
+            self.order_session.place_order_limit_fok_buy(
+                'b%d' % result.orders, SYMBOL, QUANTITY, limit_price)
+        except (LookupError, OSError):
+            result.errors += 1
+            return symbols
+        result.latencies.record(time.monotonic_ns() - self.received_ns)
+        result.orders += 1
+        return symbols
+
+
+def bench_fix(ports, rate, duration, use_tls):
+    logger = fix_logger(WARNING)
+    order_session = fix_client('127.0.0.1', ports['fix_order'], 'BENCH', 'EXTP_ORDER',
+                               'user', 'password', logger=logger, use_tls=use_tls)
+    md_session = bench_fix_client('127.0.0.1', ports['fix_md'], 'BENCH', 'EXTP_MDATA',
+                                  'user', 'password', logger=logger, use_tls=use_tls,
+                                  order_session=order_session)
+    threads = [threading.Thread(target=session.run, daemon=True) for session in (order_session, md_session)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while not (order_session.logged and md_session.logged):
+        if time.monotonic() > deadline:
+            raise RuntimeError('No FIX logon from the mock venue')
+        time.sleep(0.01)
+
+    md_session.send_market_data_request([SYMBOL])
+    time.sleep(0.2)
+    result = bench_result('fix', rate)
+    md_session.result = result
+    start = time.monotonic()
+    time.sleep(duration)
+    md_session.result = None
+    result.duration = time.monotonic() - start
+
+    md_session.stop()
+    order_session.stop()
+    for thread in threads:
+        thread.join()
+    logger.close()
+    return result
+
+
+async def bench_wss_run(ports, rate, duration, use_tls):
+    scheme = 'wss' if use_tls else 'ws'
+    client = wss_client('token', '{}://127.0.0.1:{}/ws'.format(scheme, ports['wss']),
+                        ssl_context=fix_client._ssl_context() if use_tls else None)
+    quotes = client.channel(STREAM_QUOTES, maxsize=10000)
+    await client.connect()
+    client.subscribe_market_data([SYMBOL])
+    await client.subscribe_order_updates()
+    await asyncio.sleep(0.2)
+    # Quotes received meanwhile would be measured with their queueing time
+    while not quotes.queue.empty():
+        quotes.queue.get_nowait()
+
+    result = bench_result('wss', rate)
+    start = time.monotonic()
+    end = start + duration
+    while True:
+        timeout = end - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            quote = await asyncio.wait_for(quotes.get(), timeout)
+        except asyncio.TimeoutError:
+            break
+        result.ticks += 1
+        try:
+            limit_price = client.pricebook.price(SYMBOL, extp_wss_pricebook.ASK, QUANTITY,
+                                                 extp_wss_pricebook.NEXT) * (1 + SLIPPAGE)
+            await client.place_order(WS_ORDER_TYPE.LIMIT, SYMBOL, WS_ORDER_SIDE.BUY,
+                                     QUANTITY, WS_TIF_TYPE.FOK, limit_price)
+        except (LookupError, ValueError, ConnectionError):
+            result.errors += 1
+            continue
+        result.latencies.record(int((time.monotonic() - quote.received) * 1e9))
+        result.orders += 1
+    result.duration = time.monotonic() - start
+    result.errors += quotes.dropped
+    await client.close()
+    return result
+
+
+def bench_wss(ports, rate, duration, use_tls):
+    return asyncio.run(bench_wss_run(ports, rate, duration, use_tls))
+
+
+BENCHMARKS = {'fix': bench_fix, 'wss': bench_wss}
+
+
+def _venue_process(config, certfile, keyfile, conn):
+    async def run():
+        venue = mock_venue(config)
+        await venue.start(certfile=certfile, keyfile=keyfile)
+        conn.send(venue.ports)
+        # Serves until the benchmark closes its end of the pipe
+        await asyncio.get_running_loop().run_in_executor(None, _wait_closed, conn)
+        await venue.stop()
+    asyncio.run(run())
+
+
+def _wait_closed(conn):
+    try:
+        conn.recv()
+    except EOFError:
+        pass
+
+
+class venue_process:
+    """
+    Mock venue run in a child process, for the duration of a with block.
+    """
+
+    def __init__(self, config, certfile=None, keyfile=None):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_venue_process, daemon=True,
+                                       args=(config, certfile, keyfile, child_conn))
+        self.process.start()
+        child_conn.close()
+
+    def __enter__(self):
+        try:
+            return self.conn.recv()
+        except EOFError:
+            raise RuntimeError('The mock venue did not start')
+
+    def __exit__(self, *exc):
+        self.conn.close()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the regressions of results against baseline: runs of the same
+    channel and rate whose p99 grew by more than tolerance.
+    """
+    reference = {(run['channel'], run['rate']): run for run in baseline['results']}
+    regressions = []
+    for run in results:
+        base = reference.get((run['channel'], run['rate']))
+        if base is None or not base['p99_us'] or run['p99_us'] is None:
+            continue
+        ratio = run['p99_us'] / base['p99_us']
+        if ratio > 1 + tolerance:
+            regressions.append({'channel': run['channel'], 'rate': run['rate'],
+                                'p99_us': run['p99_us'], 'baseline_p99_us': base['p99_us'],
+                                'ratio': round(ratio, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tick-to-order latency benchmark against the mock venue')
+    parser.add_argument('--channels', default='fix,wss', help='Comma separated channels: fix, wss')
+    parser.add_argument('--rates', default='100,500,1000,2000,5000',
+                        help='Comma separated quote rates, in messages per second')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds measured per run')
+    parser.add_argument('--certfile', help='Certificate of the mock venue, to benchmark over TLS')
+    parser.add_argument('--keyfile', help='Private key of the certificate, if not in certfile')
+    parser.add_argument('--output', help='JSON file to write, stdout by default')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed p99 growth against the baseline, 0.2 for 20%%')
+    args = parser.parse_args()
+
+    use_tls = args.certfile is not None
+
+    results = []
+    for channel in args.channels.split(','):
+        for rate in [float(rate) for rate in args.rates.split(',')]:
+            config = venue_config(depth=10, quote_rate=rate, seed=0)
+            with venue_process(config, args.certfile, args.keyfile) as ports:
+                result = BENCHMARKS[channel](ports, rate, args.duration, use_tls)
+            results.append(result.summary())
+            summary = results[-1]
+            print('{} @ {:g}/s: p50 {}us p99 {}us p99.9 {}us, {} orders/s'.format(
+                channel, rate, summary['p50_us'], summary['p99_us'], summary['p99.9_us'],
+                summary['orders_per_s']), file=sys.stderr)
+
+    report = {'version': 1,
+              'timestamp': time.time(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'tls': use_tls,
+              'duration': args.duration,
+              'results': results}
+    status = 0
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            report['regressions'] = compare(results, json.load(file), args.tolerance)
+        status = 1 if report['regressions'] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    return status
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
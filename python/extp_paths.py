@@ -0,0 +1,35 @@
+# Import paths of the samples.
+#
+# Each directory of the samples (FIX, WSS, REST, mock...) is a flat set of
+# modules, and a sample is run from anywhere as python <directory>/<sample>.py,
+# its own directory being then first on sys.path. The modules shared by several
+# directories (extp_reconnect) are kept here, in python/.
+#
+# Library modules never change sys.path: they expect python/ on it. Only the
+# scripts do, before their imports (under if __name__ == '__main__' for a
+# library module that is also a script), relative to their own file,
+#
+#   sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+#
+# then import this module to reach the modules of other directories:
+#
+#   import extp_paths
+#   extp_paths.add('REST')
+#
+# Code importing the clients from elsewhere puts python/ and their directory
+# on sys.path (or PYTHONPATH) the same way.
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def add(*directories):
+    """
+    Puts directories of the samples (e.g. 'REST', 'mock') on sys.path.
+    """
+    for directory in directories:
+        path = os.path.join(ROOT, directory)
+        if path not in sys.path:
+            sys.path.insert(0, path)
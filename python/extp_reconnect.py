@@ -0,0 +1,32 @@
+# Reconnection delays of EXTP FIX sessions and websocket clients.
+
+import random
+
+
+class jittered_backoff:
+    """
+    Exponential backoff with full jitter: the n-th delay is drawn uniformly
+    in [0, min(maximum, initial * factor ** n)], so that clients cut at the
+    same time do not reconnect in lockstep. The first retry comes almost at
+    once, which is what a network blip needs.
+    """
+
+    def __init__(self, initial=0.05, maximum=5.0, factor=2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.attempts = 0
+
+    def next(self):
+        """
+        Returns the delay before the next attempt, in seconds.
+        """
+        ceiling = self.initial * self.factor ** self.attempts
+        if ceiling < self.maximum:
+            self.attempts += 1
+        else:
+            ceiling = self.maximum
+        return random.uniform(0, ceiling)
+
+    def reset(self):
+        self.attempts = 0
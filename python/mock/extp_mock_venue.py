@@ -0,0 +1,621 @@
+#!/usr/bin/env python3
+
+# Local stand-in for EXTP, to load test the clients of this repository
+# offline.
+#
+# It speaks the protocols they use:
+# - REST: POST /api/v1/rfq and /api/v1/order, with keep-alive,
+# - websocket: auth, subscribe/unsubscribe (market data and order updates)
+#   and order actions on /ws, streaming 'client-streamquotes',
+#   'order-dispatch-ack' and 'order-updates' frames,
+# - FIX 4.4: Logon, Heartbeat/TestRequest, ResendRequest (answered by a gap
+#   fill), MarketDataRequest (35=V) answered by snapshots (35=W) or
+#   incremental refreshes (35=X), NewOrderSingle (35=D) answered by an
+#   ExecutionReport (35=8), Logout.
+# Prices follow a random walk around a mid per instrument. Quote rates, book
+# depth, fill and reject ratios and the latency added before each answer are
+# configurable. TLS is used when a certificate is given.
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import ssl
+import time
+
+import simplefix
+import websockets
+
+DEFAULT_MIDS = {'BTC-USD': 60000.0, 'ETH-USD': 3000.0, 'LTC-USD': 80.0}
+DEFAULT_QTYS = (0.01, 0.1, 0.5, 1, 5, 10, 25, 50)
+
+FILLED = 'filled'
+REJECTED = 'rejected'
+KILLED = 'killed'
+
+
+class venue_config:
+    """
+    Behaviour of the mock venue:
+    - mids: initial mid price per instrument, unknown instruments start at
+      default_mid,
+    - depth: number of levels per side, taken from level_qtys,
+    - quote_rate: quotes per second per subscribed instrument,
+    - spread_bps, impact_bps: half spread and price impact of the largest
+      level, volatility_bps: standard deviation of a mid move per quote,
+    - fill_ratio: probability that an order which is not rejected and whose
+      limit price is marketable is filled, the others are killed,
+    - reject_ratio: probability that an order is rejected,
+    - latency, latency_jitter: seconds added before each answer to a request
+      or order, the jitter being uniform in [0, latency_jitter],
+    - quote_ttl: validity of RFQ quotes in seconds,
+    - api_token, username, password: credentials checked if not None.
+    """
+
+    def __init__(self, mids=None, default_mid=100.0, depth=5, level_qtys=DEFAULT_QTYS, quote_rate=10.0,
+                 spread_bps=2.0, impact_bps=5.0, volatility_bps=0.5, fill_ratio=1.0, reject_ratio=0.0,
+                 latency=0.0, latency_jitter=0.0, quote_ttl=5.0, api_token=None, username=None,
+                 password=None, seed=None):
+        self.mids = dict(DEFAULT_MIDS if mids is None else mids)
+        self.default_mid = default_mid
+        self.depth = depth
+        self.level_qtys = level_qtys
+        self.quote_rate = quote_rate
+        self.spread_bps = spread_bps
+        self.impact_bps = impact_bps
+        self.volatility_bps = volatility_bps
+        self.fill_ratio = fill_ratio
+        self.reject_ratio = reject_ratio
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.quote_ttl = quote_ttl
+        self.api_token = api_token
+        self.username = username
+        self.password = password
+        self.seed = seed
+
+
+class mock_market:
+    """
+    Mid prices random walking per instrument, and the prices of the levels
+    and orders around them.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.mids = dict(config.mids)
+        qtys = list(config.level_qtys)
+        while len(qtys) < config.depth:
+            qtys.append(qtys[-1] * 2)
+        self.level_qtys = qtys[:config.depth]
+        self.max_qty = max(self.level_qtys)
+
+    def mid(self, instrument):
+        mid = self.mids.get(instrument)
+        if mid is None:
+            mid = self.mids[instrument] = self.config.default_mid
+        return mid
+
+    def move(self, instrument):
+        mid = self.mid(instrument) * (1 + self.rng.gauss(0, self.config.volatility_bps / 10000))
+        self.mids[instrument] = mid
+        return mid
+
+    def price(self, instrument, side, quantity):
+        """
+        Price of a quantity, the spread widening with the quantity.
+        """
+        offset = (self.config.spread_bps + self.config.impact_bps * min(quantity / self.max_qty, 1)) / 10000
+        if side == 'buy':
+            return self.mid(instrument) * (1 + offset)
+        return self.mid(instrument) * (1 - offset)
+
+    def levels(self, instrument):
+        """
+        Returns the (quantity, price) levels of the bid and ask sides.
+        """
+        return ([(qty, self.price(instrument, 'sell', qty)) for qty in self.level_qtys],
+                [(qty, self.price(instrument, 'buy', qty)) for qty in self.level_qtys])
+
+    def execute(self, instrument, side, quantity, limit_price=None):
+        """
+        Returns the (status, price, text) of an order, limit orders being
+        fill or kill.
+        """
+        try:
+            quantity = float(quantity)
+        except (TypeError, ValueError):
+            quantity = 0
+        if side not in ('buy', 'sell') or not quantity > 0:
+            return REJECTED, None, 'Invalid order'
+        if self.rng.random() < self.config.reject_ratio:
+            return REJECTED, None, 'Rejected by the venue'
+        price = self.price(instrument, side, quantity)
+        if limit_price is not None and (price > limit_price if side == 'buy' else price < limit_price):
+            return KILLED, None, 'Limit price not reached'
+        if self.rng.random() >= self.config.fill_ratio:
+            return KILLED, None, 'No liquidity'
+        return FILLED, price, None
+
+
+class venue_stats:
+    def __init__(self):
+        self.rest_requests = 0
+        self.wss_frames_sent = 0
+        self.fix_msgs_sent = 0
+        self.orders = 0
+        self.fills = 0
+
+
+class mock_venue:
+    """
+    Mock EXTP venue serving REST, websocket and FIX (market data and order
+    sessions) on the ports given to start(), 0 picking a free port; the
+    ports bound are then in `ports`. With certfile, every server uses TLS.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or venue_config()
+        self.market = mock_market(self.config)
+        self.stats = venue_stats()
+        self.servers = []
+        self.ports = {}
+        self.order_ids = itertools.count(1)
+        self.quote_ids = itertools.count(1)
+        # Next outbound MsgSeqNum of the FIX sessions, by (SenderCompID,
+        # TargetCompID) of the client
+        self.fix_seq_nums = {}
+        self.tasks = set()
+        # REST and FIX connections, closed by stop()
+        self.writers = set()
+
+    async def start(self, host='127.0.0.1', rest_port=0, wss_port=0, fix_md_port=0, fix_order_port=0,
+                    certfile=None, keyfile=None):
+        context = None
+        if certfile is not None:
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(certfile, keyfile)
+
+        if rest_port is not None:
+            server = await asyncio.start_server(self._serve_rest, host, rest_port, ssl=context)
+            self._add_server('rest', server)
+        if wss_port is not None:
+            server = await websockets.serve(self._serve_wss, host, wss_port, ssl=context)
+            self._add_server('wss', server)
+        if fix_md_port is not None:
+            server = await asyncio.start_server(self._serve_fix, host, fix_md_port, ssl=context)
+            self._add_server('fix_md', server)
+        if fix_order_port is not None:
+            server = await asyncio.start_server(self._serve_fix, host, fix_order_port, ssl=context)
+            self._add_server('fix_order', server)
+
+    async def stop(self):
+        for server in self.servers:
+            server.close()
+        for task in list(self.tasks):
+            task.cancel()
+        for writer in list(self.writers):
+            writer.close()
+        for server in self.servers:
+            await server.wait_closed()
+        self.servers = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def _add_server(self, name, server):
+        self.servers.append(server)
+        self.ports[name] = server.sockets[0].getsockname()[1]
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _latency(self):
+        delay = self.config.latency
+        if self.config.latency_jitter:
+            delay += self.market.rng.uniform(0, self.config.latency_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _execute(self, instrument, side, quantity, limit_price=None):
+        self.stats.orders += 1
+        status, price, text = self.market.execute(instrument, side, quantity, limit_price)
+        if status == FILLED:
+            self.stats.fills += 1
+        return status, price, text
+
+    async def _stream(self, instruments, send):
+        """
+        Calls send(instruments) at quote_rate, with the instruments to quote
+        in a batch when the rate is above the timer resolution.
+        """
+        rate = self.config.quote_rate
+        period = max(1 / rate, 0.001)
+        due = 0.0
+        last = time.monotonic()
+        try:
+            while True:
+                await asyncio.sleep(period)
+                now = time.monotonic()
+                due += (now - last) * rate
+                last = now
+                nb_quotes = int(due)
+                due -= nb_quotes
+                for _ in range(nb_quotes):
+                    if instruments:
+                        await send(instruments)
+        except (ConnectionError, websockets.ConnectionClosed):
+            pass
+
+    # REST
+
+    async def _serve_rest(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                self.stats.rest_requests += 1
+                status, payload = await self._on_rest(method, path, headers, body)
+                data = json.dumps(payload).encode('utf-8')
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n'
+                             b'Connection: %s\r\n\r\n' % (status, b'OK' if status == 200 else b'Error',
+                                                          len(data), b'keep-alive' if keep_alive else b'close'))
+                writer.write(data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Connection handlers are cancelled at shutdown, which asyncio
+            # 3.11 would log as an error
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def _on_rest(self, method, path, headers, body):
+        if self.config.api_token is not None and headers.get('x-api-key') != self.config.api_token:
+            return 401, {'error': 'Invalid API key'}
+        if method != 'POST' or path not in ('/api/v1/rfq', '/api/v1/order'):
+            return 404, {'error': 'Not found'}
+        try:
+            params = json.loads(body)
+        except ValueError:
+            return 400, {'error': 'Invalid JSON'}
+        await self._latency()
+
+        instrument = params.get('instrument')
+        side = params.get('side')
+        quantity = params.get('quantity')
+        if path == '/api/v1/rfq':
+            try:
+                price = self.market.price(instrument, side, float(quantity))
+            except (TypeError, ValueError):
+                return 400, {'error': 'Invalid RFQ'}
+            return 200, {'response': {'quote_id': next(self.quote_ids), 'instrument': instrument,
+                                      'side': side, 'quantity': quantity, 'quote_price': price,
+                                      'valid_until': time.time() + self.config.quote_ttl}}
+
+        limit_price = params.get('limit_price') if params.get('order_type') == 'limit' else None
+        status, price, text = self._execute(instrument, side, quantity, limit_price)
+        response = {'order_id': next(self.order_ids), 'instrument': instrument, 'side': side,
+                    'quantity': quantity, 'status': status}
+        if price is not None:
+            response['executed_price'] = price
+        if text is not None:
+            response['reason'] = text
+        return 200, {'response': response}
+
+    # Websocket
+
+    async def _serve_wss(self, websocket, path=None):
+        request = getattr(websocket, 'request', None)
+        if (request.path if request is not None else path) != '/ws':
+            await websocket.close(1008, 'Not found')
+            return
+
+        instruments = set()
+        state = {'authorized': self.config.api_token is None, 'order_updates': False}
+
+        async def send(frame):
+            self.stats.wss_frames_sent += 1
+            await websocket.send(json.dumps(frame))
+
+        async def send_quotes(instruments):
+            for instrument in list(instruments):
+                self.market.move(instrument)
+                bid, ask = self.market.levels(instrument)
+                await send({'type': 'client-streamquotes', 'symbol': instrument,
+                            'data': {'bid': [{'price': price, 'qty': qty} for qty, price in bid],
+                                     'ask': [{'price': price, 'qty': qty} for qty, price in ask]}})
+
+        streamer = self._spawn(self._stream(instruments, send_quotes))
+        try:
+            async for frame in websocket:
+                try:
+                    message = json.loads(frame)
+                    action = message['type']
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if action == 4:  # auth
+                    state['authorized'] = self.config.api_token is None or \
+                        message.get('auth_token') == self.config.api_token
+                elif not state['authorized']:
+                    await websocket.close(1008, 'Unauthorized')
+                elif action in (1, 2):  # subscribe, unsubscribe
+                    for sub in message.get('subscriptions', []):
+                        if sub.get('type') == 1:
+                            if action == 1:
+                                instruments.add(sub.get('instrument'))
+                            else:
+                                instruments.discard(sub.get('instrument'))
+                        elif sub.get('type') == 2:
+                            state['order_updates'] = action == 1
+                elif action == 3:  # order
+                    order = message.get('data', {}).get('order', {})
+                    self._spawn(self._on_wss_order(order, state, send))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            streamer.cancel()
+
+    async def _on_wss_order(self, order, state, send):
+        await self._latency()
+        side = {1: 'buy', 2: 'sell'}.get(order.get('side'))
+        order_type = order.get('type')
+        limit_price = order.get('limit_price') if order_type == 3 else None
+        status, price, text = self._execute(order.get('instrument'), side, order.get('size'), limit_price)
+        ack = {'type': 'order-dispatch-ack', 'status': -1 if status == REJECTED else 0}
+        client_order_id = order.get('client_order_id')
+        if client_order_id is not None:
+            ack['client_order_id'] = client_order_id
+        try:
+            await send(ack)
+            if state['order_updates'] and status != REJECTED:
+                update = {'order_id': next(self.order_ids), 'client_order_id': client_order_id,
+                          'instrument': order.get('instrument'), 'side': side,
+                          'size': order.get('size'), 'status': status}
+                if price is not None:
+                    update['executed_price'] = price
+                if text is not None:
+                    update['reason'] = text
+                await send({'type': 'order-updates', 'data': update})
+        except websockets.ConnectionClosed:
+            pass
+
+    # FIX
+
+    async def _serve_fix(self, reader, writer):
+        self.writers.add(writer)
+        session = _fix_session(self, writer)
+        parser = simplefix.FixParser()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                parser.append_buffer(data)
+                while True:
+                    msg = parser.get_message()
+                    if msg is None:
+                        break
+                    if not await session.on_msg(msg):
+                        return
+        except (ConnectionError, ssl.SSLError):
+            pass
+        except asyncio.CancelledError:
+            # Connection handlers are cancelled at shutdown, which asyncio
+            # 3.11 would log as an error
+            pass
+        finally:
+            self.writers.discard(writer)
+            session.close()
+            writer.close()
+
+
+class _fix_session:
+    """
+    One FIX connection to the mock venue.
+    """
+
+    def __init__(self, venue, writer):
+        self.venue = venue
+        self.writer = writer
+        self.sender_comp_id = None
+        self.target_comp_id = None
+        self.key = None
+        self.streamers = []
+
+    def close(self):
+        for streamer in self.streamers:
+            streamer.cancel()
+
+    def send(self, msg_type, pairs, msg_seq_num=None):
+        """
+        Sends a message with the next outbound MsgSeqNum, or as a possible
+        duplicate of msg_seq_num, which does not take a new one.
+        """
+        if self.writer.is_closing():
+            raise ConnectionError('FIX connection closed')
+        poss_dup = msg_seq_num is not None
+        if not poss_dup:
+            seq_nums = self.venue.fix_seq_nums
+            msg_seq_num = seq_nums.get(self.key, 1)
+            seq_nums[self.key] = msg_seq_num + 1
+        msg = simplefix.FixMessage()
+        msg.append_pair(8, 'FIX.4.4', header=True)  # BeginString
+        msg.append_pair(35, msg_type, header=True)  # MsgType
+        msg.append_pair(49, self.sender_comp_id, header=True)  # SenderCompID
+        msg.append_pair(56, self.target_comp_id, header=True)  # TargetCompID
+        msg.append_pair(34, msg_seq_num, header=True)  # MsgSeqNum
+        if poss_dup:
+            msg.append_pair(43, 'Y', header=True)  # PossDupFlag
+        msg.append_time(52, header=True)  # SendingTime
+        if poss_dup:
+            msg.append_time(122, header=True)  # OrigSendingTime
+        for tag, value in pairs:
+            msg.append_pair(tag, value)
+        self.venue.stats.fix_msgs_sent += 1
+        self.writer.write(msg.encode())
+
+    async def on_msg(self, msg):
+        """
+        Answers a message, returns False once the session is over.
+        """
+        msg_type = msg.get(35)
+        config = self.venue.config
+        if msg_type == b'A':
+            # The venue is the sender of the answers
+            self.sender_comp_id = msg.get(56).decode('ascii')
+            self.target_comp_id = msg.get(49).decode('ascii')
+            self.key = (self.target_comp_id, self.sender_comp_id)
+            if (config.username is not None and msg.get(553) != config.username.encode()) or \
+                    (config.password is not None and msg.get(554) != config.password.encode()):
+                self.send('5', [(58, 'Invalid credentials')])
+                return False
+            if msg.get(141) == b'Y' or self.key not in self.venue.fix_seq_nums:
+                self.venue.fix_seq_nums[self.key] = 1
+            self.send('A', [(98, 0), (108, msg.get(108) or b'60')])
+        elif self.target_comp_id is None:
+            return False
+        elif msg_type == b'1':
+            self.send('0', [(112, msg.get(112))])
+        elif msg_type == b'2':
+            # Nothing is kept to be resent: a SequenceReset-GapFill in place
+            # of BeginSeqNo, up to the next outbound MsgSeqNum
+            next_seq_num = self.venue.fix_seq_nums.get(self.key, 1)
+            self.send('4', [(123, 'Y'), (36, next_seq_num)], msg_seq_num=int(msg.get(7)))
+        elif msg_type == b'V':
+            symbols = [value.decode('ascii') for tag, value in msg.pairs if tag == b'55']
+            incremental = msg.get(265) == b'1'
+            for symbol in symbols:
+                self._send_snapshot(symbol)
+            self.streamers.append(self.venue._spawn(
+                self.venue._stream(symbols, self._send_incremental if incremental else self._send_snapshots)))
+        elif msg_type == b'D':
+            self.venue._spawn(self._on_order(msg))
+        elif msg_type == b'5':
+            self.send('5', [])
+            return False
+        return True
+
+    async def _send_snapshots(self, symbols):
+        for symbol in symbols:
+            self.venue.market.move(symbol)
+            self._send_snapshot(symbol)
+        await self.writer.drain()
+
+    def _send_snapshot(self, symbol):
+        bid, ask = self.venue.market.levels(symbol)
+        pairs = [(55, symbol), (268, len(bid) + len(ask))]
+        for entry_type, levels in ((0, bid), (1, ask)):
+            for qty, price in levels:
+                pairs += [(269, entry_type), (270, _fix_float(price)), (271, _fix_float(qty))]
+        self.send('W', pairs)
+
+    async def _send_incremental(self, symbols):
+        for symbol in symbols:
+            self.venue.market.move(symbol)
+            bid, ask = self.venue.market.levels(symbol)
+            pairs = [(268, len(bid) + len(ask))]
+            for entry_type, levels in ((0, bid), (1, ask)):
+                for qty, price in levels:
+                    pairs += [(279, 1), (269, entry_type), (55, symbol),
+                              (270, _fix_float(price)), (271, _fix_float(qty))]
+            self.send('X', pairs)
+        await self.writer.drain()
+
+    async def _on_order(self, msg):
+        await self.venue._latency()
+        side = {b'1': 'buy', b'2': 'sell'}.get(msg.get(54))
+        symbol = (msg.get(55) or b'').decode('ascii')
+        quantity = float(msg.get(38) or 0)
+        limit_price = float(msg.get(44)) if msg.get(40) == b'2' and msg.get(44) else None
+        status, price, text = self.venue._execute(symbol, side, quantity, limit_price)
+
+        pairs = [(37, next(self.venue.order_ids)), (11, msg.get(11)), (55, symbol), (54, msg.get(54)),
+                 (38, msg.get(38))]
+        if status == FILLED:
+            pairs += [(150, 'F'), (39, '2'), (14, msg.get(38)), (151, 0),
+                      (31, _fix_float(price)), (32, msg.get(38)), (6, _fix_float(price))]
+        else:
+            ord_status = '8' if status == REJECTED else '4'
+            pairs += [(150, ord_status), (39, ord_status), (14, 0), (151, 0), (6, 0), (58, text)]
+        try:
+            self.send('8', pairs)
+        except ConnectionError:
+            pass
+
+
+def _fix_float(value):
+    return '{:.8f}'.format(value).rstrip('0').rstrip('.') if math.isfinite(value) else '0'
+
+
+async def main(args):
+    config = venue_config(depth=args.depth, quote_rate=args.quote_rate, fill_ratio=args.fill_ratio,
+                          reject_ratio=args.reject_ratio, latency=args.latency / 1000,
+                          latency_jitter=args.latency_jitter / 1000, seed=args.seed)
+    venue = mock_venue(config)
+    await venue.start(args.host, args.rest_port, args.wss_port, args.fix_md_port, args.fix_order_port,
+                      args.certfile, args.keyfile)
+    scheme = 's' if args.certfile else ''
+    print('REST      http{}://{}:{}/api/v1'.format(scheme, args.host, venue.ports['rest']))
+    print('WSS       ws{}://{}:{}/ws'.format(scheme, args.host, venue.ports['wss']))
+    print('FIX MDATA {}:{}'.format(args.host, venue.ports['fix_md']))
+    print('FIX ORDER {}:{}'.format(args.host, venue.ports['fix_order']))
+    stats = venue.stats
+    while True:
+        await asyncio.sleep(args.stats_interval)
+        print('rest requests: {} wss frames: {} fix messages: {} orders: {} fills: {}'.format(
+            stats.rest_requests, stats.wss_frames_sent, stats.fix_msgs_sent, stats.orders, stats.fills))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Mock EXTP venue')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--rest-port', type=int, default=8080)
+    parser.add_argument('--wss-port', type=int, default=8081)
+    parser.add_argument('--fix-md-port', type=int, default=40001)
+    parser.add_argument('--fix-order-port', type=int, default=40002)
+    parser.add_argument('--certfile', help='Certificate, to serve over TLS')
+    parser.add_argument('--keyfile', help='Private key of the certificate, if not in certfile')
+    parser.add_argument('--quote-rate', type=float, default=10,
+                        help='Quotes per second per subscribed instrument')
+    parser.add_argument('--depth', type=int, default=5, help='Levels per side')
+    parser.add_argument('--fill-ratio', type=float, default=1.0)
+    parser.add_argument('--reject-ratio', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.0, help='Latency added to answers, in ms')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='Jitter added to latency, in ms')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--stats-interval', type=float, default=10)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+# Routing of limit FOK orders across the FIX, websocket and REST channels.
+#
+# Each channel keeps exponentially weighted moving averages of its ack and
+# fill latencies and of its error rate. An order goes down the healthy channel
+# with the lowest fill latency, a channel left unused for a while being given
+# the next order to refresh its averages. A disconnected channel is skipped; one whose
+# error rate goes above a threshold is skipped for a cooldown, after which the
+# next order probes it. An order that could not be sent on a channel is sent
+# on the next one, but an order that may have reached the venue is never sent
+# twice.
+
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import extp_paths
+extp_paths.add('FIX', 'WSS', 'REST')
+
+import websockets
+
+import extp_fix_orders
+from extp_rest_client import rest_error
+from extp_rest_scheduler import ORDER
+from extp_wss_client import WS_ORDER_TYPE, WS_ORDER_SIDE, WS_TIF_TYPE
+
+FIX_STATUSES = {extp_fix_orders.FILLED: 'filled', extp_fix_orders.REJECTED: 'rejected',
+                extp_fix_orders.CANCELED: 'canceled', extp_fix_orders.EXPIRED: 'expired',
+                extp_fix_orders.DONE_FOR_DAY: 'done'}
+
+# REST statuses for which the order was not taken, and can go elsewhere. A 502
+# or 504 of a proxy may come after the order reached the venue: like a
+# timeout, it is not failed over
+REST_UNAVAILABLE = (429, 503)
+
+
+class channel_down(ConnectionError):
+    """
+    The order could not be sent on a channel, it can go down another one.
+    """
+
+
+class routed_order:
+    """
+    Outcome of an order: the channel it went down, its status ('filled',
+    'rejected', 'killed'...), executed price (None unless filled), ack and
+    fill latencies in seconds, and the raw response of the channel.
+    """
+
+    def __init__(self, channel, client_order_id, status, executed_price, ack_latency, fill_latency, response):
+        self.channel = channel
+        self.client_order_id = client_order_id
+        self.status = status
+        self.executed_price = executed_price
+        self.ack_latency = ack_latency
+        self.fill_latency = fill_latency
+        self.response = response
+
+    @property
+    def filled(self):
+        return self.status == 'filled'
+
+    def __repr__(self):
+        return 'routed_order({!r}, {!r}, {}, {}, ack={:.3f}ms, fill={:.3f}ms)'.format(
+            self.channel, self.client_order_id, self.status, self.executed_price,
+            self.ack_latency * 1000, self.fill_latency * 1000)
+
+
+class channel_stats:
+    """
+    Moving averages of the latencies (seconds, None until measured) and error
+    rate of a channel, alpha being the weight of the last order.
+    """
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.ack_latency = None
+        self.fill_latency = None
+        self.error_rate = 0.0
+        self.orders = 0
+        self.errors = 0
+        self.down_until = 0.0
+        self.last_used = None
+
+    def record(self, order):
+        self.orders += 1
+        self.last_used = time.monotonic()
+        self.ack_latency = self._average(self.ack_latency, order.ack_latency)
+        self.fill_latency = self._average(self.fill_latency, order.fill_latency)
+        self.error_rate = self._average(self.error_rate, 0.0)
+
+    def record_error(self):
+        self.orders += 1
+        self.last_used = time.monotonic()
+        self.errors += 1
+        self.error_rate = self._average(self.error_rate, 1.0)
+
+    def _average(self, average, value):
+        return value if average is None else average + self.alpha * (value - average)
+
+
+class fix_channel:
+    """
+    Orders sent over an extp_fix_async.async_fix_client order session.
+    """
+
+    def __init__(self, session, name='fix'):
+        self.session = session
+        self.name = name
+
+    def connected(self):
+        return self.session.logged and self.session.transport is not None
+
+    async def send(self, client_order_id, instrument, side, quantity, limit_price, timeout):
+        if not self.connected():
+            raise channel_down('FIX session not logged on')
+        session = self.session
+        start = time.monotonic()
+        try:
+            ack = await session.submit_order(client_order_id, instrument, side, quantity, limit_price, timeout)
+            ack_latency = time.monotonic() - start
+            state = await session.wait_order(client_order_id, timeout)
+        finally:
+            session.orders.release(client_order_id)
+        return routed_order(self.name, client_order_id, FIX_STATUSES.get(state.status, 'unknown'),
+                            state.avg_px if state.cum_qty else None,
+                            ack_latency, time.monotonic() - start, (ack, state))
+
+
+class wss_channel:
+    """
+    Orders sent over an extp_wss_client.wss_client, which must be subscribed
+    to the order updates.
+    """
+
+    def __init__(self, client, name='wss'):
+        self.client = client
+        self.name = name
+
+    def connected(self):
+        client = self.client
+        return client.websocket is not None and not client.reconnecting and not client.closing
+
+    async def send(self, client_order_id, instrument, side, quantity, limit_price, timeout):
+        if not self.connected():
+            raise channel_down('Websocket disconnected')
+        start = time.monotonic()
+        try:
+            ticket = await self.client.place_order(
+                WS_ORDER_TYPE.LIMIT, instrument, WS_ORDER_SIDE.BUY if side == 'buy' else WS_ORDER_SIDE.SELL,
+                quantity, WS_TIF_TYPE.FOK, limit_price, client_order_id)
+        except websockets.ConnectionClosed as e:
+            # The frame was not sent
+            raise channel_down(str(e))
+        # Timeouts leave the ticket to the client
+        ack = await asyncio.wait_for(asyncio.shield(ticket.ack), timeout)
+        ack_latency = time.monotonic() - start
+        result = await asyncio.wait_for(asyncio.shield(ticket.result), timeout)
+        if ack.status < 0:
+            status, executed_price = 'rejected', None
+        else:
+            status, executed_price = str(result.get('status', 'unknown')).lower(), result.get('executed_price')
+        return routed_order(self.name, client_order_id, status, executed_price,
+                            ack_latency, time.monotonic() - start, result)
+
+
+class rest_channel:
+    """
+    Orders sent over an extp_rest_client.rest_client, at the given
+    extp_rest_scheduler priority. The response is both the ack and the
+    fill. The channel is only down for a refused connection or a
+    REST_UNAVAILABLE status.
+    """
+
+    def __init__(self, client, name='rest', priority=ORDER):
+        self.client = client
+        self.name = name
+        self.priority = priority
+
+    def connected(self):
+        # The client reopens its connections on its own
+        return True
+
+    async def send(self, client_order_id, instrument, side, quantity, limit_price, timeout):
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(self.client.order(
+                instrument, side, quantity, 'limit', limit_price, 'FOK', self.priority), timeout)
+        except ConnectionRefusedError as e:
+            raise channel_down(str(e))
+        except rest_error as e:
+            if e.status in REST_UNAVAILABLE:
+                raise channel_down('HTTP {}'.format(e.status))
+            raise
+        latency = time.monotonic() - start
+        order = response.get('response', response) if isinstance(response, dict) else {}
+        return routed_order(self.name, client_order_id, str(order.get('status', 'unknown')).lower(),
+                            order.get('executed_price'), latency, latency, response)
+
+
+class order_router:
+    """
+    Sends limit FOK orders down the fastest healthy of channels (fix_channel,
+    wss_channel, rest_channel...), by moving average of fill latency. The
+    channels not measured yet, or not used for probe_interval seconds, go
+    first (no probing if None).
+
+    A channel is unhealthy while disconnected, or for cooldown seconds once
+    its error rate is above max_error_rate. Errors are exceptions and
+    timeouts, not rejected orders.
+    """
+
+    def __init__(self, channels, alpha=0.2, max_error_rate=0.5, cooldown=5.0, timeout=5.0, probe_interval=10.0,
+                 prefix=None):
+        self.channels = list(channels)
+        self.stats = {channel.name: channel_stats(alpha) for channel in self.channels}
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.timeout = timeout
+        self.probe_interval = probe_interval
+        if prefix is None:
+            prefix = 'r{:x}'.format(int(time.time() * 1000))
+        self.prefix = prefix
+        self.ids = itertools.count(1)
+
+    def ranked(self):
+        """
+        Returns the healthy channels, the fastest first.
+        """
+        now = time.monotonic()
+
+        def latency(channel):
+            stats = self.stats[channel.name]
+            if stats.fill_latency is None or (self.probe_interval is not None and
+                                              now - stats.last_used > self.probe_interval):
+                return 0.0
+            return stats.fill_latency
+        channels = [channel for channel in self.channels
+                    if channel.connected() and self.stats[channel.name].down_until <= now]
+        return sorted(channels, key=latency)
+
+    async def place_order_limit_fok(self, instrument, side, quantity, limit_price, client_order_id=None):
+        """
+        Sends a limit FOK order, returns its routed_order.
+        :param side: 'buy' or 'sell'.
+        :raises channel_down: if no channel could send it.
+        """
+        if client_order_id is None:
+            client_order_id = '{}-{}'.format(self.prefix, next(self.ids))
+        errors = []
+        for channel in self.ranked():
+            try:
+                order = await channel.send(client_order_id, instrument, side, quantity, limit_price, self.timeout)
+            except channel_down as e:
+                self._error(channel)
+                errors.append('{}: {}'.format(channel.name, e))
+                continue
+            except (OSError, asyncio.TimeoutError, rest_error, websockets.ConnectionClosed):
+                # The order may have reached the venue
+                self._error(channel)
+                raise
+            self.stats[channel.name].record(order)
+            return order
+        raise channel_down('No channel could send the order' + (': ' + ', '.join(errors) if errors else ''))
+
+    def summary(self):
+        """
+        Returns the stats of each channel, latencies in milliseconds.
+        """
+        def ms(latency):
+            return None if latency is None else round(latency * 1000, 3)
+        now = time.monotonic()
+        return {channel.name: {'connected': channel.connected(),
+                               'down': self.stats[channel.name].down_until > now,
+                               'orders': self.stats[channel.name].orders,
+                               'errors': self.stats[channel.name].errors,
+                               'error_rate': round(self.stats[channel.name].error_rate, 3),
+                               'ack_ms': ms(self.stats[channel.name].ack_latency),
+                               'fill_ms': ms(self.stats[channel.name].fill_latency)}
+                for channel in self.channels}
+
+    def _error(self, channel):
+        stats = self.stats[channel.name]
+        stats.record_error()
+        if stats.error_rate > self.max_error_rate:
+            stats.down_until = time.monotonic() + self.cooldown
+
+
+async def main(args):
+    extp_paths.add('mock')
+    from extp_fix_async import async_fix_client
+    from extp_fix_log import WARNING, fix_logger
+    from extp_mock_venue import mock_venue, venue_config
+    from extp_rest_client import rest_client
+    from extp_wss_client import wss_client
+
+    # A local mock venue, every channel over plain TCP
+    venue = mock_venue(venue_config(latency=args.latency))
+    await venue.start()
+    fix = async_fix_client('127.0.0.1', venue.ports['fix_order'], 'ROUTER', 'EXTP_ORDER',
+                           'user', 'password', logger=fix_logger(WARNING), use_tls=False)
+    wss = wss_client('token', 'ws://127.0.0.1:{}/ws'.format(venue.ports['wss']))
+    rest = rest_client('token', 'http://127.0.0.1:{}'.format(venue.ports['rest']))
+    await asyncio.gather(fix.logon(), wss.connect(), rest.connect())
+    await wss.subscribe_order_updates()
+
+    router = order_router([fix_channel(fix), wss_channel(wss), rest_channel(rest)],
+                          cooldown=args.cooldown, probe_interval=args.probe_interval)
+    for i in range(args.orders):
+        if i == args.orders // 2:
+            # The fastest streaming channel goes away: the next orders fail over
+            fastest = next(channel for channel in router.ranked() if channel.name != 'rest')
+            print('stopping', fastest.name)
+            if fastest.name == 'fix':
+                await fix.stop()
+            else:
+                await wss.close()
+        side = 'buy' if i % 2 == 0 else 'sell'
+        price = (await rest.rfq('BTC-USD', side, 0.1))['response']['quote_price']
+        print(await router.place_order_limit_fok('BTC-USD', side, 0.1, price * (1.001 if side == 'buy' else 0.999)))
+
+    for name, stats in router.summary().items():
+        print(name, stats)
+    await asyncio.gather(fix.stop(), wss.close(), rest.close())
+    await venue.stop()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Routes orders over FIX, websocket and REST to a local mock venue')
+    parser.add_argument('--orders', type=int, default=20, help='Number of orders')
+    parser.add_argument('--latency', type=float, default=0.001, help='Latency of the mock venue, in seconds')
+    parser.add_argument('--cooldown', type=float, default=5.0, help='Seconds a degraded channel is skipped')
+    parser.add_argument('--probe-interval', type=float, default=0.02,
+                        help='Seconds after which an unused channel is given an order')
+    asyncio.run(main(parser.parse_args()))
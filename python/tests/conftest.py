@@ -0,0 +1,13 @@
+# Tests of the samples' library modules, run from the repository root with
+#
+#   python -m pytest -q python/tests
+#
+# The modules are found as the scripts find them, see extp_paths.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import extp_paths
+
+extp_paths.add('FIX', 'WSS', 'REST', 'mock', 'tools', 'router', 'bench')
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import simplefix
+
+import extp_fix_orders
+from extp_fix_async import async_fix_client
+from extp_fix_log import WARNING, fix_logger
+from extp_mock_venue import mock_venue, venue_config
+
+
+def client(port, target_comp_id='EXTP_ORDER'):
+    return async_fix_client('127.0.0.1', port, 'CLIENT', target_comp_id, 'user', 'password',
+                            logger=fix_logger(WARNING), use_tls=False)
+
+
+def test_order_against_the_mock_venue():
+    async def main():
+        venue = mock_venue(venue_config(seed=1))
+        await venue.start(rest_port=None, wss_port=None, fix_md_port=None)
+        session = client(venue.ports['fix_order'])
+        try:
+            await session.logon()
+            report = await session.submit_order('order-1', 'BTC-USD', 'buy', 0.1, 1e9)
+            assert report.get(11) == b'order-1'
+            state = await session.wait_order('order-1', 5)
+            assert state.status == extp_fix_orders.FILLED
+            assert state.cum_qty == 0.1
+        finally:
+            await session.stop()
+            await venue.stop()
+    asyncio.run(main())
+
+
+def test_market_data_is_queued_by_symbol():
+    async def main():
+        venue = mock_venue(venue_config(seed=1))
+        await venue.start(rest_port=None, wss_port=None, fix_order_port=None)
+        session = client(venue.ports['fix_md'], 'EXTP_MDATA')
+        session.log_market_data = False
+        try:
+            await session.logon()
+            session.send_market_data_request(['BTC-USD'])
+            async for msg_type, message in session:
+                if msg_type == b'W':
+                    break
+            assert message == 'BTC-USD'
+            assert session.get_extp_offer('BTC-USD', 1) > session.get_extp_bid('BTC-USD', 1)
+        finally:
+            await session.stop()
+            await venue.stop()
+    asyncio.run(main())
+
+
+def _encode(msg_type, msg_seq_num, pairs):
+    msg = simplefix.FixMessage()
+    msg.append_pair(8, 'FIX.4.4', header=True)
+    msg.append_pair(35, msg_type, header=True)
+    msg.append_pair(49, 'EXTP', header=True)
+    msg.append_pair(56, 'CLIENT', header=True)
+    msg.append_pair(34, msg_seq_num, header=True)
+    msg.append_time(52, header=True)
+    for tag, value in pairs:
+        msg.append_pair(tag, value)
+    return msg.encode()
+
+
+def test_report_without_cl_ord_id_and_dead_link():
+    # A venue answering the Logon, sending an ExecutionReport of its own
+    # then going silent
+    async def serve(reader, writer):
+        await reader.read(65536)
+        writer.write(_encode('A', 1, [(98, 0), (108, 1)]))
+        writer.write(_encode('8', 2, [(37, 'venue-1'), (39, '4'), (150, '4')]))
+        try:
+            await reader.read()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(serve, '127.0.0.1', 0)
+        session = client(server.sockets[0].getsockname()[1])
+        session.heartbeat.heartbeat_interval = 1
+        try:
+            await session.logon()
+            start = time.monotonic()
+            received = [msg_type async for msg_type, message in session]
+            assert received == [b'A', b'8']
+            # Closed by the watchdog after twice 1.2 heartbeat intervals
+            assert time.monotonic() - start < 5
+            assert session.transport is None
+        finally:
+            server.close()
+            await server.wait_closed()
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+from extp_fix_heartbeat import heartbeat_manager, latency_histogram, timer_wheel
+from extp_fix_log import WARNING, fix_logger
+
+
+def test_timers_fire_once_at_their_tick():
+    wheel = timer_wheel(tick=0.1, nb_slots=8)
+    fired = []
+    wheel.schedule(0.5, lambda: fired.append('a'))
+    wheel.schedule(2.0, lambda: fired.append('b'))
+    now = time.monotonic()
+    wheel.advance(now + 0.2)
+    assert fired == []
+    wheel.advance(now + 0.7)
+    assert fired == ['a']
+    # 2.0s is past one turn of the wheel (0.8s): the timer stays in its slot
+    wheel.advance(now + 1.5)
+    assert fired == ['a']
+    wheel.advance(now + 2.2)
+    wheel.advance(now + 3.0)
+    assert fired == ['a', 'b']
+
+
+def test_cancelled_timer_does_not_fire():
+    wheel = timer_wheel(tick=0.1)
+    fired = []
+    timer = wheel.schedule(0.1, lambda: fired.append(True))
+    wheel.cancel(timer)
+    wheel.advance(time.monotonic() + 1)
+    assert fired == []
+
+
+def test_histogram_is_exact_for_small_values():
+    histogram = latency_histogram()
+    for value in range(1, 101):
+        histogram.record(value)
+    assert histogram.percentile(50) == 50
+    assert histogram.percentile(99) == 99
+    assert histogram.percentile(100) == 100
+    assert histogram.mean() == 50.5
+    assert (histogram.min, histogram.max) == (1, 100)
+
+
+def test_histogram_precision_of_large_values():
+    histogram = latency_histogram()
+    for value in range(1000, 1000000, 1000):
+        histogram.record(value)
+    for percentile in (50, 90, 99):
+        expected = 1000 * int(percentile / 100 * 999 + 0.5)
+        assert histogram.percentile(percentile) == pytest.approx(expected, rel=2 ** -6)
+
+
+def test_histogram_reset():
+    histogram = latency_histogram()
+    histogram.record(10)
+    histogram.reset()
+    assert histogram.count == 0
+    assert histogram.percentile(50) is None
+    assert histogram.summary()['mean'] is None
+
+
+class session:
+    """
+    Records what the heartbeat_manager sends.
+    """
+
+    def __init__(self):
+        self.logger = fix_logger(WARNING)
+        self.log_prefix = '[test]'
+        self.sent = []
+
+    def _send_heartbeat(self):
+        self.sent.append('heartbeat')
+
+    def _send_test_request(self, test_req_id):
+        self.sent.append(test_req_id)
+
+
+@pytest.fixture
+def manager():
+    result = heartbeat_manager(session(), heartbeat_interval=1, probe_interval=0, wheel=timer_wheel(tick=0.05))
+    result.start()
+    yield result
+    result.stop()
+    result.session.logger.close()
+
+
+def test_heartbeat_sent_when_idle(manager):
+    manager.last_sent = time.monotonic() - 1
+    manager.last_received = time.monotonic()
+    manager.poll(time.monotonic() + 1.05)
+    assert manager.session.sent == ['heartbeat']
+    assert manager.link_up
+
+
+def test_test_request_then_link_down_when_nothing_received(manager):
+    manager.last_sent = time.monotonic()
+    manager.last_received = time.monotonic() - 1.3
+    manager.poll(time.monotonic() + 1.25)
+    assert manager.session.sent[-1].startswith(b'TEST-')
+    assert manager.link_up
+    manager.last_received = time.monotonic() - 2.5
+    manager.poll(time.monotonic() + 2)
+    assert not manager.link_up
+
+
+def test_round_trip_recorded_on_the_answer(manager):
+    manager._send_test_request()
+    test_req_id = manager.session.sent[-1]
+    manager.on_heartbeat(b'unknown')
+    manager.on_heartbeat(test_req_id)
+    manager.on_heartbeat(test_req_id)
+    assert manager.rtt.count == 1
+    assert manager.pending_test_requests == {}
@@ -0,0 +1,75 @@
+import numpy
+import pytest
+
+from extp_fix_client import fix_client, md_ladder, stale_market_data_error
+from extp_fix_log import WARNING, fix_logger
+
+
+def ladder(*levels):
+    result = md_ladder(capacity=2)
+    for quantity, price in levels:
+        result.append(quantity, price)
+    return result
+
+
+def test_append_grows_past_capacity():
+    result = ladder((1, 100.0), (2, 101.0), (5, 102.0), (10, 103.0))
+    assert result.size == 4
+    assert result.quantities[:4].tolist() == [1, 2, 5, 10]
+
+
+def test_get_price_interpolates_between_levels():
+    result = ladder((1, 100.0), (3, 102.0))
+    assert result.get_price(1) == 100.0
+    assert result.get_price(2) == pytest.approx(101.0)
+    # Below the first level, its price; above the depth, 0
+    assert result.get_price(0.5) == 100.0
+    assert result.get_price(4) == 0
+
+
+def test_get_price_of_an_array():
+    result = ladder((1, 100.0), (3, 102.0))
+    assert result.get_price(numpy.array([1, 2, 3])).tolist() == pytest.approx([100.0, 101.0, 102.0])
+
+
+def test_set_level_keeps_quantities_sorted():
+    result = ladder((1, 100.0), (5, 104.0))
+    result.set_level(3, 102.0)
+    result.set_level(5, 105.0)
+    result.set_level(0.5, 99.0)
+    assert result.quantities[:result.size].tolist() == [0.5, 1, 3, 5]
+    assert result.prices[:result.size].tolist() == [99.0, 100.0, 102.0, 105.0]
+
+
+def test_remove_level():
+    result = ladder((1, 100.0), (3, 102.0), (5, 104.0))
+    result.remove_level(3)
+    result.remove_level(4)
+    assert result.quantities[:result.size].tolist() == [1, 5]
+    assert result.prices[:result.size].tolist() == [100.0, 104.0]
+
+
+@pytest.fixture
+def client():
+    logger = fix_logger(WARNING)
+    yield fix_client('127.0.0.1', 0, 'CLIENT', 'EXTP', 'user', 'password', logger=logger, use_tls=False)
+    logger.close()
+
+
+def test_batch_pricing_of_symbols_and_quantities(client):
+    client.set_market_data('BTC-USD', [1, 2], [100.0, 99.0], [1, 2], [101.0, 102.0])
+    client.set_market_data('ETH-USD', [1, 2], [10.0, 9.0], [1, 2], [11.0, 12.0])
+    bids = client.get_extp_bids(['BTC-USD', 'ETH-USD'], [1, 2])
+    assert bids.shape == (2, 2)
+    assert bids.tolist() == [[100.0, 99.0], [10.0, 9.0]]
+    assert client.get_extp_offers(['ETH-USD'], [1.5]).tolist() == [[11.5]]
+    assert client.get_extp_offer('BTC-USD', 2) == 102.0
+
+
+def test_stale_symbols_are_not_priced(client):
+    client.set_market_data('BTC-USD', [1], [100.0], [1], [101.0])
+    client.stale_symbols.add('BTC-USD')
+    with pytest.raises(stale_market_data_error):
+        client.get_extp_bid('BTC-USD', 1)
+    client.set_market_data('BTC-USD', [1], [100.0], [1], [101.0])
+    assert client.get_extp_bid('BTC-USD', 1) == 100.0
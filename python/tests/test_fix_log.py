@@ -0,0 +1,72 @@
+import io
+import time
+
+from extp_fix_log import DEBUG, ERROR, INFO, WARNING, fix_logger, fix_text
+
+
+def test_fix_text_replaces_soh():
+    assert str(fix_text(b'8=FIX.4.4\x019=5\x0135=0\x01')) == '8=FIX.4.4|9=5|35=0|'
+
+
+class counting_arg:
+    """
+    Argument counting how many times it is formatted.
+    """
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return 'arg'
+
+
+def test_records_below_the_level_are_neither_kept_nor_formatted():
+    stream = io.StringIO()
+    logger = fix_logger(WARNING, stream=stream)
+    arg = counting_arg()
+    logger.debug('debug', arg)
+    logger.info('info', arg)
+    logger.warning('warning', 1)
+    logger.error('error', 2)
+    logger.close()
+    assert arg.formatted == 0
+    lines = stream.getvalue().splitlines()
+    assert [line.split(' ', 1)[1] for line in lines] == ['WARNING warning 1', 'ERROR error 2']
+    assert logger.is_enabled_for(ERROR) and not logger.is_enabled_for(INFO)
+
+
+def test_records_are_written_by_the_background_thread():
+    stream = io.StringIO()
+    logger = fix_logger(DEBUG, stream=stream, flush_interval=0.001)
+    logger.debug('Received', fix_text(b'35=A\x01'))
+    deadline = time.time() + 2
+    while not stream.getvalue() and time.time() < deadline:
+        time.sleep(0.001)
+    assert stream.getvalue().endswith('DEBUG Received 35=A|\n')
+    logger.close()
+
+
+def test_sampling_then_dropping_past_the_high_watermark():
+    stream = io.StringIO()
+    logger = fix_logger(DEBUG, capacity=8, sample_rate=2, stream=stream)
+    # Hold the writer so that the buffer fills up
+    logger._running = False
+    logger._writer.join()
+    for i in range(4):
+        logger.info(i)
+    # Half full: 1 INFO out of 2 is kept, WARNING always
+    logger.info(4)
+    logger.info(5)
+    logger.warning(6)
+    assert len(logger.records) == 6
+    logger.warning(7)
+    logger.warning(8)
+    # Full: everything is dropped
+    logger.error(9)
+    assert len(logger.records) == 8
+    assert logger.dropped == 2
+    logger._run()
+    lines = stream.getvalue().splitlines()
+    assert lines[-1] == '2 log records dropped'
+    assert [line.rsplit(' ', 1)[1] for line in lines[:-1]] == ['0', '1', '2', '3', '4', '6', '7', '8']
@@ -0,0 +1,105 @@
+import simplefix
+
+from extp_fix_client import decode_market_data_incremental, decode_market_data_snapshot
+
+
+def encode(msg_type, pairs):
+    msg = simplefix.FixMessage()
+    msg.append_pair(8, 'FIX.4.4', header=True)
+    msg.append_pair(35, msg_type, header=True)
+    msg.append_pair(49, 'EXTP', header=True)
+    msg.append_pair(56, 'CLIENT', header=True)
+    msg.append_pair(34, 2, header=True)
+    for tag, value in pairs:
+        msg.append_pair(tag, value)
+    return bytearray(msg.encode())
+
+
+def levels(ladder):
+    return list(zip(ladder.quantities[:ladder.size].tolist(), ladder.prices[:ladder.size].tolist()))
+
+
+def snapshot(entries, symbol='BTC-USD'):
+    pairs = [(55, symbol), (268, len(entries))]
+    for entry in entries:
+        pairs += entry
+    return encode('W', pairs)
+
+
+def decode(decoder, buf, bids, offers, offset=0):
+    with memoryview(buf) as view:
+        return decoder(buf, view, offset, len(buf), bids, offers)
+
+
+def test_snapshot_fills_both_sides():
+    bids, offers = {}, {}
+    buf = snapshot([[(269, 0), (270, 100.5), (271, 1)], [(269, 0), (270, 100.0), (271, 5)],
+                    [(269, 1), (270, 101.5), (271, 1)]])
+    assert decode(decode_market_data_snapshot, buf, bids, offers) == 'BTC-USD'
+    assert levels(bids['BTC-USD']) == [(1, 100.5), (5, 100.0)]
+    assert levels(offers['BTC-USD']) == [(1, 101.5)]
+
+
+def test_snapshot_replaces_the_previous_levels():
+    bids, offers = {}, {}
+    decode(decode_market_data_snapshot, snapshot([[(269, 0), (270, 100.0), (271, 1)]]), bids, offers)
+    decode(decode_market_data_snapshot, snapshot([[(269, 1), (270, 102.0), (271, 2)]]), bids, offers)
+    assert levels(bids['BTC-USD']) == []
+    assert levels(offers['BTC-USD']) == [(2, 102.0)]
+
+
+def test_snapshot_drops_entries_missing_price_or_size():
+    bids, offers = {}, {}
+    buf = snapshot([[(269, 0), (270, 100.0)], [(269, 0), (271, 2)], [(269, 0), (270, 99.0), (271, 3)],
+                    [(269, 1), (270, 101.0)]])
+    decode(decode_market_data_snapshot, buf, bids, offers)
+    assert levels(bids['BTC-USD']) == [(3, 99.0)]
+    assert levels(offers['BTC-USD']) == []
+
+
+def test_snapshot_decoded_in_place_in_a_larger_buffer():
+    bids, offers = {}, {}
+    first = snapshot([[(269, 0), (270, 1.0), (271, 1)]], 'ETH-USD')
+    second = snapshot([[(269, 1), (270, 2.0), (271, 1)]], 'LTC-USD')
+    buf = first + second
+    with memoryview(buf) as view:
+        assert decode_market_data_snapshot(buf, view, len(first), len(buf), bids, offers) == 'LTC-USD'
+    assert 'ETH-USD' not in bids
+    assert levels(offers['LTC-USD']) == [(1, 2.0)]
+
+
+def incremental(entries):
+    pairs = [(268, len(entries))]
+    for entry in entries:
+        pairs += entry
+    return encode('X', pairs)
+
+
+def test_incremental_new_change_and_delete():
+    bids, offers = {}, {}
+    decode(decode_market_data_snapshot, snapshot([[(269, 0), (270, 100.0), (271, 1)],
+                                                  [(269, 0), (270, 99.0), (271, 5)],
+                                                  [(269, 1), (270, 101.0), (271, 1)]]), bids, offers)
+    buf = incremental([[(279, 0), (269, 0), (55, 'BTC-USD'), (270, 99.5), (271, 2)],  # new
+                       [(279, 1), (269, 1), (55, 'BTC-USD'), (270, 101.2), (271, 1)],  # change
+                       [(279, 2), (269, 0), (55, 'BTC-USD'), (271, 5)]])  # delete
+    assert decode(decode_market_data_incremental, buf, bids, offers) == ['BTC-USD']
+    assert levels(bids['BTC-USD']) == [(1, 100.0), (2, 99.5)]
+    assert levels(offers['BTC-USD']) == [(1, 101.2)]
+
+
+def test_incremental_symbol_carried_over_and_several_symbols():
+    bids, offers = {}, {}
+    buf = incremental([[(279, 0), (269, 0), (55, 'BTC-USD'), (270, 100.0), (271, 1)],
+                       [(279, 0), (269, 1), (270, 101.0), (271, 1)],
+                       [(279, 0), (269, 1), (55, 'ETH-USD'), (270, 11.0), (271, 2)]])
+    assert decode(decode_market_data_incremental, buf, bids, offers) == ['BTC-USD', 'ETH-USD']
+    assert levels(offers['BTC-USD']) == [(1, 101.0)]
+    assert levels(offers['ETH-USD']) == [(2, 11.0)]
+
+
+def test_incremental_skips_entries_without_size():
+    bids, offers = {}, {}
+    buf = incremental([[(279, 0), (269, 0), (55, 'BTC-USD'), (270, 100.0)]])
+    assert decode(decode_market_data_incremental, buf, bids, offers) == []
+    assert 'BTC-USD' not in bids
@@ -0,0 +1,60 @@
+import simplefix
+
+from extp_fix_client import fix_timestamp, order_template
+
+
+def parse(data):
+    parser = simplefix.FixParser()
+    parser.append_buffer(bytes(data))
+    return parser.get_message()
+
+
+def test_body_length_and_checksum():
+    template = order_template('CLIENT', 'EXTP_ORDER', 'BTC-USD', '1', '2', '4')
+    data = bytes(template.encode(7, b'20260101-00:00:00.000', 'order-1', 0.5, 60000.5))
+    body_start = data.index(b'\x01', data.index(b'9=')) + 1
+    checksum_start = data.rindex(b'10=')
+    assert int(data[data.index(b'9=') + 2:body_start - 1]) == checksum_start - body_start
+    assert int(data[checksum_start + 3:-1]) == sum(data[:checksum_start]) % 256
+    assert data.endswith(b'\x01')
+
+
+def test_limit_fok_fields():
+    template = order_template('CLIENT', 'EXTP_ORDER', 'BTC-USD', '2', '2', '4')
+    msg = parse(template.encode(7, b'20260101-00:00:00.000', 'order-1', 0.5, 60000.5))
+    assert msg.get(35) == b'D'
+    assert msg.get(49) == b'CLIENT'
+    assert msg.get(56) == b'EXTP_ORDER'
+    assert msg.get(34) == b'7'
+    assert msg.get(11) == b'order-1'
+    assert msg.get(55) == b'BTC-USD'
+    assert msg.get(54) == b'2'
+    assert msg.get(60) == b'20260101-00:00:00.000'
+    assert msg.get(38) == b'0.5'
+    assert msg.get(40) == b'2'
+    assert msg.get(44) == b'60000.5'
+    assert msg.get(59) == b'4'
+
+
+def test_market_order_has_no_price():
+    template = order_template('CLIENT', 'EXTP_ORDER', 'ETH-USD', '1', '1')
+    msg = parse(template.encode(1, fix_timestamp(), 42, 3))
+    assert msg.get(40) == b'1'
+    assert msg.get(44) is None
+    assert msg.get(59) is None
+    assert msg.get(11) == b'42'
+
+
+def test_buffer_reused_by_the_next_order():
+    template = order_template('CLIENT', 'EXTP_ORDER', 'BTC-USD', '1', '1')
+    first = bytes(template.encode(1, fix_timestamp(), 'a', 1))
+    second = template.encode(2, fix_timestamp(), 'bb', 10)
+    assert parse(first).get(11) == b'a'
+    assert parse(second).get(11) == b'bb'
+    assert parse(second).get(34) == b'2'
+
+
+def test_fix_timestamp_format():
+    timestamp = fix_timestamp()
+    assert len(timestamp) == 21
+    assert timestamp[8:9] == b'-' and timestamp[17:18] == b'.'
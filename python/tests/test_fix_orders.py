@@ -0,0 +1,107 @@
+import simplefix
+
+import extp_fix_orders
+from extp_fix_orders import order_table
+
+
+def report(cl_ord_id, ord_status, **fields):
+    msg = simplefix.FixMessage()
+    msg.append_pair(35, '8')
+    msg.append_pair(11, cl_ord_id)
+    msg.append_pair(39, ord_status)
+    for tag, value in fields.items():
+        msg.append_pair(int(tag[1:]), value)
+    return msg
+
+
+def test_execution_reports_update_the_order():
+    table = order_table(capacity=4)
+    table.add('order-1', 2.0)
+    assert table.get('order-1').status == extp_fix_orders.PENDING
+    table.on_execution_report(report('order-1', '0', t37='venue-1'))
+    table.on_execution_report(report('order-1', '1', t14='0.5', t6='100.5'))
+    state = table.get('order-1')
+    assert state.status == extp_fix_orders.PARTIALLY_FILLED
+    assert (state.order_id, state.cum_qty, state.avg_px) == ('venue-1', 0.5, 100.5)
+    assert not table.is_terminal('order-1')
+
+    # Filled without CumQty: the whole quantity
+    table.on_execution_report(report('order-1', '2'))
+    state = table.get('order-1')
+    assert state.status == extp_fix_orders.FILLED
+    assert state.cum_qty == 2.0
+    assert table.is_terminal('order-1')
+
+    # Reports after the terminal one are ignored
+    table.on_execution_report(report('order-1', '4'))
+    assert table.get('order-1').status == extp_fix_orders.FILLED
+
+
+def test_report_without_cl_ord_id_is_ignored():
+    table = order_table()
+    msg = simplefix.FixMessage()
+    msg.append_pair(39, '8')
+    assert table.on_execution_report(msg) is None
+
+
+def test_report_of_an_unknown_order_registers_it():
+    table = order_table()
+    table.on_execution_report(report('previous-run', '8', t38='3', t58='rejected'))
+    state = table.get('previous-run')
+    assert (state.status, state.quantity, state.text) == (extp_fix_orders.REJECTED, 3.0, 'rejected')
+
+
+def test_callbacks_and_futures_on_terminal_state():
+    table = order_table()
+    states = []
+    table.add_callback(states.append)
+    table.add('order-1', 1.0)
+    future = table.future('order-1')
+    table.on_execution_report(report('order-1', '0'))
+    assert not future.done() and states == []
+    table.on_execution_report(report('order-1', '2', t14='1', t6='99'))
+    assert future.result(0).avg_px == 99.0
+    assert states == [future.result(0)]
+    # Asked once terminal: resolved at once
+    assert table.future('order-1').result(0).status == extp_fix_orders.FILLED
+
+
+def test_reused_cl_ord_id_cancels_the_previous_future():
+    table = order_table()
+    table.add('order-1', 1.0)
+    future = table.future('order-1')
+    table.add('order-1', 2.0)
+    assert future.cancelled()
+    assert table.get('order-1').quantity == 2.0
+
+
+def test_table_grows_past_its_capacity():
+    table = order_table(capacity=2)
+    for i in range(5):
+        table.add('order-%d' % i, i)
+    assert len(table.cl_ord_ids) == 8
+    assert [table.get('order-%d' % i).quantity for i in range(5)] == [0, 1, 2, 3, 4]
+
+
+def test_only_the_last_terminal_orders_are_retained():
+    table = order_table(capacity=4, retain=2)
+    for i in range(10):
+        table.add('order-%d' % i, 1.0)
+        table.on_execution_report(report('order-%d' % i, '2'))
+    # The slots of the older orders are reused: the table did not grow
+    assert len(table.cl_ord_ids) == 4
+    assert [table.get('order-%d' % i) is not None for i in range(10)] == [False] * 8 + [True] * 2
+
+
+def test_live_order_reusing_a_retired_cl_ord_id_is_kept():
+    table = order_table(capacity=4, retain=1)
+    table.add('order-1', 1.0)
+    table.on_execution_report(report('order-1', '8'))
+    # Sent again under the same ClOrdID, still live when order-1 is retired
+    table.add('order-1', 1.0)
+    table.add('order-2', 1.0)
+    table.on_execution_report(report('order-2', '2'))
+    assert table.get('order-1').status == extp_fix_orders.PENDING
+    table.on_execution_report(report('order-1', '2'))
+    assert table.get('order-1').status == extp_fix_orders.FILLED
+    assert table.get('order-2') is None
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import extp_fix_orders
+from extp_fix_client import fix_client
+from extp_fix_log import WARNING, fix_logger
+from extp_fix_session_manager import fix_session_manager
+from extp_mock_venue import mock_venue, venue_config
+
+
+@pytest.fixture
+def venue():
+    # The manager runs its own thread, the venue its event loop in another
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    result = mock_venue(venue_config(seed=1))
+    asyncio.run_coroutine_threadsafe(result.start(rest_port=None, wss_port=None), loop).result(5)
+    result.loop = loop
+    yield result
+    asyncio.run_coroutine_threadsafe(result.stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def logger():
+    result = fix_logger(WARNING)
+    yield result
+    result.close()
+
+
+def session(venue, logger, sender_comp_id, target_comp_id, **kwargs):
+    port = venue.ports['fix_md' if target_comp_id == 'EXTP_MDATA' else 'fix_order']
+    result = fix_client('127.0.0.1', port, sender_comp_id, target_comp_id, 'user', 'password',
+                        logger=logger, use_tls=False, **kwargs)
+    result.log_market_data = False
+    return result
+
+
+def wait(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_sessions_of_several_accounts_on_one_thread(venue, logger):
+    manager = fix_session_manager()
+    sessions = []
+    for sender_comp_id in ('ACCOUNT1', 'ACCOUNT2'):
+        for target_comp_id in ('EXTP_MDATA', 'EXTP_ORDER'):
+            sessions.append(session(venue, logger, sender_comp_id, target_comp_id))
+            manager.add(sessions[-1])
+    thread = manager.run_in_thread()
+    try:
+        assert manager.wait_logon() == []
+        market_data_session, order_session = sessions[0], sessions[3]
+        market_data_session.send_market_data_request(['BTC-USD'])
+        wait(lambda: market_data_session.market_data_offer.get('BTC-USD') is not None)
+
+        order_session.place_order_limit_fok_buy('order-1', 'BTC-USD', 0.1,
+                                                market_data_session.get_extp_offer('BTC-USD', 0.1) * 1.01)
+        state = order_session.orders.future('order-1').result(5)
+        assert state.status == extp_fix_orders.FILLED
+
+        stats = manager.stats()
+        assert sorted(stats) == ['ACCOUNT1/EXTP_MDATA', 'ACCOUNT1/EXTP_ORDER',
+                                 'ACCOUNT2/EXTP_MDATA', 'ACCOUNT2/EXTP_ORDER']
+        assert all(stat['logged'] and stat['link_up'] for stat in stats.values())
+        assert stats['ACCOUNT1/EXTP_MDATA']['msgs_received'] > 1
+        assert stats['ACCOUNT2/EXTP_ORDER']['msgs_sent'] == 2
+    finally:
+        manager.stop()
+        thread.join()
+    assert manager.sessions == {}
+
+
+def test_dropped_sessions_are_reconnected_or_removed(venue, logger):
+    manager = fix_session_manager(tick=0.01)
+    reconnected = session(venue, logger, 'ACCOUNT1', 'EXTP_ORDER')
+    removed = session(venue, logger, 'ACCOUNT2', 'EXTP_ORDER', reconnect=False)
+    manager.add(reconnected)
+    manager.add(removed)
+    thread = manager.run_in_thread()
+    try:
+        assert manager.wait_logon() == []
+        connected_at = manager.sessions[reconnected].connected_at
+        venue.loop.call_soon_threadsafe(lambda: [writer.close() for writer in list(venue.writers)])
+        wait(lambda: removed not in manager.sessions)
+        wait(lambda: manager.sessions[reconnected].connected_at > connected_at)
+        assert manager.wait_logon() == []
+    finally:
+        manager.stop()
+        thread.join()
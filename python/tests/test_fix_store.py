@@ -0,0 +1,92 @@
+import asyncio
+
+from extp_fix_async import async_fix_client
+from extp_fix_log import WARNING, fix_logger
+from extp_fix_store import FSYNC_NEVER, fix_store
+from extp_mock_venue import mock_venue, venue_config
+
+
+def test_new_store_starts_at_1(tmp_path):
+    store = fix_store(str(tmp_path / 'session'), FSYNC_NEVER)
+    assert (store.next_out, store.next_in) == (1, 1)
+    assert store.get(1) is None
+    store.close()
+
+
+def test_sequence_numbers_and_messages_survive_a_reopen(tmp_path):
+    path = str(tmp_path / 'session')
+    store = fix_store(path, FSYNC_NEVER)
+    store.append(1, b'first')
+    store.append(2, b'second')
+    store.set_next_out(4)
+    store.set_next_in(7)
+    store.close()
+
+    store = fix_store(path, FSYNC_NEVER)
+    assert (store.next_out, store.next_in) == (4, 7)
+    assert store.get(1) == b'first'
+    assert store.get(2) == b'second'
+    # Not stored, e.g. a session message: the resend is a gap fill
+    assert store.get(3) is None
+    store.close()
+
+
+def test_log_grows_past_initial_size(tmp_path):
+    path = str(tmp_path / 'session')
+    store = fix_store(path, FSYNC_NEVER, initial_size=64)
+    for msg_seq_num in range(1, 101):
+        store.append(msg_seq_num, b'%d' % msg_seq_num * 10)
+    store.close()
+
+    store = fix_store(path, FSYNC_NEVER, initial_size=64)
+    assert store.next_out == 101
+    assert store.get(57) == b'57' * 10
+    store.close()
+
+
+def test_reset_forgets_messages(tmp_path):
+    path = str(tmp_path / 'session')
+    store = fix_store(path, FSYNC_NEVER)
+    store.append(1, b'first')
+    store.set_next_in(5)
+    store.reset()
+    store.close()
+
+    store = fix_store(path, FSYNC_NEVER)
+    assert (store.next_out, store.next_in) == (1, 1)
+    assert store.get(1) is None
+    store.close()
+
+
+def test_session_keeps_orders_but_not_the_logon(tmp_path):
+    path = str(tmp_path / 'session')
+
+    async def main():
+        venue = mock_venue(venue_config(seed=1))
+        await venue.start(rest_port=None, wss_port=None, fix_md_port=None)
+        store = fix_store(path, FSYNC_NEVER)
+        session = async_fix_client('127.0.0.1', venue.ports['fix_order'], 'CLIENT', 'EXTP_ORDER',
+                                   'user', 'secret-password', logger=fix_logger(WARNING), store=store,
+                                   use_tls=False)
+        try:
+            await session.logon()
+            await session.submit_order('order-1', 'BTC-USD', 'buy', 0.1, 1e9)
+            await session.wait_order('order-1', 5)
+        finally:
+            await session.stop()
+            await venue.stop()
+            store.close()
+    asyncio.run(main())
+
+    with open(path + '.messages', 'rb') as f:
+        messages = f.read()
+    assert b'secret-password' not in messages
+    assert b'\x0111=order-1\x01' in messages
+
+    store = fix_store(path, FSYNC_NEVER)
+    # Logon is 1, the order 2
+    assert store.get(1) is None
+    assert b'\x0135=D\x01' in store.get(2)
+    assert store.next_out == 3
+    assert store.next_in > 1
+    store.close()
@@ -0,0 +1,42 @@
+import pytest
+
+from extp_latency_bench import BENCHMARKS, bench_result, compare, venue_process
+from extp_mock_venue import venue_config
+
+
+def run(channel, p99_us, rate=100.0):
+    return {'channel': channel, 'rate': rate, 'p99_us': p99_us}
+
+
+def test_compare_reports_the_p99_regressions():
+    baseline = {'results': [run('fix', 100), run('wss', 200), run('wss', 0, rate=500.0)]}
+    results = [run('fix', 119), run('wss', 300), run('wss', 50, rate=500.0), run('fix', 100, rate=1000.0)]
+    assert compare(results, baseline, 0.2) == [
+        {'channel': 'wss', 'rate': 100.0, 'p99_us': 300, 'baseline_p99_us': 200, 'ratio': 1.5}]
+    assert compare(results, baseline, 0.1) == [
+        {'channel': 'fix', 'rate': 100.0, 'p99_us': 119, 'baseline_p99_us': 100, 'ratio': 1.19},
+        {'channel': 'wss', 'rate': 100.0, 'p99_us': 300, 'baseline_p99_us': 200, 'ratio': 1.5}]
+
+
+def test_summary_in_microseconds():
+    result = bench_result('fix', 100.0)
+    for latency_ns in (10000, 20000, 30000):
+        result.latencies.record(latency_ns)
+    result.ticks = result.orders = 3
+    result.duration = 1.5
+    summary = result.summary()
+    assert (summary['p50_us'], summary['max_us'], summary['orders_per_s']) == pytest.approx((20, 30, 2.0), rel=0.02)
+
+    empty = bench_result('wss', 100.0)
+    empty.duration = 1.0
+    assert empty.summary()['p99_us'] is None
+
+
+@pytest.mark.parametrize('channel', sorted(BENCHMARKS))
+def test_short_run_against_the_venue_process(channel):
+    with venue_process(venue_config(depth=10, quote_rate=200.0, seed=0)) as ports:
+        result = BENCHMARKS[channel](ports, 200.0, 0.5, False)
+    summary = result.summary()
+    assert summary['ticks'] > 10
+    assert summary['orders'] + summary['errors'] >= summary['ticks']
+    assert summary['p99_us'] > 0
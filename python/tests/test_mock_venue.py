@@ -0,0 +1,149 @@
+import asyncio
+import json
+
+import simplefix
+
+from extp_mock_venue import FILLED, KILLED, REJECTED, mock_market, mock_venue, venue_config
+
+
+def test_levels_widen_with_the_quantity():
+    market = mock_market(venue_config(depth=3, level_qtys=(1, 5), seed=1))
+    bid, ask = market.levels('BTC-USD')
+    assert [qty for qty, _ in bid] == [1, 5, 10]
+    assert [price for _, price in bid] == sorted((price for _, price in bid), reverse=True)
+    assert [price for _, price in ask] == sorted(price for _, price in ask)
+    assert bid[0][1] < market.mid('BTC-USD') < ask[0][1]
+    # Unknown instruments start at default_mid
+    assert market.mid('XYZ-USD') == 100.0
+
+
+def test_execute():
+    market = mock_market(venue_config(seed=1))
+    status, price, text = market.execute('BTC-USD', 'buy', 1)
+    assert (status, text) == (FILLED, None) and price > market.mid('BTC-USD')
+    assert market.execute('BTC-USD', 'buy', 1, limit_price=1.0)[0] == KILLED
+    assert market.execute('BTC-USD', 'sell', 1, limit_price=1.0)[0] == FILLED
+    for side, quantity in (('hold', 1), ('buy', 0), ('buy', 'x')):
+        assert market.execute('BTC-USD', side, quantity) == (REJECTED, None, 'Invalid order')
+
+    assert mock_market(venue_config(reject_ratio=1.0)).execute('BTC-USD', 'buy', 1)[0] == REJECTED
+    assert mock_market(venue_config(fill_ratio=0.0)).execute('BTC-USD', 'buy', 1)[0] == KILLED
+
+
+def run(test, **config):
+    async def main():
+        venue = mock_venue(venue_config(seed=1, **config))
+        await venue.start(wss_port=None, fix_md_port=None)
+        try:
+            await test(venue)
+        finally:
+            await venue.stop()
+    asyncio.run(main())
+
+
+async def http(reader, writer, path, body, headers=''):
+    data = json.dumps(body).encode('utf-8')
+    writer.write(b'POST %s HTTP/1.1\r\nContent-Length: %d\r\n%s\r\n' % (path.encode(), len(data), headers.encode())
+                 + data)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b'\r\n':
+            break
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':')[1])
+    return status, json.loads(await reader.readexactly(length))
+
+
+def test_rest_requests_over_one_connection():
+    async def test(venue):
+        reader, writer = await asyncio.open_connection('127.0.0.1', venue.ports['rest'])
+        status, payload = await http(reader, writer, '/api/v1/rfq',
+                                     {'instrument': 'BTC-USD', 'side': 'buy', 'quantity': 1},
+                                     'X-API-Key: token\r\n')
+        assert status == 200
+        assert payload['response']['quote_price'] > 60000 * 0.99
+        status, payload = await http(reader, writer, '/api/v1/order',
+                                     {'instrument': 'BTC-USD', 'side': 'sell', 'quantity': 1,
+                                      'order_type': 'limit', 'limit_price': 1e9}, 'X-API-Key: token\r\n')
+        assert (status, payload['response']['status']) == (200, KILLED)
+        assert (await http(reader, writer, '/api/v1/other', {}, 'X-API-Key: token\r\n'))[0] == 404
+        assert await http(reader, writer, '/api/v1/rfq', {}) == (401, {'error': 'Invalid API key'})
+        assert venue.stats.rest_requests == 4
+        assert venue.stats.orders == 1 and venue.stats.fills == 0
+        writer.close()
+    run(test, api_token='token')
+
+
+class fix_connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.parser = simplefix.FixParser()
+        self.msg_seq_num = 1
+
+    def send(self, msg_type, pairs):
+        msg = simplefix.FixMessage()
+        msg.append_pair(8, 'FIX.4.4', header=True)
+        msg.append_pair(35, msg_type, header=True)
+        msg.append_pair(49, 'CLIENT', header=True)
+        msg.append_pair(56, 'EXTP_ORDER', header=True)
+        msg.append_pair(34, self.msg_seq_num, header=True)
+        self.msg_seq_num += 1
+        for tag, value in pairs:
+            msg.append_pair(tag, value)
+        self.writer.write(msg.encode())
+
+    async def receive(self):
+        while True:
+            msg = self.parser.get_message()
+            if msg is not None:
+                return msg
+            data = await asyncio.wait_for(self.reader.read(65536), 5)
+            assert data
+            self.parser.append_buffer(data)
+
+
+async def fix_logon(venue, reset='Y', password='password'):
+    connection = fix_connection(*await asyncio.open_connection('127.0.0.1', venue.ports['fix_order']))
+    connection.send('A', [(98, 0), (108, 30), (141, reset), (553, 'user'), (554, password)])
+    return connection, await connection.receive()
+
+
+def test_fix_logon_credentials():
+    async def test(venue):
+        connection, logon = await fix_logon(venue)
+        assert (logon.get(35), logon.get(49), logon.get(56), logon.get(108)) == (b'A', b'EXTP_ORDER', b'CLIENT', b'30')
+        connection.writer.close()
+
+        connection, logout = await fix_logon(venue, password='wrong')
+        assert (logout.get(35), logout.get(58)) == (b'5', b'Invalid credentials')
+        connection.writer.close()
+    run(test, username='user', password='password')
+
+
+def test_fix_sequence_resumed_and_gap_filled():
+    async def test(venue):
+        connection, logon = await fix_logon(venue)
+        assert logon.get(34) == b'1'
+        connection.send('D', [(11, 'order-1'), (55, 'BTC-USD'), (54, '1'), (38, '0.1'), (40, '1')])
+        report = await connection.receive()
+        assert (report.get(35), report.get(34), report.get(11), report.get(39)) == (b'8', b'2', b'order-1', b'2')
+        connection.writer.close()
+
+        # Resumed without ResetSeqNumFlag: the venue sequence goes on
+        connection, logon = await fix_logon(venue, reset='N')
+        assert logon.get(34) == b'3'
+        # Nothing is kept: a gap fill from BeginSeqNo up to the next MsgSeqNum
+        connection.send('2', [(7, 2), (16, 0)])
+        gap_fill = await connection.receive()
+        assert (gap_fill.get(35), gap_fill.get(34), gap_fill.get(43), gap_fill.get(123), gap_fill.get(36)) == \
+            (b'4', b'2', b'Y', b'Y', b'4')
+        assert gap_fill.get(122) is not None
+        connection.writer.close()
+
+        connection, logon = await fix_logon(venue)
+        assert logon.get(34) == b'1'
+        connection.writer.close()
+    run(test)
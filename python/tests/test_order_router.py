@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from extp_fix_async import async_fix_client
+from extp_fix_log import WARNING, fix_logger
+from extp_mock_venue import mock_venue, venue_config
+from extp_order_router import channel_down, fix_channel, order_router, rest_channel, routed_order, wss_channel
+from extp_rest_client import rest_client, rest_error
+from extp_wss_client import wss_client
+
+
+class channel:
+    """
+    Channel answering after latency seconds, or raising error.
+    """
+
+    def __init__(self, name, latency=0.0, error=None):
+        self.name = name
+        self.latency = latency
+        self.error = error
+        self.up = True
+        self.sent = []
+
+    def connected(self):
+        return self.up
+
+    async def send(self, client_order_id, instrument, side, quantity, limit_price, timeout):
+        self.sent.append(client_order_id)
+        await asyncio.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return routed_order(self.name, client_order_id, 'filled', limit_price, self.latency, self.latency, None)
+
+
+def route(router, n=1):
+    async def main():
+        return [await router.place_order_limit_fok('BTC-USD', 'buy', 1, 100.0) for _ in range(n)]
+    return asyncio.run(main())
+
+
+def test_orders_go_down_the_fastest_channel():
+    slow, fast = channel('slow', 0.02), channel('fast', 0.001)
+    router = order_router([slow, fast], probe_interval=None, prefix='r')
+    # Each unmeasured channel is tried first, then the fastest is kept
+    orders = route(router, 4)
+    assert [order.channel for order in orders] == ['slow', 'fast', 'fast', 'fast']
+    assert [order.client_order_id for order in orders] == ['r-1', 'r-2', 'r-3', 'r-4']
+    assert [c.name for c in router.ranked()] == ['fast', 'slow']
+    assert router.summary()['fast']['orders'] == 3
+
+
+def test_unused_channel_is_probed():
+    slow, fast = channel('slow', 0.01), channel('fast', 0.001)
+    router = order_router([slow, fast], probe_interval=0.5)
+    route(router, 2)
+    assert route(router)[0].channel == 'fast'
+    # slow not used for the interval
+    router.stats['slow'].last_used -= 1
+    assert route(router)[0].channel == 'slow'
+    assert route(router)[0].channel == 'fast'
+
+
+def test_failover_when_a_channel_cannot_send():
+    down, up = channel('down', error=channel_down('disconnected')), channel('up')
+    router = order_router([down, up], cooldown=10, max_error_rate=0.1)
+    assert route(router)[0].channel == 'up'
+    assert down.sent == up.sent
+    # Down for the cooldown
+    assert [c.name for c in router.ranked()] == ['up']
+    assert router.summary()['down'] == {'connected': True, 'down': True, 'orders': 1, 'errors': 1,
+                                        'error_rate': 0.2, 'ack_ms': None, 'fill_ms': None}
+
+    up.up = False
+    with pytest.raises(channel_down):
+        route(router)
+
+
+def test_order_that_may_have_reached_the_venue_is_not_sent_again():
+    timing_out, other = channel('timing_out', error=asyncio.TimeoutError()), channel('other')
+    router = order_router([timing_out, other])
+    with pytest.raises(asyncio.TimeoutError):
+        route(router)
+    assert other.sent == []
+    assert router.stats['timing_out'].errors == 1
+
+
+class rest:
+    """
+    rest_client raising error on order().
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+    async def order(self, *args):
+        raise self.error
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_rest_unavailable_fails_over(status):
+    other = channel('other')
+    router = order_router([rest_channel(rest(rest_error(status, None))), other])
+    assert route(router)[0].channel == 'other'
+
+
+@pytest.mark.parametrize('status', [400, 502, 504])
+def test_other_rest_errors_are_not_failed_over(status):
+    other = channel('other')
+    router = order_router([rest_channel(rest(rest_error(status, None))), other])
+    with pytest.raises(rest_error):
+        route(router)
+    assert other.sent == []
+
+
+def test_refused_rest_connection_fails_over():
+    other = channel('other')
+    router = order_router([rest_channel(rest(ConnectionRefusedError('refused'))), other])
+    assert route(router)[0].channel == 'other'
+
+
+def test_routing_over_the_mock_venue():
+    async def main():
+        venue = mock_venue(venue_config(seed=1))
+        await venue.start(fix_md_port=None)
+        fix = async_fix_client('127.0.0.1', venue.ports['fix_order'], 'ROUTER', 'EXTP_ORDER',
+                               'user', 'password', logger=fix_logger(WARNING), use_tls=False)
+        wss = wss_client('token', 'ws://127.0.0.1:%d/ws' % venue.ports['wss'], reconnect=False)
+        client = rest_client('token', 'http://127.0.0.1:%d' % venue.ports['rest'])
+        try:
+            await asyncio.gather(fix.logon(), wss.connect(), client.connect())
+            await wss.subscribe_order_updates()
+            router = order_router([fix_channel(fix), wss_channel(wss), rest_channel(client)], probe_interval=None)
+            price = (await client.rfq('BTC-USD', 'buy', 0.1))['response']['quote_price'] * 1.01
+            orders = [await router.place_order_limit_fok('BTC-USD', 'buy', 0.1, price) for _ in range(3)]
+            assert sorted(order.channel for order in orders) == ['fix', 'rest', 'wss']
+            assert all(order.filled and order.executed_price <= price for order in orders)
+            # The FIX order slots are released
+            assert fix.orders.get(orders[0].client_order_id) is None
+
+            killed = await router.place_order_limit_fok('BTC-USD', 'buy', 0.1, 1.0)
+            assert not killed.filled and killed.executed_price is None
+
+            await fix.stop()
+            await wss.close()
+            assert [c.name for c in router.ranked()] == ['rest']
+            assert (await router.place_order_limit_fok('BTC-USD', 'buy', 0.1, price)).channel == 'rest'
+        finally:
+            await asyncio.gather(fix.stop(), wss.close(), client.close())
+            await venue.stop()
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+import asyncio
+import random
+
+import pytest
+import websockets
+
+from extp_mock_venue import mock_venue, venue_config
+from extp_reconnect import jittered_backoff
+from extp_wss_client import wss_client
+from extp_wss_pricebook import ASK, stale_quote_error
+
+
+def test_backoff_ceiling_doubles_up_to_the_maximum():
+    random.seed(1)
+    backoff = jittered_backoff(initial=0.1, maximum=1.0)
+    delays = [backoff.next() for _ in range(100)]
+    for attempt, delay in enumerate(delays[:4]):
+        assert 0 <= delay <= 0.1 * 2 ** attempt
+    assert all(0 <= delay <= 1.0 for delay in delays)
+    # Full jitter: the delays past the maximum are spread over [0, maximum]
+    assert min(delays[10:]) < 0.2 and max(delays[10:]) > 0.8
+
+    backoff.reset()
+    assert backoff.attempts == 0
+    assert backoff.next() <= 0.1
+
+
+class fixed_backoff(jittered_backoff):
+    def next(self):
+        self.attempts += 1
+        return 0.01
+
+
+def test_wss_client_reconnects_and_replays_its_subscriptions():
+    async def main():
+        venue = mock_venue(venue_config(seed=1, quote_rate=50.0))
+        await venue.start(rest_port=None, fix_md_port=None, fix_order_port=None)
+        port = venue.ports['wss']
+        url = 'ws://127.0.0.1:%d/ws' % port
+        disconnected = []
+        gaps = []
+        client = wss_client(None, url=url, backoff=fixed_backoff(), on_disconnect=disconnected.append,
+                            on_reconnect=gaps.append)
+        try:
+            await client.connect()
+            await client.subscribe_market_data(['BTC-USD', 'ETH-USD'])
+            await asyncio.wait_for(client.next_quote('ETH-USD'), 5)
+
+            # Down for a while: the quotes are stale meanwhile
+            await venue.stop()
+            while not disconnected:
+                await asyncio.sleep(0.01)
+            assert sorted(disconnected[0]) == ['BTC-USD', 'ETH-USD']
+            with pytest.raises(stale_quote_error):
+                client.pricebook.price('BTC-USD', ASK, 1)
+            await asyncio.sleep(0.1)
+            assert client.backoff.attempts > 1
+
+            await venue.start(rest_port=None, wss_port=port, fix_md_port=None, fix_order_port=None)
+            await asyncio.wait_for(client.next_quote('BTC-USD'), 5)
+            assert client.pricebook.price('BTC-USD', ASK, 1) > 0
+            assert client.reconnects == 1 and gaps == [client.last_gap]
+            assert client.last_gap >= 0.1
+            assert client.backoff.attempts == 0
+        finally:
+            await client.close()
+            await venue.stop()
+    asyncio.run(main())
+
+
+def test_bad_frames_are_skipped():
+    async def main():
+        async def serve(websocket, path=None):
+            await websocket.send('not json')
+            await websocket.send(b'\xff')
+            await websocket.send('{"type": "client-streamquotes", "symbol": "BTC-USD", "data": {}}')
+            await websocket.wait_closed()
+
+        server = await websockets.serve(serve, '127.0.0.1', 0)
+        client = wss_client(None, url='ws://127.0.0.1:%d/ws' % server.sockets[0].getsockname()[1],
+                            reconnect=False)
+        try:
+            await client.connect()
+            await asyncio.wait_for(client.next_quote('BTC-USD'), 5)
+            assert client.bad_frames == 2
+            assert not client.receiver.done()
+        finally:
+            await client.close()
+            server.close()
+            await server.wait_closed()
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+from extp_mock_venue import mock_venue, venue_config
+from extp_rest_cache import _valid_until, rfq_cache
+from extp_rest_client import rest_client
+
+
+class client:
+    """
+    Answers the RFQs once released, counting them.
+    """
+
+    def __init__(self, valid_for=5.0, error=None):
+        self.requests = []
+        self.released = asyncio.Event()
+        self.released.set()
+        self.valid_for = valid_for
+        self.error = error
+
+    async def rfq(self, instrument, side, quantity):
+        self.requests.append((instrument, side, quantity))
+        await self.released.wait()
+        if self.error is not None:
+            raise self.error
+        response = {'quote_id': len(self.requests), 'quantity': quantity}
+        if self.valid_for is not None:
+            response['valid_until'] = time.time() + self.valid_for
+        return {'response': response}
+
+
+def test_quotes_are_reused_until_they_expire():
+    async def main():
+        cache = rfq_cache(client(), ttl=0.05)
+        first = await cache.rfq('BTC-USD', 'buy', 1)
+        assert await cache.rfq('BTC-USD', 'buy', 1) is first
+        assert await cache.rfq('BTC-USD', 'sell', 1) is not first
+        await asyncio.sleep(0.06)
+        assert await cache.rfq('BTC-USD', 'buy', 1) is not first
+        assert cache.stats() == {'entries': 2, 'hits': 1, 'misses': 3, 'coalesced': 0, 'expired': 1,
+                                 'evictions': 0, 'hit_ratio': 0.25}
+    asyncio.run(main())
+
+
+def test_valid_until_less_the_margin():
+    async def main():
+        # Valid for less than the margin: never cached
+        cache = rfq_cache(client(valid_for=0.05), ttl=10, margin=0.1)
+        await cache.rfq('BTC-USD', 'buy', 1)
+        assert cache.entries == {}
+        cache = rfq_cache(client(valid_for=None), ttl=10, margin=0.1)
+        await cache.rfq('BTC-USD', 'buy', 1)
+        assert len(cache.entries) == 1
+    asyncio.run(main())
+
+
+def test_valid_until_formats():
+    assert _valid_until({'response': {'valid_until': 12.5}}) == 12.5
+    assert _valid_until({'response': {'valid_until': '12.5'}}) == 12.5
+    assert _valid_until({'response': {'valid_until': '1970-01-01T00:01:00Z'}}) == 60
+    assert _valid_until({'response': {'valid_until': '1970-01-01T00:01:00'}}) == 60
+    assert _valid_until({'response': {'valid_until': 'soon'}}) is None
+    assert _valid_until({'response': {}}) is None
+    assert _valid_until(None) is None
+
+
+def test_quantities_share_their_bucket():
+    async def main():
+        rest = client()
+        cache = rfq_cache(rest, buckets=[5, 1, 10])
+        assert [cache.bucket(quantity) for quantity in (0.5, 1, 2, 10, 20)] == [1, 1, 5, 10, 20]
+        await cache.rfq('BTC-USD', 'buy', 2)
+        await cache.rfq('BTC-USD', 'buy', 4.5)
+        await cache.rfq('BTC-USD', 'buy', 20)
+        assert rest.requests == [('BTC-USD', 'buy', 5), ('BTC-USD', 'buy', 20)]
+    asyncio.run(main())
+
+
+def test_concurrent_rfqs_share_one_request():
+    async def main():
+        rest = client()
+        rest.released.clear()
+        cache = rfq_cache(rest)
+        waiters = [asyncio.ensure_future(cache.rfq('BTC-USD', 'buy', 1)) for _ in range(5)]
+        await asyncio.sleep(0)
+        # A waiter giving up does not cancel the request of the others
+        waiters[0].cancel()
+        rest.released.set()
+        responses = await asyncio.gather(*waiters[1:])
+        assert len(rest.requests) == 1
+        assert all(response is responses[0] for response in responses)
+        assert (cache.misses, cache.coalesced) == (1, 4)
+        assert cache.inflight == {}
+    asyncio.run(main())
+
+
+def test_failed_request_is_not_cached():
+    async def main():
+        rest = client(error=ConnectionError('down'))
+        cache = rfq_cache(rest)
+        results = await asyncio.gather(cache.rfq('BTC-USD', 'buy', 1), cache.rfq('BTC-USD', 'buy', 1),
+                                       return_exceptions=True)
+        assert all(isinstance(result, ConnectionError) for result in results)
+        assert len(rest.requests) == 1
+        rest.error = None
+        assert (await cache.rfq('BTC-USD', 'buy', 1))['response']['quote_id'] == 2
+    asyncio.run(main())
+
+
+def test_least_recently_used_evicted_and_invalidate():
+    async def main():
+        cache = rfq_cache(client(), max_entries=2)
+        await cache.rfq('BTC-USD', 'buy', 1)
+        await cache.rfq('ETH-USD', 'buy', 1)
+        await cache.rfq('BTC-USD', 'buy', 1)
+        await cache.rfq('LTC-USD', 'buy', 1)
+        assert list(cache.entries) == [('BTC-USD', 'buy', 1), ('LTC-USD', 'buy', 1)]
+        assert cache.evictions == 1
+
+        await cache.rfq('BTC-USD', 'sell', 1)
+        cache.invalidate('BTC-USD', 'buy')
+        assert list(cache.entries) == [('LTC-USD', 'buy', 1), ('BTC-USD', 'sell', 1)]
+        cache.invalidate()
+        assert cache.entries == {}
+    asyncio.run(main())
+
+
+def test_cached_grid_against_the_mock_venue():
+    async def main():
+        venue = mock_venue(venue_config(seed=1))
+        await venue.start(wss_port=None, fix_md_port=None, fix_order_port=None)
+        rest = rest_client('token', 'http://127.0.0.1:%d' % venue.ports['rest'])
+        cache = rfq_cache(rest, ttl=10)
+        try:
+            first = await rest.rfq_grid(['BTC-USD', 'ETH-USD'], [0.1, 1], cache=cache)
+            second = await rest.rfq_grid(['BTC-USD', 'ETH-USD'], [0.1, 1], cache=cache)
+            assert venue.stats.rest_requests == 8
+            assert second.responses == first.responses
+            assert cache.hits == 8
+        finally:
+            await rest.close()
+            await venue.stop()
+    asyncio.run(main())
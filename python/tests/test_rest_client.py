@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from extp_mock_venue import mock_venue, venue_config
+from extp_rest_client import rest_client, rest_error
+
+
+def run(test, nb_connections=2, api_token='token'):
+    async def main():
+        venue = mock_venue(venue_config(seed=1, api_token='token'))
+        await venue.start(wss_port=None, fix_md_port=None, fix_order_port=None)
+        client = rest_client(api_token, 'http://127.0.0.1:%d' % venue.ports['rest'], nb_connections)
+        try:
+            await test(venue, client)
+        finally:
+            await client.close()
+            await venue.stop()
+    asyncio.run(main())
+
+
+def test_rfq_and_order_over_the_pool():
+    async def test(venue, client):
+        await client.connect()
+        assert len(venue.writers) == 2
+        quote = await client.rfq('BTC-USD', 'buy', 1)
+        assert quote['response']['quote_price'] > 0
+        order = await client.order('BTC-USD', 'buy', 1, 'limit', quote['response']['quote_price'] * 1.01, 'FOK')
+        assert order['response']['status'] == 'filled'
+        # Kept alive, no new connection
+        assert len(venue.writers) == 2
+        assert (client.requests, client.reconnects) == (2, 0)
+        assert client.last_latency > 0
+    run(test)
+
+
+def test_concurrent_first_requests_share_the_connections():
+    async def test(venue, client):
+        responses = await asyncio.gather(*(client.rfq('BTC-USD', 'sell', 1) for _ in range(8)))
+        assert len({response['response']['quote_id'] for response in responses}) == 8
+        assert len(venue.writers) == 2
+        assert sorted(client.idle, key=id) == sorted(client.connections, key=id)
+    run(test)
+
+
+def test_error_statuses():
+    async def test(venue, client):
+        with pytest.raises(rest_error) as error:
+            await client.rfq('BTC-USD', 'buy', 1)
+        assert (error.value.status, error.value.payload) == (401, {'error': 'Invalid API key'})
+    run(test, api_token='wrong')
+
+    async def test(venue, client):
+        with pytest.raises(rest_error) as error:
+            await client.request('/api/v1/other', {})
+        assert error.value.status == 404
+        # The connection is still usable
+        assert (await client.rfq('BTC-USD', 'buy', 1))['response']['quantity'] == 1
+    run(test)
+
+
+def test_connection_closed_by_the_server_is_reopened():
+    async def test(venue, client):
+        await client.rfq('BTC-USD', 'buy', 1)
+        for writer in list(venue.writers):
+            writer.close()
+        await asyncio.sleep(0.05)
+        assert (await client.rfq('BTC-USD', 'buy', 1))['response']['quote_price'] > 0
+        assert client.reconnects == 1
+    run(test, nb_connections=1)
+
+
+class dropping_server:
+    """
+    Answers the first request of each connection, then closes the
+    connection on the next without answering: a keep-alive connection closed
+    by the server while the request was on its way.
+    """
+
+    async def start(self):
+        self.requests = 0
+        self.server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        self.url = 'http://127.0.0.1:%d' % self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        answered = False
+        while True:
+            length = 0
+            while True:
+                line = await reader.readline()
+                if not line:
+                    writer.close()
+                    return
+                if line == b'\r\n':
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            self.requests += 1
+            if answered:
+                writer.close()
+                return
+            answered = True
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}')
+            await writer.drain()
+
+
+def test_only_idempotent_requests_are_retried():
+    async def main():
+        server = dropping_server()
+        await server.start()
+        client = rest_client('token', server.url, nb_connections=1)
+        try:
+            assert await client.rfq('BTC-USD', 'buy', 1) == {}
+            assert await client.rfq('BTC-USD', 'buy', 1) == {}
+            assert server.requests == 3
+
+            # The retry answered on a new connection, whose next request
+            # is dropped
+            with pytest.raises(ConnectionError):
+                await client.order('BTC-USD', 'buy', 1)
+            # Not sent again
+            assert server.requests == 4
+            assert await client.order('BTC-USD', 'buy', 1) == {}
+        finally:
+            await client.close()
+            await server.stop()
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+import asyncio
+
+from extp_mock_venue import mock_venue, venue_config
+from extp_rest_client import rest_client, rest_error, rfq_table
+
+
+def test_table_prices_and_rendering():
+    table = rfq_table(['BTC-USD'], [1, 0.5], ['buy', 'sell'])
+    table.responses[('BTC-USD', 1, 'buy')] = {'response': {'quote_price': 60010.5}}
+    table.responses[('BTC-USD', 1, 'sell')] = {'response': None}
+    table.errors[('BTC-USD', 0.5, 'buy')] = asyncio.TimeoutError()
+    table.elapsed = 0.0125
+    assert table.price('BTC-USD', 'buy', 1) == 60010.5
+    assert table.price('BTC-USD', 'sell', 1) is None
+    assert table.price('BTC-USD', 'buy', 0.5) is None
+    assert list(table.rows()) == [('BTC-USD', 1, 60010.5, None), ('BTC-USD', 0.5, None, None)]
+    assert str(table).splitlines() == [
+        'instrument     quantity            buy           sell',
+        'BTC-USD               1       60010.50              -',
+        'BTC-USD             0.5              -              -',
+        '2 quotes, 1 errors in 12.500ms']
+
+
+def test_grid_against_the_mock_venue():
+    async def main():
+        venue = mock_venue(venue_config(seed=1))
+        await venue.start(wss_port=None, fix_md_port=None, fix_order_port=None)
+        client = rest_client('token', 'http://127.0.0.1:%d' % venue.ports['rest'], nb_connections=2)
+        try:
+            table = await client.rfq_grid(['BTC-USD', 'ETH-USD'], [0.1, 1, 'x'])
+            assert len(table.responses) == 8
+            # The venue rejects the invalid quantity with a 400
+            assert sorted(table.errors) == [('BTC-USD', 'x', 'buy'), ('BTC-USD', 'x', 'sell'),
+                                            ('ETH-USD', 'x', 'buy'), ('ETH-USD', 'x', 'sell')]
+            assert all(isinstance(error, rest_error) and error.status == 400 for error in table.errors.values())
+            for instrument in ('BTC-USD', 'ETH-USD'):
+                for quantity in (0.1, 1):
+                    assert table.price(instrument, 'sell', quantity) < table.price(instrument, 'buy', quantity)
+            assert table.price('BTC-USD', 'buy', 1) > table.price('BTC-USD', 'buy', 0.1)
+            # Never more requests in flight than connections
+            assert len(venue.writers) == 2
+        finally:
+            await client.close()
+            await venue.stop()
+    asyncio.run(main())
+
+
+def test_grid_deadline_per_rfq():
+    async def main():
+        venue = mock_venue(venue_config(seed=1, latency=0.2))
+        await venue.start(wss_port=None, fix_md_port=None, fix_order_port=None)
+        client = rest_client('token', 'http://127.0.0.1:%d' % venue.ports['rest'], nb_connections=4)
+        try:
+            table = await client.rfq_grid(['BTC-USD'], [1], deadline=0.05)
+            assert table.responses == {}
+            assert all(isinstance(error, asyncio.TimeoutError) for error in table.errors.values())
+            assert len(table.errors) == 2
+            assert table.elapsed < 0.2
+            # The timed out requests left the pool usable
+            table = await client.rfq_grid(['BTC-USD'], [1], deadline=1)
+            assert len(table.responses) == 2
+        finally:
+            await client.close()
+            await venue.stop()
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+from extp_mock_venue import mock_venue, venue_config
+from extp_rest_client import rest_client
+from extp_rest_scheduler import HEDGE, ORDER, RFQ, request_scheduler, token_bucket
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = token_bucket(rate=100.0, burst=2)
+    assert bucket.take() and bucket.take()
+    assert not bucket.take()
+    assert 0 < bucket.delay() <= 0.01
+    time.sleep(0.011)
+    assert bucket.take()
+    # Never more than burst saved
+    time.sleep(0.05)
+    assert [bucket.take() for _ in range(3)] == [True, True, False]
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    async def main():
+        scheduler = request_scheduler(order_rate=100.0, order_burst=1)
+        await scheduler.acquire('order', ORDER)
+        served = []
+
+        async def request(name, priority):
+            await scheduler.acquire('order', priority)
+            served.append(name)
+
+        tasks = [asyncio.ensure_future(request(name, priority)) for name, priority in
+                 (('order-1', ORDER), ('rfq', RFQ), ('order-2', ORDER), ('hedge', HEDGE))]
+        await asyncio.sleep(0)
+        assert scheduler.depth() == 4 and scheduler.depth(ORDER) == 2
+        await asyncio.gather(*tasks)
+        assert served == ['hedge', 'order-1', 'order-2', 'rfq']
+        assert scheduler.depth() == 0
+
+        stats = scheduler.stats()
+        assert stats['order']['count'] == 3 and stats['order']['mean'] > 0
+        assert stats['hedge']['max'] < stats['rfq']['max']
+    asyncio.run(main())
+
+
+def test_budgets_are_separate():
+    async def main():
+        scheduler = request_scheduler(order_rate=1.0, order_burst=1, rfq_rate=1.0, rfq_burst=1)
+        await scheduler.acquire('rfq', RFQ)
+        # The RFQ budget is exhausted, not the order one
+        await asyncio.wait_for(scheduler.acquire('order', ORDER), 0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.acquire('rfq', RFQ), 0.05)
+    asyncio.run(main())
+
+
+def test_cancelled_waiters_do_not_hold_the_others_back():
+    async def main():
+        scheduler = request_scheduler(order_rate=20.0, order_burst=1)
+        await scheduler.acquire('order', ORDER)
+        given_up = asyncio.ensure_future(scheduler.acquire('order', HEDGE))
+        await asyncio.sleep(0)
+        given_up.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.depth() == 0
+        # Refilled meanwhile: taken at once, the queue only holding the
+        # cancelled waiter
+        await asyncio.sleep(0.06)
+        start = time.monotonic()
+        await scheduler.acquire('order', ORDER)
+        assert time.monotonic() - start < 0.01
+        assert scheduler.budgets['order'].waiters == []
+    asyncio.run(main())
+
+
+def test_client_requests_are_rate_limited():
+    async def main():
+        venue = mock_venue(venue_config(seed=1))
+        await venue.start(wss_port=None, fix_md_port=None, fix_order_port=None)
+        scheduler = request_scheduler(rfq_rate=50.0, rfq_burst=5)
+        client = rest_client('token', 'http://127.0.0.1:%d' % venue.ports['rest'], scheduler=scheduler)
+        try:
+            start = time.monotonic()
+            await asyncio.gather(*(client.rfq('BTC-USD', 'buy', 1) for _ in range(10)))
+            # 5 at once, then 5 at 50 per second
+            assert time.monotonic() - start >= 0.09
+            assert scheduler.stats()['rfq']['count'] == 10
+            assert scheduler.stats()['order']['count'] == 0
+        finally:
+            await client.close()
+            await venue.stop()
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+import array
+import asyncio
+import time
+
+import numpy
+import pytest
+
+from extp_fix_client import fix_client
+from extp_fix_log import WARNING, fix_logger
+from extp_tick_recorder import fix_client_handler, pricebook_handler, read_ticks, replay, replay_async, \
+    tick_recorder, tick_segment
+from extp_wss_pricebook import ASK, BID, pricebook
+
+
+def record(directory, **kwargs):
+    recorder = tick_recorder(str(directory), **kwargs)
+    recorder.record('BTC-USD', [100.0, 99.0], [1, 2], [101.0], [1], timestamp=1000000000)
+    recorder.record('ETH-USD', array.array('d', [10.0]), array.array('d', [5]),
+                    numpy.array([11.0]), numpy.array([5.0]), timestamp=2000000000)
+    recorder.record('BTC-USD', (98.0,), (1,), (), (), timestamp=3000000000)
+    recorder.close()
+
+
+def levels(t):
+    return (t.bid_prices.tolist(), t.bid_qtys.tolist(), t.ask_prices.tolist(), t.ask_qtys.tolist())
+
+
+def test_ticks_are_read_back_in_order(tmp_path):
+    record(tmp_path)
+    ticks = list(read_ticks(str(tmp_path)))
+    assert [(t.symbol, t.timestamp) for t in ticks] == [
+        ('BTC-USD', 1000000000), ('ETH-USD', 2000000000), ('BTC-USD', 3000000000)]
+    assert levels(ticks[0]) == ([100.0, 99.0], [1, 2], [101.0], [1])
+    assert levels(ticks[1]) == ([10.0], [5], [11.0], [5])
+    assert levels(ticks[2]) == ([98.0], [1], [], [])
+    assert ticks[1].received == 2.0
+
+
+def test_segments_roll_over_and_recordings_append(tmp_path):
+    record(tmp_path, update_capacity=2, level_capacity=16)
+    assert sorted(path.name for path in tmp_path.glob('*.ticks')) == ['ticks-000000.ticks', 'ticks-000001.ticks']
+    # A new recorder starts after the existing segments
+    record(tmp_path, update_capacity=2, level_capacity=16)
+    assert len(list(tmp_path.glob('*.ticks'))) == 4
+    assert [t.symbol for t in read_ticks(str(tmp_path))] == ['BTC-USD', 'ETH-USD', 'BTC-USD'] * 2
+    assert (tmp_path / 'ticks.symbols').read_text() == 'BTC-USD\nETH-USD\n'
+
+
+def test_update_larger_than_a_segment(tmp_path):
+    recorder = tick_recorder(str(tmp_path), level_capacity=2)
+    with pytest.raises(ValueError):
+        recorder.record('BTC-USD', [1.0, 2.0], [1, 2], [3.0], [1])
+    recorder.close()
+
+
+def test_not_a_segment(tmp_path):
+    path = tmp_path / 'other.ticks'
+    path.write_bytes(bytes(128))
+    with pytest.raises(ValueError):
+        tick_segment(str(path))
+
+
+def test_replay_at_the_recorded_pace(tmp_path):
+    record(tmp_path)
+    handled = []
+    start = time.monotonic()
+    assert replay(read_ticks(str(tmp_path)), handled.append, speed=100) == 3
+    # 2s recorded, 100 times faster
+    assert time.monotonic() - start >= 0.02
+    assert len(handled) == 3
+
+
+def test_replay_into_a_pricebook_and_a_fix_client(tmp_path):
+    record(tmp_path)
+    book = pricebook()
+    replay(read_ticks(str(tmp_path)), pricebook_handler(book), speed=None)
+    assert book.price('BTC-USD', BID, 1) == 98.0
+    assert book.price('ETH-USD', ASK, 5) == 11.0
+
+    logger = fix_logger(WARNING)
+    client = fix_client('127.0.0.1', 0, 'CLIENT', 'EXTP', 'user', 'password', logger=logger, use_tls=False)
+    replay(read_ticks(str(tmp_path)), fix_client_handler(client), speed=None)
+    logger.close()
+    assert client.get_extp_bid('ETH-USD', 5) == 10.0
+    assert client.get_extp_offer('ETH-USD', 5) == 11.0
+
+
+def test_replay_async_awaits_coroutine_handlers(tmp_path):
+    record(tmp_path)
+    handled = []
+
+    async def handler(t):
+        await asyncio.sleep(0)
+        handled.append(t.symbol)
+
+    assert asyncio.run(replay_async(read_ticks(str(tmp_path)), handler, speed=None)) == 3
+    assert handled == ['BTC-USD', 'ETH-USD', 'BTC-USD']
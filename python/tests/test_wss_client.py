@@ -0,0 +1,176 @@
+import asyncio
+import json
+
+import pytest
+import websockets
+
+from extp_wss_client import BLOCK, CONFLATE, DROP_NEWEST, DROP_OLDEST, WS_ACTION, WS_SUB_TYPE, channel, \
+    conflated_channel, wss_client
+from extp_wss_codec import ORDER_UPDATES, STREAM_QUOTES, stream_quote
+
+
+class server:
+    """
+    Websocket server recording the frames received, whose connections can
+    be sent frames.
+    """
+
+    def __init__(self):
+        self.received = asyncio.Queue()
+        self.connections = []
+
+    async def start(self):
+        self.server = await websockets.serve(self._serve, '127.0.0.1', 0)
+        self.url = 'ws://127.0.0.1:%d/ws' % self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def send(self, frame):
+        await self.connections[-1].send(frame if isinstance(frame, str) else json.dumps(frame))
+
+    async def next_frame(self):
+        return await asyncio.wait_for(self.received.get(), 5)
+
+    async def _serve(self, websocket, path=None):
+        self.connections.append(websocket)
+        try:
+            async for frame in websocket:
+                await self.received.put(json.loads(frame))
+        except websockets.ConnectionClosed:
+            pass
+
+
+def quote(symbol, bid=99.0, ask=101.0):
+    return {'type': STREAM_QUOTES, 'symbol': symbol,
+            'data': {'bid': [{'price': bid, 'qty': 1}], 'ask': [{'price': ask, 'qty': 1}]}}
+
+
+def run(test):
+    async def main():
+        venue = server()
+        await venue.start()
+        client = wss_client('token', url=venue.url, reconnect=False)
+        try:
+            await client.connect()
+            assert await venue.next_frame() == {'type': WS_ACTION.AUTH, 'auth_token': 'token'}
+            await test(venue, client)
+        finally:
+            await client.close()
+            await venue.stop()
+    asyncio.run(main())
+
+
+def test_subscriptions_of_one_iteration_are_sent_in_one_frame():
+    async def test(venue, client):
+        client.subscribe_market_data(['BTC-USD'])
+        client.subscribe_market_data(['ETH-USD'], provider='P1')
+        await client.subscribe_order_updates()
+        assert await venue.next_frame() == {'type': WS_ACTION.SUBSCRIBE, 'subscriptions': [
+            {'type': WS_SUB_TYPE.MARKET_DATA, 'instrument': 'BTC-USD'},
+            {'type': WS_SUB_TYPE.MARKET_DATA, 'instrument': 'ETH-USD', 'provider': 'P1'},
+            {'type': WS_SUB_TYPE.ORDER_UPDATES}]}
+
+        await client.unsubscribe_market_data(['ETH-USD', 'LTC-USD'])
+        assert await venue.next_frame() == {'type': WS_ACTION.UNSUBSCRIBE, 'subscriptions': [
+            {'type': WS_SUB_TYPE.MARKET_DATA, 'instrument': 'ETH-USD', 'provider': 'P1'}]}
+        assert sorted(client.subscriptions, key=str) == [
+            (WS_SUB_TYPE.MARKET_DATA, 'BTC-USD'), (WS_SUB_TYPE.ORDER_UPDATES, None)]
+    run(test)
+
+
+def test_messages_are_routed_to_their_channel():
+    async def test(venue, client):
+        quotes = client.channel(STREAM_QUOTES)
+        updates = client.channel(ORDER_UPDATES)
+        await venue.send(quote('BTC-USD'))
+        await venue.send({'type': ORDER_UPDATES, 'data': {'status': 2}})
+        await venue.send({'type': 'unknown'})
+        await venue.send('not json')
+        assert (await asyncio.wait_for(quotes.get(), 5)).symbol == 'BTC-USD'
+        assert (await asyncio.wait_for(updates.get(), 5))['data'] == {'status': 2}
+        assert client.pricebook.price('BTC-USD', 'ask', 1) == 101.0
+        assert client.quote_counts['BTC-USD'] == 1
+        # The channels end when the client is closed
+        await client.close()
+        assert [message async for message in quotes] == []
+        assert client.bad_frames == 1
+    run(test)
+
+
+def test_quotes_update_the_pricebook_without_channel():
+    async def test(venue, client):
+        waiter = client.next_quote('ETH-USD')
+        assert client.next_quote('ETH-USD') is waiter
+        await venue.send(quote('BTC-USD', ask=101.0))
+        await venue.send(quote('ETH-USD', ask=11.0))
+        assert (await asyncio.wait_for(waiter, 5)).symbol == 'ETH-USD'
+        assert client.pricebook.price('BTC-USD', 'ask', 1) == 101.0
+        assert client.channels == {}
+    run(test)
+
+
+def test_channel_policies_once_full():
+    async def main():
+        oldest = channel(2, DROP_OLDEST)
+        newest = channel(2, DROP_NEWEST)
+        for message in (1, 2, 3):
+            await oldest.put(message)
+            await newest.put(message)
+        assert [oldest.queue.get_nowait() for _ in range(2)] == [2, 3]
+        assert [newest.queue.get_nowait() for _ in range(2)] == [1, 2]
+        assert oldest.dropped == newest.dropped == 1
+
+        blocking = channel(1, BLOCK)
+        await blocking.put(1)
+        put = asyncio.ensure_future(blocking.put(2))
+        await asyncio.sleep(0)
+        assert not put.done()
+        assert await blocking.get() == 1
+        await put
+        assert await blocking.get() == 2
+        assert blocking.dropped == 0
+    asyncio.run(main())
+
+
+def test_conflated_channel_keeps_the_latest_quote_of_each_symbol():
+    async def main():
+        quotes = conflated_channel()
+        first, latest = stream_quote('BTC-USD'), stream_quote('BTC-USD')
+        for quote in (first, stream_quote('ETH-USD'), latest):
+            await quotes.put(quote)
+        updated = await quotes.get()
+        assert sorted(updated) == ['BTC-USD', 'ETH-USD']
+        assert updated['BTC-USD'] is latest
+        assert quotes.conflated == 1
+
+        # Woken by the next update only, with its symbol only
+        get = asyncio.ensure_future(quotes.get())
+        await asyncio.sleep(0)
+        assert not get.done()
+        await quotes.put(stream_quote('ETH-USD'))
+        assert list(await get) == ['ETH-USD']
+        assert quotes.conflated == 1
+
+        await quotes.put(stream_quote('BTC-USD'))
+        quotes.close()
+        assert [list(updated) async for updated in quotes] == [['BTC-USD']]
+    asyncio.run(main())
+
+
+def test_slow_consumer_of_a_conflated_channel():
+    async def test(venue, client):
+        quotes = client.channel(STREAM_QUOTES, policy=CONFLATE)
+        assert client.channel(STREAM_QUOTES) is quotes
+        for ask in (101.0, 102.0, 103.0):
+            await venue.send(quote('BTC-USD', ask=ask))
+        await asyncio.wait_for(client.next_quote('BTC-USD'), 5)
+        while client.quote_counts['BTC-USD'] < 3:
+            await asyncio.sleep(0.01)
+        updated = await quotes.get()
+        assert updated['BTC-USD'].ask_prices.tolist() == [103.0]
+        assert quotes.conflated == 2
+        with pytest.raises(ValueError):
+            client.channel(ORDER_UPDATES, policy=CONFLATE)
+    run(test)
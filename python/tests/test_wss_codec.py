@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from extp_wss_codec import ORDER_DISPATCH_ACK, ORDER_UPDATES, STREAM_QUOTES, decode_frame
+
+
+def quote_frame(symbol='BTC-USD', **fields):
+    frame = {'type': STREAM_QUOTES, 'symbol': symbol,
+             'data': {'bid': [{'price': 99.0, 'qty': 1}, {'price': 98.0, 'qty': 5}],
+                      'ask': [{'price': 101.0, 'qty': 1}, {'price': 102.0, 'qty': 5}]}}
+    frame.update(fields)
+    return json.dumps(frame)
+
+
+def test_quote_levels_are_decoded_on_first_access():
+    msg_type, quote = decode_frame(quote_frame())
+    assert msg_type == STREAM_QUOTES
+    assert quote.symbol == 'BTC-USD'
+    assert quote._bid_prices is None
+    assert quote.bid_prices.tolist() == [99.0, 98.0]
+    assert quote.bid_qtys.tolist() == [1, 5]
+    assert quote.ask_prices.tolist() == [101.0, 102.0]
+    assert quote.ask_qtys.tolist() == [1, 5]
+
+
+def test_quote_from_bytes():
+    msg_type, quote = decode_frame(quote_frame('ETH-USD').encode('utf-8'))
+    assert (msg_type, quote.symbol) == (STREAM_QUOTES, 'ETH-USD')
+
+
+def test_quote_decoded_as_json_when_the_symbol_is_not_found():
+    # An escaped key is missed by the regular expression
+    frame = '{"type": "client-streamquotes", "\\u0073ymbol": "LTC-USD", "data": {"bid": [{"price": 1.0, "qty": 2}]}}'
+    msg_type, quote = decode_frame(frame)
+    assert quote._bid_prices is not None
+    assert quote.symbol == 'LTC-USD'
+    assert quote.bid_prices.tolist() == [1.0]
+    assert quote.ask_prices.tolist() == []
+
+
+def test_type_is_the_first_type_field():
+    # The type of the levels, if any, comes after the one of the frame
+    frame = '{"type": "order-updates", "data": {"type": "client-streamquotes", "status": 2}}'
+    msg_type, payload = decode_frame(frame)
+    assert msg_type == ORDER_UPDATES
+    assert payload['data']['status'] == 2
+
+
+def test_order_ack():
+    msg_type, ack = decode_frame('{"type": "order-dispatch-ack", "status": -1, "client_order_id": "order-1"}')
+    assert msg_type == ORDER_DISPATCH_ACK
+    assert (ack.status, ack.client_order_id) == (-1, 'order-1')
+    msg_type, ack = decode_frame('{"type": "order-dispatch-ack", "status": 0}')
+    assert (ack.status, ack.client_order_id) == (0, None)
+
+
+def test_other_frames_are_decoded_as_json():
+    assert decode_frame('{"type": "auth", "ok": true}') == ('auth', {'type': 'auth', 'ok': True})
+    assert decode_frame('{"ok": true}') == (None, {'ok': True})
+
+
+def test_bad_frames_raise():
+    with pytest.raises(ValueError):
+        decode_frame('not json')
+    with pytest.raises(UnicodeDecodeError):
+        decode_frame(b'\xff')
+    # Levels of a malformed quote only fail when read
+    msg_type, quote = decode_frame('{"type": "client-streamquotes", "symbol": "BTC-USD", "data": ')
+    with pytest.raises(ValueError):
+        quote.bid_prices
@@ -0,0 +1,118 @@
+import asyncio
+import collections
+import time
+
+import pytest
+
+from extp_mock_venue import mock_venue, venue_config
+from extp_wss_client import WS_ORDER_SIDE, WS_ORDER_TYPE, WS_TIF_TYPE, wss_client
+from extp_wss_codec import order_ack
+from extp_wss_orders import order_ticket, order_tracker
+
+
+def ticket(tracker, client_order_id=None, sent_at=None):
+    result = order_ticket(client_order_id or tracker.next_id(), {})
+    result.sent_at = time.monotonic() if sent_at is None else sent_at
+    tracker.add(result)
+    return result
+
+
+def test_acks_are_matched_by_id_or_in_sequence():
+    async def main():
+        tracker = order_tracker(prefix='test')
+        first, second, third = ticket(tracker), ticket(tracker), ticket(tracker)
+        assert first.client_order_id == 'test-1'
+        assert tracker.on_ack(order_ack(0, 'test-2', '')) is second
+        # Without id, the oldest not acked yet
+        assert tracker.on_ack(order_ack(0, None, '')) is first
+        assert tracker.on_ack(order_ack(0, None, '')) is third
+        assert tracker.on_ack(order_ack(0, None, '')) is None
+        assert first.ack_latency >= 0 and first.fill_latency is None
+        # Without order updates, nothing more is expected
+        assert tracker.tickets == {}
+    asyncio.run(main())
+
+
+def test_rejected_on_dispatch():
+    async def main():
+        tracker = order_tracker()
+        tracker.track_updates = True
+        rejected = ticket(tracker)
+        ack = order_ack(-1, rejected.client_order_id, '')
+        tracker.on_ack(ack)
+        assert await rejected is ack
+        assert rejected.fill_latency == rejected.ack_latency
+        assert tracker.tickets == {}
+    asyncio.run(main())
+
+
+def test_terminal_update_resolves_the_result():
+    async def main():
+        tracker = order_tracker()
+        tracker.track_updates = True
+        order = ticket(tracker)
+        tracker.on_ack(order_ack(0, order.client_order_id, ''))
+        assert tracker.on_update({'data': {'client_order_id': order.client_order_id, 'status': 'open'}}) == [order]
+        assert not order.result.done()
+        # Orders in a list, unknown ones skipped
+        tracker.on_update({'data': [{'client_order_id': 'other', 'status': 'filled'},
+                                    {'client_order_id': order.client_order_id, 'status': 'Filled'}]})
+        assert (await order)['status'] == 'Filled'
+        assert len(order.updates) == 2
+        assert tracker.tickets == {}
+    asyncio.run(main())
+
+
+def test_update_before_the_ack():
+    async def main():
+        tracker = order_tracker()
+        tracker.track_updates = True
+        order = ticket(tracker)
+        tracker.on_update({'client_order_id': order.client_order_id, 'status': 'killed'})
+        assert tracker.on_ack(order_ack(0, order.client_order_id, '')) is order
+        assert (await order.ack).status == 0
+        assert tracker.unacked == collections.deque()
+    asyncio.run(main())
+
+
+def test_expire_and_fail():
+    async def main():
+        tracker = order_tracker(max_age=10)
+        tracker.track_updates = True
+        old = ticket(tracker, sent_at=time.monotonic() - 20)
+        acked = ticket(tracker, sent_at=time.monotonic() - 20)
+        tracker.on_ack(order_ack(0, acked.client_order_id, ''))
+        recent = ticket(tracker)
+        # Expired when the next order is added
+        for expired in (old, acked):
+            with pytest.raises(asyncio.TimeoutError):
+                await expired
+        assert (await acked.ack).status == 0
+        assert list(tracker.tickets) == [recent.client_order_id]
+
+        tracker.fail(ConnectionError('websocket closed'))
+        with pytest.raises(ConnectionError):
+            await recent.ack
+        assert tracker.tickets == {}
+    asyncio.run(main())
+
+
+def test_orders_against_the_mock_venue():
+    async def main():
+        venue = mock_venue(venue_config(seed=1))
+        await venue.start(rest_port=None, fix_md_port=None, fix_order_port=None)
+        client = wss_client(None, url='ws://127.0.0.1:%d/ws' % venue.ports['wss'], reconnect=False)
+        try:
+            await client.connect()
+            await client.subscribe_order_updates()
+            filled, killed = await asyncio.gather(
+                client.place_order(WS_ORDER_TYPE.MARKET, 'BTC-USD', WS_ORDER_SIDE.BUY, 0.1),
+                client.place_order(WS_ORDER_TYPE.LIMIT, 'BTC-USD', WS_ORDER_SIDE.BUY, 0.1, WS_TIF_TYPE.FOK, 1.0))
+            assert (await asyncio.wait_for(filled.ack, 5)).client_order_id == filled.client_order_id
+            assert (await asyncio.wait_for(filled.result, 5))['status'] == 'filled'
+            assert (await asyncio.wait_for(killed.result, 5))['status'] == 'killed'
+            assert filled.fill_latency >= filled.ack_latency
+        finally:
+            await client.close()
+            await venue.stop()
+    asyncio.run(main())
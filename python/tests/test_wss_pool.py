@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from extp_mock_venue import mock_venue, venue_config
+from extp_wss_pool import wss_pool
+from extp_wss_pricebook import ASK, stale_quote_error
+
+
+def run(test, processes=False, quote_rate=20.0):
+    async def main():
+        venue = mock_venue(venue_config(seed=1, quote_rate=quote_rate))
+        await venue.start(rest_port=None, fix_md_port=None, fix_order_port=None)
+        pool = wss_pool(None, nb_connections=2, url='ws://127.0.0.1:%d/ws' % venue.ports['wss'],
+                        processes=processes, rebalance_interval=0)
+        try:
+            await pool.connect()
+            await test(venue, pool)
+        finally:
+            await pool.close()
+            await venue.stop()
+    asyncio.run(main())
+
+
+async def wait(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_instruments_are_spread_across_the_connections():
+    async def test(venue, pool):
+        await pool.subscribe_market_data(['A', 'B', 'C', 'D', 'A'])
+        assert pool.assignment == {'A': 0, 'B': 1, 'C': 0, 'D': 1}
+        await wait(lambda: all(symbol in pool.pricebook for symbol in 'ABCD'))
+        assert pool.pricebook.price('A', ASK, 1) > 0
+
+        await asyncio.sleep(0.2)
+        pool.update_rates()
+        assert all(rate > 0 for rate in pool.rates().values())
+        assert [stat['instruments'] for stat in pool.stats()] == [2, 2]
+
+        await pool.unsubscribe_market_data(['B'])
+        assert pool.shards[1].instruments == {'D'}
+    run(test)
+
+
+def test_rebalance_moves_the_instrument_nearest_half_the_gap():
+    async def test(venue, pool):
+        await pool.subscribe_market_data(['A', 'B', 'C', 'D', 'E'])
+        # Connection 0 quotes A, C and E, 1 quotes B and D
+        pool.instrument_rates = {'A': 10.0, 'C': 7.0, 'E': 1.0, 'B': 1.0, 'D': 1.0}
+        assert pool.shard_rates() == [18.0, 2.0]
+        assert await pool.rebalance() == 1
+        assert pool.assignment['C'] == 1
+        assert pool.shard_rates() == [11.0, 9.0]
+        # Balanced enough: nothing more to move
+        assert await pool.rebalance() == 0
+
+        # Quoted by both until its first quote on the new connection
+        assert 'C' in pool.shards[0].instruments and 'C' in pool.moving
+        await wait(lambda: not pool.handoffs)
+        assert pool.shards[0].instruments == {'A', 'E'}
+        assert pool.shards[1].instruments == {'B', 'C', 'D'}
+        assert pool.moving == set()
+    run(test)
+
+
+def test_rebalance_keeps_an_instrument_busier_than_the_gap():
+    async def test(venue, pool):
+        await pool.subscribe_market_data(['A', 'B'])
+        pool.instrument_rates = {'A': 10.0, 'B': 1.0}
+        # Moving A would only swap the busiest connection
+        assert await pool.rebalance() == 0
+    run(test)
+
+
+def test_worker_processes():
+    async def test(venue, pool):
+        await pool.subscribe_market_data(['A', 'B'])
+        await wait(lambda: 'A' in pool.pricebook and 'B' in pool.pricebook, 30)
+        assert pool.pricebook.price('B', ASK, 1) > 0
+        await wait(lambda: pool.shards[0].counts['A'] > 0)
+
+        # The websockets drop: the quotes are stale until the next ones
+        await venue.stop()
+        await wait(lambda: pool.pricebook.is_stale('A') and pool.pricebook.is_stale('B'))
+        with pytest.raises(stale_quote_error):
+            pool.pricebook.price('A', ASK, 1)
+    run(test, processes=True)
@@ -0,0 +1,78 @@
+import pytest
+
+from extp_wss_codec import decode_frame
+from extp_wss_pricebook import ASK, BID, EXACT, INTERPOLATE, NEXT, pricebook, stale_quote_error
+
+
+def levels(side):
+    return ', '.join('{"price": %s, "qty": %s}' % (price, qty) for qty, price in side)
+
+
+def quote(symbol, bid, ask):
+    return decode_frame('{"type": "client-streamquotes", "symbol": "%s", "data": {"bid": [%s], "ask": [%s]}}'
+                        % (symbol, levels(bid), levels(ask)))[1]
+
+
+@pytest.fixture
+def book():
+    result = pricebook()
+    # Levels not sorted by quantity are sorted when indexed
+    result.update(quote('BTC-USD', [(1, 99.0), (5, 98.0), (2, 98.5)], [(1, 101.0), (2, 101.5), (5, 102.0)]))
+    return result
+
+
+def test_price_of_an_exact_level(book):
+    assert book.price('BTC-USD', BID, 2) == 98.5
+    assert book.price('BTC-USD', ASK, 5, EXACT) == 102.0
+
+
+def test_price_between_levels(book):
+    assert book.price('BTC-USD', ASK, 3) == 102.0
+    assert book.price('BTC-USD', ASK, 3, NEXT) == 102.0
+    assert book.price('BTC-USD', ASK, 3.5, INTERPOLATE) == pytest.approx(101.75)
+    assert book.price('BTC-USD', BID, 0.5, INTERPOLATE) == 99.0
+    with pytest.raises(KeyError):
+        book.price('BTC-USD', ASK, 3, EXACT)
+
+
+def test_price_above_the_last_level(book):
+    with pytest.raises(ValueError):
+        book.price('BTC-USD', ASK, 6)
+
+
+def test_vwap_is_the_price_of_the_covering_tier(book):
+    assert book.vwap('BTC-USD', ASK, 1.5) == 101.5
+    assert book.vwap('BTC-USD', BID, 5) == 98.0
+    for quantity in (0, -1):
+        with pytest.raises(ValueError):
+            book.vwap('BTC-USD', ASK, quantity)
+    with pytest.raises(ValueError):
+        book.vwap('BTC-USD', ASK, 10)
+
+
+def test_unknown_instrument(book):
+    assert 'ETH-USD' not in book
+    with pytest.raises(KeyError):
+        book.price('ETH-USD', BID, 1)
+
+
+def test_update_replaces_the_indexed_sides(book):
+    assert book.price('BTC-USD', BID, 1) == 99.0
+    book.update(quote('BTC-USD', [(1, 97.0)], [(1, 103.0)]))
+    assert book.price('BTC-USD', BID, 1) == 97.0
+
+
+def test_stale_until_a_new_quote(book):
+    book.update(quote('ETH-USD', [(1, 9.0)], [(1, 11.0)]))
+    book.mark_stale(['BTC-USD'])
+    assert book.is_stale('BTC-USD') and not book.is_stale('ETH-USD')
+    with pytest.raises(stale_quote_error):
+        book.price('BTC-USD', BID, 1)
+    # stale_quote_error is a LookupError, as for an unknown instrument
+    with pytest.raises(LookupError):
+        book.vwap('BTC-USD', BID, 1)
+    book.update(quote('BTC-USD', [(1, 97.0)], [(1, 103.0)]))
+    assert book.price('BTC-USD', BID, 1) == 97.0
+
+    book.mark_stale()
+    assert book.stale == {'BTC-USD', 'ETH-USD'}
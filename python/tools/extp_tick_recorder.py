@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+
+# Binary recorder of EXTP book updates, and replay engine.
+#
+# Updates are appended to memory mapped segment files, column by column:
+# - updates: receive timestamp (ns since epoch), symbol id, number of bid and
+#   ask levels,
+# - levels: price and quantity, the bids then the asks of each update.
+# Recording an update is a few slice copies into the mapping, no encoding and
+# no system call. The symbols are kept, one per line, in a text file next to
+# the segments.
+#
+# The replay engine reads the segments back and feeds the updates to a
+# handler at the recorded pace, N times faster or as fast as possible.
+
+import argparse
+import array
+import asyncio
+import glob
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b'EXTPTICK'
+VERSION = 1
+
+# Header: magic, version, update capacity, level capacity, updates, levels
+_HEADER = struct.Struct('<8sQQQQQ')
+_HEADER_SIZE = 64
+_COUNTS_OFFSET = 32
+
+_UPDATE_COLUMNS = (('timestamp', 'q'), ('symbol', 'I'), ('nb_bids', 'H'), ('nb_asks', 'H'))
+_LEVEL_COLUMNS = (('price', 'd'), ('qty', 'd'))
+
+
+def _layout(update_capacity, level_capacity):
+    # Offset of each column, aligned on 64 bytes, and the file size
+    offsets = {}
+    offset = _HEADER_SIZE
+    for columns, capacity in ((_UPDATE_COLUMNS, update_capacity), (_LEVEL_COLUMNS, level_capacity)):
+        for name, fmt in columns:
+            offsets[name] = offset
+            offset += (struct.calcsize(fmt) * capacity + 63) & ~63
+    return offsets, offset
+
+
+class tick_segment:
+    """
+    One segment file, mapped with its columns as typed memoryviews. Rows are
+    only valid up to nb_updates and nb_levels, which are written last.
+    """
+
+    def __init__(self, path, update_capacity=None, level_capacity=None):
+        self.path = path
+        writable = update_capacity is not None
+        if writable:
+            _, size = _layout(update_capacity, level_capacity)
+            with open(path, 'xb') as file:
+                file.truncate(size)
+                file.write(_HEADER.pack(MAGIC, VERSION, update_capacity, level_capacity, 0, 0))
+
+        with open(path, 'r+b' if writable else 'rb') as file:
+            self.mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, version, self.update_capacity, self.level_capacity, _, _ = _HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a tick segment: ' + path)
+
+        view = memoryview(self.mm)
+        self.counts = view[_COUNTS_OFFSET:_COUNTS_OFFSET + 16].cast('Q')
+        offsets, _ = _layout(self.update_capacity, self.level_capacity)
+        self.columns = {}
+        for columns, capacity in ((_UPDATE_COLUMNS, self.update_capacity), (_LEVEL_COLUMNS, self.level_capacity)):
+            for name, fmt in columns:
+                start = offsets[name]
+                self.columns[name] = view[start:start + struct.calcsize(fmt) * capacity].cast(fmt)
+        view.release()
+
+    @property
+    def nb_updates(self):
+        return self.counts[0]
+
+    @property
+    def nb_levels(self):
+        return self.counts[1]
+
+    def append(self, timestamp, symbol_id, bid_prices, bid_qtys, ask_prices, ask_qtys):
+        """
+        Appends an update, returns False if the segment is full.
+        """
+        row = self.counts[0]
+        level = self.counts[1]
+        nb_bids = len(bid_prices)
+        nb_asks = len(ask_prices)
+        end = level + nb_bids + nb_asks
+        if row == self.update_capacity or end > self.level_capacity:
+            return False
+
+        price = self.columns['price']
+        qty = self.columns['qty']
+        price[level:level + nb_bids] = _doubles(bid_prices)
+        qty[level:level + nb_bids] = _doubles(bid_qtys)
+        price[level + nb_bids:end] = _doubles(ask_prices)
+        qty[level + nb_bids:end] = _doubles(ask_qtys)
+        self.columns['timestamp'][row] = timestamp
+        self.columns['symbol'][row] = symbol_id
+        self.columns['nb_bids'][row] = nb_bids
+        self.columns['nb_asks'][row] = nb_asks
+        # Committed last, a reader never sees a partial update
+        self.counts[1] = end
+        self.counts[0] = row + 1
+        return True
+
+    def updates(self, symbols):
+        """
+        Yields the ticks of the segment.
+        """
+        columns = self.columns
+        timestamps, symbol_ids = columns['timestamp'], columns['symbol']
+        nb_bids, nb_asks = columns['nb_bids'], columns['nb_asks']
+        price, qty = columns['price'], columns['qty']
+        level = 0
+        for row in range(self.counts[0]):
+            bid_end = level + nb_bids[row]
+            ask_end = bid_end + nb_asks[row]
+            yield tick(symbols[symbol_ids[row]], timestamps[row],
+                       price[level:bid_end], qty[level:bid_end],
+                       price[bid_end:ask_end], qty[bid_end:ask_end])
+            level = ask_end
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.counts.release()
+        for column in self.columns.values():
+            column.release()
+        self.mm.close()
+
+
+def _doubles(values):
+    # Slice assignment needs a buffer of doubles: array('d') and float64
+    # numpy arrays are copied as is, lists and tuples are converted
+    if isinstance(values, (list, tuple)):
+        return array.array('d', values)
+    return values
+
+
+class tick:
+    """
+    A recorded book update. It has the attributes of a stream_quote, so that
+    it can be given to a WSS pricebook as is; received is the receive time in
+    seconds since epoch.
+    """
+
+    __slots__ = ('symbol', 'timestamp', 'bid_prices', 'bid_qtys', 'ask_prices', 'ask_qtys')
+
+    def __init__(self, symbol, timestamp, bid_prices, bid_qtys, ask_prices, ask_qtys):
+        self.symbol = symbol
+        self.timestamp = timestamp
+        # Copied out of the mapping, which can then be closed
+        self.bid_prices = array.array('d', bid_prices.tobytes())
+        self.bid_qtys = array.array('d', bid_qtys.tobytes())
+        self.ask_prices = array.array('d', ask_prices.tobytes())
+        self.ask_qtys = array.array('d', ask_qtys.tobytes())
+
+    @property
+    def received(self):
+        return self.timestamp / 1e9
+
+    def __repr__(self):
+        return 'tick({!r}, {}, bid={}, ask={})'.format(
+            self.symbol, self.timestamp,
+            list(zip(self.bid_qtys, self.bid_prices)),
+            list(zip(self.ask_qtys, self.ask_prices)))
+
+
+def _segment_paths(directory, name):
+    return sorted(glob.glob(os.path.join(directory, name + '-*.ticks')))
+
+
+class tick_recorder:
+    """
+    Appends book updates to the segments <name>-<n>.ticks of directory,
+    starting a new segment when one is full. A recorder never rewrites the
+    existing segments, it starts after them.
+
+    The clients take a recorder as their `recorder` attribute and call
+    record() for each book update they receive.
+    """
+
+    def __init__(self, directory, name='ticks', update_capacity=1 << 20, level_capacity=1 << 24):
+        self.directory = directory
+        self.name = name
+        self.update_capacity = update_capacity
+        self.level_capacity = level_capacity
+        os.makedirs(directory, exist_ok=True)
+
+        self.symbols_file = open(os.path.join(directory, name + '.symbols'), 'a+')
+        self.symbols_file.seek(0)
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols_file.read().splitlines())}
+        self.next_segment = len(_segment_paths(directory, name))
+        self.segment = None
+        self._new_segment()
+
+    def record(self, symbol, bid_prices, bid_qtys, ask_prices, ask_qtys, timestamp=None):
+        """
+        Records the levels of an update of symbol, received at timestamp (ns
+        since epoch, now by default). Levels are arrays of doubles (array('d'),
+        numpy float64) or sequences of numbers.
+        """
+        if timestamp is None:
+            timestamp = time.time_ns()
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self._add_symbol(symbol)
+        if not self.segment.append(timestamp, symbol_id, bid_prices, bid_qtys, ask_prices, ask_qtys):
+            self._new_segment()
+            if not self.segment.append(timestamp, symbol_id, bid_prices, bid_qtys, ask_prices, ask_qtys):
+                raise ValueError('Update larger than a segment')
+
+    def flush(self):
+        self.segment.flush()
+
+    def close(self):
+        self.segment.flush()
+        self.segment.close()
+        self.symbols_file.close()
+
+    def _add_symbol(self, symbol):
+        symbol_id = len(self.symbol_ids)
+        self.symbol_ids[symbol] = symbol_id
+        self.symbols_file.write(symbol + '\n')
+        self.symbols_file.flush()
+        return symbol_id
+
+    def _new_segment(self):
+        if self.segment is not None:
+            self.segment.flush()
+            self.segment.close()
+        path = os.path.join(self.directory, '{}-{:06d}.ticks'.format(self.name, self.next_segment))
+        self.next_segment += 1
+        self.segment = tick_segment(path, self.update_capacity, self.level_capacity)
+
+
+def read_ticks(directory, name='ticks'):
+    """
+    Yields the recorded ticks of all the segments, in recording order.
+    """
+    with open(os.path.join(directory, name + '.symbols')) as file:
+        symbols = file.read().splitlines()
+    for path in _segment_paths(directory, name):
+        segment = tick_segment(path)
+        try:
+            yield from segment.updates(symbols)
+        finally:
+            segment.close()
+
+
+def replay(ticks, handler, speed=1.0):
+    """
+    Calls handler with each tick, at the recorded pace divided by speed, or
+    as fast as possible if speed is None. Returns the number of ticks.
+    """
+    count = 0
+    start = None
+    for t in ticks:
+        if speed:
+            if start is None:
+                start, first = time.monotonic(), t.timestamp
+            delay = start + (t.timestamp - first) / 1e9 / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        handler(t)
+        count += 1
+    return count
+
+
+async def replay_async(ticks, handler, speed=1.0):
+    """
+    replay() for asyncio code: waits with asyncio.sleep, handler may be a
+    coroutine function.
+    """
+    count = 0
+    start = None
+    for t in ticks:
+        if speed:
+            if start is None:
+                start, first = time.monotonic(), t.timestamp
+            delay = start + (t.timestamp - first) / 1e9 / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        result = handler(t)
+        if asyncio.iscoroutine(result):
+            await result
+        count += 1
+    return count
+
+
+def fix_client_handler(client):
+    """
+    Handler replaying the ticks into the ladders of a fix_client.
+    """
+    def on_tick(t):
+        client.set_market_data(t.symbol, t.bid_qtys, t.bid_prices, t.ask_qtys, t.ask_prices)
+    return on_tick
+
+
+def pricebook_handler(pricebook):
+    """
+    Handler replaying the ticks into a WSS pricebook.
+    """
+    return pricebook.update
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Replays recorded ticks on stdout')
+    parser.add_argument('directory', help='Directory of the segments')
+    parser.add_argument('--name', default='ticks', help='Name of the recording')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='Replay speed, 1 for the recorded pace, 0 for as fast as possible')
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    count = replay(read_ticks(args.directory, args.name), print, args.speed or None)
+    elapsed = time.monotonic() - start
+    print('{} ticks replayed in {:.3f}s'.format(count, elapsed))